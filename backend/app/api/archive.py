@@ -0,0 +1,79 @@
+"""归档API"""
+
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from ..models.database import get_db
+from ..services.archive_service import ArchiveService
+
+router = APIRouter(prefix="/api/archive", tags=["archive"])
+
+
+@router.get("/samples", response_model=dict)
+def query_archived_samples(
+    task_id: Optional[List[int]] = Query(None),
+    indicator_id: Optional[List[int]] = Query(None),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    columns: Optional[str] = None,
+    include_response: bool = False,
+    limit: int = Query(1000, ge=1, le=100000)
+):
+    """查询归档的逐样本结果
+    
+    task_id、indicator_id 可重复传入多个；start_date/end_date 为任务完成日期（YYYY-MM-DD）；
+    columns 为逗号分隔的列名，只读取需要的列。
+    """
+    for value in (start_date, end_date):
+        if value:
+            try:
+                date.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"无效的日期: {value}")
+    try:
+        return ArchiveService.query_samples(
+            task_ids=task_id,
+            indicator_ids=indicator_id,
+            start_date=start_date,
+            end_date=end_date,
+            columns=[c.strip() for c in columns.split(",") if c.strip()] if columns else None,
+            include_response=include_response,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/tasks/{task_id}", response_model=dict)
+def archive_task(task_id: int, db: Session = Depends(get_db)):
+    """立即归档一个已完成任务的逐样本数据"""
+    try:
+        archive = ArchiveService.archive_task(db, task_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "message": "任务已归档",
+        "task_id": task_id,
+        "completed_date": archive.completed_date,
+        "result_rows": archive.result_rows,
+        "response_rows": archive.response_rows
+    }
+
+
+@router.post("/run", response_model=dict)
+def run_archive(
+    older_than_days: int = Query(30, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db)
+):
+    """归档完成时间早于 older_than_days 天的所有任务"""
+    try:
+        archived = ArchiveService.archive_completed_tasks(db, older_than_days, limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"message": f"已归档 {len(archived)} 个任务", "task_ids": archived}
@@ -0,0 +1,59 @@
+"""排行榜API"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from ..models.database import get_db
+from ..models.leaderboard import OVERALL_INDICATOR_ID
+from ..services.leaderboard_service import LeaderboardService
+from ..services.task_service import TaskService
+
+router = APIRouter(prefix="/api/leaderboard", tags=["leaderboard"])
+
+
+@router.get("", response_model=dict)
+def get_leaderboard(
+    dataset_key: Optional[str] = None,
+    task_id: Optional[int] = None,
+    indicator_id: int = OVERALL_INDICATOR_ID,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """按综合得分（indicator_id=0）或单个指标得分排名
+    
+    dataset_key 指定数据集；也可以传 task_id，对使用同一数据集的任务排名。
+    """
+    if not dataset_key:
+        if task_id is None:
+            raise HTTPException(status_code=400, detail="请指定 dataset_key 或 task_id")
+        task = TaskService.get_task(db, task_id)
+        if not task:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        dataset_key = LeaderboardService.dataset_key(task)
+    
+    return LeaderboardService.get_ranking(db, dataset_key, indicator_id, limit=limit, offset=offset)
+
+
+@router.get("/datasets", response_model=List[dict])
+def get_leaderboard_datasets(db: Session = Depends(get_db)):
+    """排行榜中的数据集"""
+    return LeaderboardService.get_datasets(db)
+
+
+@router.get("/compare", response_model=dict)
+def compare_tasks(
+    task_id: List[int] = Query(...),
+    db: Session = Depends(get_db)
+):
+    """对比多个已完成任务的综合得分和各指标得分（task_id 可重复传入）"""
+    if len(task_id) > 50:
+        raise HTTPException(status_code=400, detail="最多对比50个任务")
+    return LeaderboardService.compare(db, task_id)
+
+
+@router.post("/rebuild", response_model=dict)
+def rebuild_leaderboard(db: Session = Depends(get_db)):
+    """根据已有的评估结果重建排行榜"""
+    count = LeaderboardService.rebuild(db)
+    return {"message": f"排行榜已重建，共 {count} 个任务"}
@@ -1,83 +1,118 @@
 """评估结果API"""
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from ..models.database import get_db
-from ..models.result import EvaluationResult
 from ..models.task import EvaluationTask
+from ..services.result_service import ResultService, CachedResult
+from ..services.sample_result_service import SampleResultService
 
 router = APIRouter(prefix="/api/results", tags=["results"])
 
 
 @router.get("/task/{task_id}", response_model=dict)
-def get_task_result(task_id: int, db: Session = Depends(get_db)):
-    """获取任务的评估结果"""
+def get_task_result(
+    task_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """获取任务的评估结果（支持 ETag / If-None-Match）"""
+    entry = ResultService.get_task_result(db, task_id)
+    if entry is None:
+        task = db.query(EvaluationTask.id).filter(EvaluationTask.id == task_id).first()
+        if not task:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        raise HTTPException(status_code=404, detail="任务尚未完成，暂无结果")
+    
+    return _cached_response(entry, if_none_match)
+
+
+@router.get("/task/{task_id}/samples", response_model=dict)
+def get_task_samples(
+    task_id: int,
+    indicator_id: Optional[int] = None,
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+    errors_only: bool = False,
+    after: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    include_response: bool = False,
+    db: Session = Depends(get_db)
+):
+    """分页获取逐样本结果（按样本下标排序，after 为上一页返回的 next_cursor）"""
     task = db.query(EvaluationTask).filter(EvaluationTask.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
+    _ensure_not_archived(task)
     
-    if not task.result:
-        raise HTTPException(status_code=404, detail="任务尚未完成，暂无结果")
-    
-    result = task.result
-    if not result:
-        raise HTTPException(status_code=404, detail="结果不存在")
-    
-    # 获取结果项
-    result_items = [
-        {
-            "indicator_id": item.indicator_id,
-            "indicator_name": item.indicator.name if item.indicator else "",
-            "score": item.score,
-            "weighted_score": item.weighted_score,
-            "raw_data": item.raw_data
-        }
-        for item in result.result_items
-    ]
+    try:
+        return SampleResultService.get_samples(
+            db, task_id,
+            indicator_id=indicator_id,
+            min_score=min_score,
+            max_score=max_score,
+            errors_only=errors_only,
+            after=after,
+            limit=limit,
+            include_response=include_response
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/task/{task_id}/worst", response_model=dict)
+def get_task_worst_samples(
+    task_id: int,
+    indicator_id: Optional[int] = None,
+    k: int = Query(10, ge=1, le=500),
+    include_response: bool = True,
+    db: Session = Depends(get_db)
+):
+    """获取每个指标得分最低的k个样本，用于失败分析"""
+    task = db.query(EvaluationTask).filter(EvaluationTask.id == task_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    _ensure_not_archived(task)
     
+    indicator_ids = [indicator_id] if indicator_id is not None else (task.selected_indicators or [])
+    worst = SampleResultService.get_worst_samples(
+        db, task_id, indicator_ids, k=k, include_response=include_response
+    )
     return {
-        "id": result.id,
-        "task_id": result.task_id,
-        "overall_score": result.overall_score,
-        "summary": result.summary,
-        "detailed_results": result.detailed_results,
-        "analysis_report": result.analysis_report,
-        "radar_chart_data": result.radar_chart_data,
-        "correlation_matrix": result.correlation_matrix,
-        "result_items": result_items,
-        "created_at": result.created_at.isoformat()
+        "task_id": task_id,
+        "k": k,
+        "indicators": {str(ind_id): items for ind_id, items in worst.items()}
     }
 
 
 @router.get("/{result_id}", response_model=dict)
-def get_result(result_id: int, db: Session = Depends(get_db)):
-    """获取评估结果"""
-    result = db.query(EvaluationResult).filter(EvaluationResult.id == result_id).first()
-    if not result:
+def get_result(
+    result_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """获取评估结果（支持 ETag / If-None-Match）"""
+    entry = ResultService.get_result(db, result_id)
+    if entry is None:
         raise HTTPException(status_code=404, detail="结果不存在")
     
-    result_items = [
-        {
-            "indicator_id": item.indicator_id,
-            "indicator_name": item.indicator.name if item.indicator else "",
-            "score": item.score,
-            "weighted_score": item.weighted_score,
-            "raw_data": item.raw_data
-        }
-        for item in result.result_items
-    ]
-    
-    return {
-        "id": result.id,
-        "task_id": result.task_id,
-        "overall_score": result.overall_score,
-        "summary": result.summary,
-        "detailed_results": result.detailed_results,
-        "analysis_report": result.analysis_report,
-        "radar_chart_data": result.radar_chart_data,
-        "correlation_matrix": result.correlation_matrix,
-        "result_items": result_items,
-        "created_at": result.created_at.isoformat()
-    }
+    return _cached_response(entry, if_none_match)
+
+
+def _ensure_not_archived(task: EvaluationTask):
+    """逐样本数据归档后不在数据库中，需要通过归档API查询"""
+    if task.archive:
+        raise HTTPException(
+            status_code=410,
+            detail=f"任务的逐样本数据已归档，请通过 /api/archive/samples?task_id={task.id} 查询"
+        )
+
 
+def _cached_response(entry: CachedResult, if_none_match: Optional[str]) -> Response:
+    """返回序列化好的结果；客户端的ETag未变化时返回304"""
+    # no-cache：客户端每次都要带 If-None-Match 重新校验（任务重新执行后结果会变化）
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if ResultService.etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
@@ -1,11 +1,11 @@
 """系统管理API"""
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-import psutil
-import os
 from ..models.database import get_db
 from ..services.indicator_service import IndicatorService
+from ..services.scheduler import EvaluationScheduler
+from ..services.system_metrics import SystemMetricsSampler, SYSTEM_METRICS_HISTORY, SYSTEM_METRICS_INTERVAL
 
 router = APIRouter(prefix="/api/system", tags=["system"])
 
@@ -20,29 +20,18 @@ def health_check():
 
 
 @router.get("/stats", response_model=dict)
-def get_system_stats():
-    """获取系统统计信息"""
-    # CPU和内存使用情况
-    cpu_percent = psutil.cpu_percent(interval=1)
-    memory = psutil.virtual_memory()
-    
-    return {
-        "cpu": {
-            "percent": cpu_percent,
-            "count": psutil.cpu_count()
-        },
-        "memory": {
-            "total": memory.total,
-            "available": memory.available,
-            "used": memory.used,
-            "percent": memory.percent
-        },
-        "disk": {
-            "total": psutil.disk_usage('/').total if os.name != 'nt' else psutil.disk_usage('C:\\').total,
-            "used": psutil.disk_usage('/').used if os.name != 'nt' else psutil.disk_usage('C:\\').used,
-            "free": psutil.disk_usage('/').free if os.name != 'nt' else psutil.disk_usage('C:\\').free
-        }
-    }
+def get_system_stats(history: int = Query(60, ge=0, le=SYSTEM_METRICS_HISTORY)):
+    """获取系统统计信息（后台采样的最新值，history 为返回的时间序列点数）"""
+    stats = dict(SystemMetricsSampler.latest())
+    stats["interval_seconds"] = SYSTEM_METRICS_INTERVAL
+    stats["history"] = SystemMetricsSampler.history(history)
+    return stats
+
+
+@router.get("/scheduler", response_model=dict)
+def get_scheduler_stats():
+    """获取调度器状态（各用户运行/排队任务数、各端点在途请求数）"""
+    return EvaluationScheduler.stats()
 
 
 @router.post("/init", response_model=dict)
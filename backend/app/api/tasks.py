@@ -1,16 +1,33 @@
 """任务管理API"""
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+import asyncio
+import json
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from pydantic import BaseModel
-from ..models.database import get_db
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+from ..models.database import get_db, SessionLocal, AsyncSessionLocal
 from ..models.task import TaskStatus
 from ..services.task_service import TaskService
 from ..services.evaluation_service import EvaluationService
+from ..services.task_registry import TaskRegistry
+from ..services.distributed_service import DistributedService
+from ..services.estimate_service import EstimateService
+from ..services.profiler import ProfileService, to_collapsed, to_speedscope
+from ..services.progress import TaskEventBus
+from ..services.resource_accounting import ResourceAccount
+from ..services.scheduler import EvaluationScheduler
+from ..services.usage_service import UsageService
 
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
+# 任务终止状态，事件流在推送这些状态后结束
+TERMINAL_STATUSES = {TaskStatus.COMPLETED.value, TaskStatus.FAILED.value, TaskStatus.CANCELLED.value}
+# 事件流空闲时检查数据库/发送心跳的间隔（秒）
+EVENT_STREAM_IDLE_SECONDS = 5.0
+
 
 class TaskCreate(BaseModel):
     name: str
@@ -21,6 +38,39 @@ class TaskCreate(BaseModel):
     indicator_weights: Optional[dict] = None
 
 
+class SamplingConfig(BaseModel):
+    tolerance: float = Field(0.02, gt=0)            # 置信区间半宽容差
+    confidence: float = Field(0.95, gt=0, lt=1)     # 置信水平
+    min_samples: int = Field(30, ge=2)              # 判断收敛前的最少样本数
+    max_samples: Optional[int] = Field(None, gt=0)  # 样本（调用次数）预算
+    time_budget_seconds: Optional[float] = Field(None, gt=0)  # 时间预算
+    max_tokens: Optional[int] = Field(None, gt=0)   # token 预算（输入 + 输出）
+    max_cost: Optional[float] = Field(None, gt=0)   # 费用预算（按任务模型的价格，见 summary.usage）
+    seed: Optional[int] = None                      # 随机顺序的种子
+
+
+class TaskStart(BaseModel):
+    mode: Literal["full", "adaptive"] = "full"  # adaptive：随机抽样，置信区间收敛后提前停止
+    sampling: Optional[SamplingConfig] = None  # adaptive 模式的参数
+    concurrency: Optional[int] = Field(None, gt=0)  # 样本并发数，默认见 SCHEDULER_TASK_CONCURRENCY
+    priority: int = Field(1, ge=1, le=100)  # 端点繁忙时加权轮询的权重
+    distributed: bool = False  # 分布式模式：切分为分片，由工作节点（worker.py）领取执行
+    shard_size: int = 100      # 分布式模式下每个分片的样本数
+    profile: bool = False      # 采样剖析本次执行，结果通过 /{task_id}/profile 下载
+    trace_memory: bool = False  # 用 tracemalloc 记录内存峰值（开销较大，排查内存问题时使用）
+
+
+class TaskCancel(BaseModel):
+    save_partial: bool = False  # 是否用已完成的样本保存部分结果
+
+
+class TaskEstimate(BaseModel):
+    probe_samples: int = Field(10, ge=1, le=200)    # 试运行抽取的样本数（会真实调用智能体）
+    concurrency: Optional[int] = Field(None, gt=0)  # 按该并发数外推耗时，默认与启动任务时相同
+    workers: Optional[int] = Field(None, gt=0)      # 同时外推该数量的分布式工作节点的耗时
+    seed: Optional[int] = None                      # 抽样的随机种子
+
+
 class TaskUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
@@ -60,29 +110,76 @@ def get_tasks(
     status: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """获取任务列表"""
-    task_status = None
-    if status:
+    """获取任务列表（偏移分页，任务较多时请使用 /page）"""
+    tasks = TaskService.get_tasks(db, skip=skip, limit=limit, status=_parse_status(status))
+    return [_serialize_task_summary(t) for t in tasks]
+
+
+@router.get("/page", response_model=dict)
+def get_tasks_page(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    status: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """按创建时间倒序键集分页获取任务列表（cursor 为上一页返回的 next_cursor）"""
+    try:
+        page = TaskService.get_tasks_page(db, cursor=cursor, limit=limit, status=_parse_status(status))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    page["items"] = [_serialize_task_summary(t) for t in page["items"]]
+    return page
+
+
+@router.get("/changes", response_model=dict)
+def get_changed_tasks(
+    changed_since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """增量获取 changed_since 之后创建或更新的任务
+    
+    首次调用不传 changed_since，之后传入上次返回的 next_since；has_more 为真时应立即继续拉取。
+    """
+    if changed_since:
         try:
-            task_status = TaskStatus(status)
+            datetime.fromisoformat(changed_since)
         except ValueError:
-            raise HTTPException(status_code=400, detail=f"无效的状态: {status}")
-    
-    tasks = TaskService.get_tasks(db, skip=skip, limit=limit, status=task_status)
-    return [
-        {
-            "id": t.id,
-            "name": t.name,
-            "description": t.description,
-            "status": t.status.value,
-            "progress": t.progress,
-            "total_samples": t.total_samples,
-            "processed_samples": t.processed_samples,
-            "created_at": t.created_at.isoformat(),
-            "updated_at": t.updated_at.isoformat() if t.updated_at else None
-        }
-        for t in tasks
-    ]
+            raise HTTPException(status_code=400, detail=f"无效的时间: {changed_since}")
+    changes = TaskService.get_changed_tasks(db, since=changed_since, limit=limit)
+    changes["items"] = [_serialize_task_summary(t) for t in changes["items"]]
+    return changes
+
+
+@router.get("/summary", response_model=dict)
+def get_task_summary(db: Session = Depends(get_db)):
+    """按状态统计任务数量"""
+    return TaskService.get_status_counts(db)
+
+
+def _parse_status(status: Optional[str]) -> Optional[TaskStatus]:
+    """解析状态查询参数"""
+    if not status:
+        return None
+    try:
+        return TaskStatus(status)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"无效的状态: {status}")
+
+
+def _serialize_task_summary(t) -> dict:
+    """任务列表中单个任务的格式"""
+    return {
+        "id": t.id,
+        "name": t.name,
+        "description": t.description,
+        "status": t.status.value,
+        "progress": t.progress,
+        "total_samples": t.total_samples,
+        "processed_samples": t.processed_samples,
+        "created_at": t.created_at.isoformat(),
+        "updated_at": t.updated_at.isoformat() if t.updated_at else None
+    }
 
 
 @router.get("/{task_id}", response_model=dict)
@@ -106,10 +203,115 @@ def get_task(task_id: int, db: Session = Depends(get_db)):
         "processed_samples": task.processed_samples,
         "created_at": task.created_at.isoformat(),
         "updated_at": task.updated_at.isoformat() if task.updated_at else None,
-        "result_id": task.result.id if task.result else None
+        "result_id": task.result.id if task.result else None,
+        "has_profile": task.profile is not None,
+        "resources": _task_resources(task)
     }
 
 
+def _task_resources(task) -> Optional[dict]:
+    """资源统计：执行中的任务取实时数值，已结束的任务取结果中保存的数值"""
+    account = ResourceAccount.active(task.id)
+    if account is not None:
+        return account.snapshot()
+    if task.result and task.result.summary:
+        return task.result.summary.get("resources")
+    return None
+
+
+@router.get("/{task_id}/profile")
+def get_task_profile(
+    task_id: int,
+    format: Literal["speedscope", "collapsed"] = "speedscope",
+    db: Session = Depends(get_db)
+):
+    """下载任务最近一次执行的剖析数据（speedscope JSON 或折叠调用栈文本）"""
+    profile = ProfileService.get(db, task_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="该任务没有剖析数据，请以 profile=true 启动任务")
+    
+    filename = f"task-{task_id}-profile"
+    if format == "collapsed":
+        return PlainTextResponse(
+            to_collapsed(profile.stacks or {}),
+            headers={"Content-Disposition": f'attachment; filename="{filename}.txt"'}
+        )
+    return JSONResponse(
+        to_speedscope(profile.stacks or {}, profile.interval_ms, f"task {task_id}"),
+        headers={"Content-Disposition": f'attachment; filename="{filename}.speedscope.json"'}
+    )
+
+
+@router.get("/{task_id}/events")
+async def stream_task_events(task_id: int, request: Request):
+    """以Server-Sent Events推送任务进度（吞吐量、剩余时间、各指标滚动得分）"""
+    snapshot = await _load_task_snapshot(task_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    
+    async def event_stream():
+        queue = TaskEventBus.subscribe(task_id)
+        try:
+            yield _format_sse("status", snapshot)
+            if snapshot["status"] in TERMINAL_STATUSES:
+                return
+            latest = TaskEventBus.latest(task_id)
+            if latest and latest["event"] == "progress":
+                yield _format_sse(latest["event"], latest["data"])
+            
+            last_snapshot = snapshot
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENT_STREAM_IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    # 执行器不在本进程（如分布式工作节点）时退化为低频读取数据库
+                    current = await _load_task_snapshot(task_id)
+                    if current is None:
+                        return
+                    if current != last_snapshot:
+                        last_snapshot = current
+                        yield _format_sse("status", current)
+                        if current["status"] in TERMINAL_STATUSES:
+                            return
+                    else:
+                        yield ": keepalive\n\n"
+                    continue
+                
+                yield _format_sse(event["event"], event["data"])
+                if event["event"] == "status" and event["data"]["status"] in TERMINAL_STATUSES:
+                    return
+        finally:
+            TaskEventBus.unsubscribe(task_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _load_task_snapshot(task_id: int) -> Optional[dict]:
+    """读取任务当前状态（异步会话，不占用线程池）"""
+    async with AsyncSessionLocal() as session:
+        task = await TaskService.get_task_async(session, task_id)
+        if not task:
+            return None
+        return {
+            "task_id": task.id,
+            "status": task.status.value,
+            "processed_samples": task.processed_samples,
+            "total_samples": task.total_samples,
+            "progress": task.progress
+        }
+
+
+def _format_sse(event_type: str, data: dict) -> str:
+    """格式化为SSE消息"""
+    return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 @router.put("/{task_id}", response_model=dict)
 def update_task(task_id: int, task_update: TaskUpdate, db: Session = Depends(get_db)):
     """更新任务配置"""
@@ -149,31 +351,106 @@ def update_task(task_id: int, task_update: TaskUpdate, db: Session = Depends(get
 
 
 @router.post("/{task_id}/start", response_model=dict)
-def start_task(task_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def start_task(
+    task_id: int,
+    background_tasks: BackgroundTasks,
+    options: Optional[TaskStart] = None,
+    db: Session = Depends(get_db)
+):
     """启动任务执行"""
     task = TaskService.get_task(db, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
     
-    # 允许重新启动失败的任务
-    if task.status not in [TaskStatus.PENDING, TaskStatus.FAILED]:
+    # 允许重新启动失败或已取消的任务
+    if task.status not in [TaskStatus.PENDING, TaskStatus.FAILED, TaskStatus.CANCELLED]:
         raise HTTPException(status_code=400, detail=f"任务状态不允许启动: {task.status.value}")
     
-    # 在后台执行任务（使用新的数据库会话）
-    from ..models.database import SessionLocal
-    def run_evaluation():
+    options = options or TaskStart()
+    if options.shard_size <= 0:
+        raise HTTPException(status_code=400, detail="分片大小必须大于0")
+    if options.distributed and options.mode != "full":
+        raise HTTPException(status_code=400, detail="分布式模式暂不支持自适应抽样")
+    if options.mode == "adaptive" and options.sampling and options.sampling.max_cost \
+            and UsageService.task_price(task) is None:
+        raise HTTPException(status_code=400, detail="设置了费用预算，但找不到智能体模型的价格，请在 agent_config 中配置 pricing")
+    if options.distributed and options.profile:
+        raise HTTPException(status_code=400, detail="分布式模式暂不支持性能剖析")
+    if EvaluationScheduler.is_queued(task_id):
+        raise HTTPException(status_code=400, detail="任务已在调度队列中")
+    
+    def prepare_distributed():
         db_session = SessionLocal()
         try:
-            import asyncio
-            asyncio.run(EvaluationService.execute_task(db_session, task_id))
+            asyncio.run(DistributedService.prepare_task(db_session, task_id, options.shard_size))
+        except Exception as e:
+            EvaluationService._mark_failed(db_session, task_id, e)
         finally:
             db_session.close()
     
-    background_tasks.add_task(run_evaluation)
+    if options.distributed:
+        # 切分完成后由工作节点领取执行，API进程本身不执行评估
+        background_tasks.add_task(prepare_distributed)
+        return {"message": "任务已提交至分布式队列", "task_id": task_id}
+    
+    # 先回到待执行状态再交给调度器：执行器只在任务未被取消时切换为运行中，
+    # 重新启动已取消的任务需要先清除取消状态
+    if task.status != TaskStatus.PENDING:
+        TaskService.update_task_status(db, task_id, TaskStatus.PENDING)
+    
+    # 交给调度器执行：用户的并发任务数已满时排队等待
+    scheduled = EvaluationScheduler.submit(task_id, task.user_id, options.model_dump())
+    if scheduled["queued"]:
+        TaskService.update_task_status(db, task_id, TaskStatus.PENDING, "排队中")
+        return {
+            "message": f"已达到并发任务上限，任务已进入调度队列（第{scheduled['position']}位）",
+            "task_id": task_id,
+            "queue_position": scheduled["position"]
+        }
     
     return {"message": "任务已启动", "task_id": task_id}
 
 
+@router.post("/{task_id}/estimate", response_model=dict)
+async def estimate_task(task_id: int, options: Optional[TaskEstimate] = None, db: Session = Depends(get_db)):
+    """试运行少量随机样本，预估完整执行的耗时、token 用量和费用（不保存结果、不改变任务状态）"""
+    task = await asyncio.to_thread(TaskService.get_task, db, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    
+    options = options or TaskEstimate()
+    try:
+        return await EstimateService.estimate(db, task, **options.model_dump())
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/{task_id}/cancel", response_model=dict)
+def cancel_task(task_id: int, cancel: Optional[TaskCancel] = None, db: Session = Depends(get_db)):
+    """取消任务执行"""
+    task = TaskService.get_task(db, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    
+    if task.status not in [TaskStatus.PENDING, TaskStatus.RUNNING]:
+        raise HTTPException(status_code=400, detail=f"任务状态不允许取消: {task.status.value}")
+    
+    save_partial = cancel.save_partial if cancel else False
+    EvaluationScheduler.dequeue(task_id)
+    if TaskRegistry.cancel(task_id, save_partial=save_partial):
+        # 由执行器在下一个检查点停止并写入最终状态
+        return {"message": "已发送取消信号", "task_id": task_id}
+    
+    # 尚未开始，或执行器已不在本进程中（如服务重启后残留的运行状态）。
+    # 条件更新：执行器可能恰好在此期间开始运行，此时改为向它发送取消信号
+    if TaskService.transition_task_status(db, task_id, TaskStatus.CANCELLED, only_from=[task.status]):
+        return {"message": "任务已取消", "task_id": task_id}
+    if TaskRegistry.cancel(task_id, save_partial=save_partial):
+        return {"message": "已发送取消信号", "task_id": task_id}
+    db.refresh(task)
+    raise HTTPException(status_code=400, detail=f"任务状态不允许取消: {task.status.value}")
+
+
 @router.delete("/{task_id}", response_model=dict)
 def delete_task(task_id: int, db: Session = Depends(get_db)):
     """删除任务"""
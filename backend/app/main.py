@@ -1,10 +1,15 @@
 """FastAPI主应用"""
 
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-from .models.database import init_db
-from .api import tasks, indicators, results, system
+from fastapi.responses import HTMLResponse, Response
+from .models.database import init_db, SessionLocal
+from .services.agent_clients import AgentClientPool
+from .services.leaderboard_service import LeaderboardService
+from .services.system_metrics import SystemMetricsSampler
+from .utils.metrics import CONTENT_TYPE, MetricsMiddleware, MetricsRegistry
+from .api import tasks, indicators, results, system, archive, leaderboard
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -22,11 +27,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 记录各路由的请求耗时
+app.add_middleware(MetricsMiddleware)
+
 # 注册路由
 app.include_router(tasks.router)
 app.include_router(indicators.router)
 app.include_router(results.router)
 app.include_router(system.router)
+app.include_router(archive.router)
+app.include_router(leaderboard.router)
 
 
 @app.on_event("startup")
@@ -35,6 +45,30 @@ async def startup_event():
     # 初始化数据库
     init_db()
     print("数据库初始化完成")
+    
+    # 后台采样系统指标，并监测API事件循环的延迟
+    SystemMetricsSampler.watch_loop("api", asyncio.get_running_loop())
+    SystemMetricsSampler.start()
+    
+    # 升级后首次启动时根据已有结果生成排行榜
+    db = SessionLocal()
+    try:
+        LeaderboardService.backfill_if_empty(db)
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭事件"""
+    SystemMetricsSampler.stop()
+    await AgentClientPool.close_all()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 格式的指标"""
+    return Response(content=MetricsRegistry.render(), media_type=CONTENT_TYPE)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -7,12 +7,27 @@
 使用方法：
 1. 启动模拟API: python mock_api.py
 2. 在创建评估任务时，API端点填写: http://localhost:9000/api/chat
+   （OpenAI 兼容格式: http://localhost:9000/v1/chat/completions）
+
+默认立即返回。测试吞吐量、限流和长尾延迟时，可以通过环境变量（MOCK_LATENCY 等，见 MockProfile）
+或 PUT /mock/config 设置响应特征，也可以在端点的查询参数中为单个任务覆盖，例如：
+    http://localhost:9000/api/chat?latency=lognormal&latency_ms=800&rate_limit_rate=0.05
 """
 
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+import asyncio
+import json
+import math
+import os
 import random
+import re
+import time
+import uuid
+from typing import List, Literal, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 
 app = FastAPI(title="智能体模拟API", description="用于测试的模拟智能体API")
 
@@ -36,6 +51,82 @@ class ChatResponse(BaseModel):
     response: str
 
 
+class BatchChatRequest(BaseModel):
+    requests: List[ChatRequest]
+
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str = ""
+
+
+class ChatCompletionRequest(BaseModel):
+    model: str = "mock-chat"
+    messages: List[ChatMessage]
+    max_tokens: int = 500
+    temperature: float = 0.7
+    stream: bool = False
+    stream_options: Optional[dict] = None
+
+
+class MockProfile(BaseModel):
+    """模拟API的响应特征
+
+    响应耗时 = 首个 token 的延迟（按 latency 分布采样）+ 输出 token 数 × token_interval_ms；
+    流式响应按 token_interval_ms 逐个推送。
+    """
+    # 首 token 延迟分布：none（立即返回）、fixed、lognormal（中位数为 latency_ms）、
+    # heavy_tail（帕累托分布，最小值为 latency_ms，tail_alpha 越小尾部越长）
+    latency: Literal["none", "fixed", "lognormal", "heavy_tail"] = "none"
+    latency_ms: float = Field(100.0, ge=0)
+    latency_sigma: float = Field(0.5, ge=0)
+    tail_alpha: float = Field(1.5, gt=0)
+    latency_max_ms: float = Field(30000.0, ge=0)
+    # 每个输出 token 的生成间隔（毫秒）
+    token_interval_ms: float = Field(0.0, ge=0)
+    # 输出 token 数（0 表示使用模板响应的原始长度），不超过请求的 max_tokens
+    output_tokens: int = Field(0, ge=0)
+    # 返回 500 的概率（在延迟之后返回）
+    error_rate: float = Field(0.0, ge=0, le=1)
+    # 返回 429 的概率（立即返回，带 Retry-After）
+    rate_limit_rate: float = Field(0.0, ge=0, le=1)
+    retry_after: int = Field(1, ge=0)
+    # 同时处理的请求数上限（0 表示不限），超出时返回 429
+    max_concurrency: int = Field(0, ge=0)
+    # 随机数种子（便于复现同一组延迟和错误）
+    seed: Optional[int] = None
+
+
+def _profile_from_env() -> MockProfile:
+    values = {}
+    for name in MockProfile.model_fields:
+        value = os.getenv(f"MOCK_{name.upper()}")
+        if value is not None:
+            values[name] = value
+    return MockProfile(**values)
+
+
+class MockState:
+    """当前配置和请求统计"""
+
+    profile = _profile_from_env()
+    rng = random.Random(profile.seed)
+    inflight = 0
+    peak_inflight = 0
+    stats = {"requests": 0, "completed": 0, "errors": 0, "rate_limited": 0, "rejected_concurrency": 0}
+
+    @staticmethod
+    def configure(profile: MockProfile):
+        MockState.profile = profile
+        MockState.rng = random.Random(profile.seed)
+
+    @staticmethod
+    def reset_stats():
+        MockState.peak_inflight = MockState.inflight
+        for key in MockState.stats:
+            MockState.stats[key] = 0
+
+
 # 预定义的模拟响应模板
 RESPONSE_TEMPLATES = {
     "人工智能": "人工智能（AI）是计算机科学的一个分支，致力于创建能够执行通常需要人类智能的任务的系统。",
@@ -45,32 +136,289 @@ RESPONSE_TEMPLATES = {
     "机器学习": "机器学习是人工智能的一个子领域，使计算机能够从数据中学习。",
 }
 
+# 粗略的分词：中文按字、英文按单词、标点单独计数
+_TOKEN_PATTERN = re.compile(r"[一-鿿]|\w+|[^\w\s]")
+
 
 def generate_mock_response(prompt: str) -> str:
     """生成模拟响应"""
     prompt_lower = prompt.lower()
-    
+
     # 根据关键词匹配预定义响应
     for keyword, response in RESPONSE_TEMPLATES.items():
         if keyword.lower() in prompt_lower:
             return response
-    
+
     # 如果没有匹配，生成通用响应
     responses = [
         f"这是一个关于'{prompt[:30]}...'的问题。根据我的理解，这是一个有趣的话题。",
         f"关于'{prompt[:30]}...'，我可以提供以下信息：这是一个需要深入分析的领域。",
         f"针对您的问题'{prompt[:30]}...'，我的回答是：这是一个复杂的话题，需要多角度分析。",
     ]
-    
-    return random.choice(responses)
+
+    return MockState.rng.choice(responses)
+
+
+def tokenize(text: str) -> List[str]:
+    """切分为保留原文空白的 token（拼接后与原文一致），用于计数和流式推送"""
+    pieces = []
+    position = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        pieces.append(text[position:match.end()])
+        position = match.end()
+    if position < len(text) and pieces:
+        pieces[-1] += text[position:]
+    return pieces
+
+
+def _completion_tokens(prompt: str, max_tokens: int, profile: MockProfile) -> List[str]:
+    """按配置的输出长度生成响应 token"""
+    tokens = tokenize(generate_mock_response(prompt))
+    target = profile.output_tokens or len(tokens)
+    target = min(target, max(max_tokens, 1))
+    if tokens and len(tokens) < target:
+        tokens = tokens * math.ceil(target / len(tokens))
+    return tokens[:target]
+
+
+def _sample_latency(profile: MockProfile) -> float:
+    """首 token 延迟（秒）"""
+    if profile.latency == "none":
+        return 0.0
+    if profile.latency == "fixed":
+        latency_ms = profile.latency_ms
+    elif profile.latency == "lognormal":
+        latency_ms = MockState.rng.lognormvariate(math.log(max(profile.latency_ms, 1e-3)), profile.latency_sigma)
+    else:
+        latency_ms = profile.latency_ms * MockState.rng.paretovariate(profile.tail_alpha)
+    return min(latency_ms, profile.latency_max_ms) / 1000
+
+
+def _request_profile(request: Request) -> MockProfile:
+    """全局配置叠加查询参数中的覆盖项（随机数种子只能全局设置）"""
+    overrides = {
+        key: value for key, value in request.query_params.items()
+        if key in MockProfile.model_fields and key != "seed"
+    }
+    if not overrides:
+        return MockState.profile
+    try:
+        return MockProfile(**{**MockState.profile.model_dump(), **overrides})
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"模拟配置参数无效: {e.errors()}")
+
+
+def _error_response(status_code: int, message: str, error_type: str, headers: Optional[dict] = None) -> JSONResponse:
+    # 与 OpenAI 的错误格式一致：{"error": {"message": ..., "type": ...}}
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"message": message, "type": error_type}},
+        headers=headers
+    )
+
+
+def _rate_limited(profile: MockProfile, message: str) -> JSONResponse:
+    MockState.stats["rate_limited"] += 1
+    return _error_response(429, message, "rate_limit_error", {"Retry-After": str(profile.retry_after)})
+
+
+class _Slot:
+    """占用一个并发名额，超出上限时返回限流响应"""
+
+    def __init__(self, profile: MockProfile):
+        self.profile = profile
+        self.acquired = False
+
+    def acquire(self) -> Optional[JSONResponse]:
+        MockState.stats["requests"] += 1
+        if self.profile.max_concurrency and MockState.inflight >= self.profile.max_concurrency:
+            MockState.stats["rejected_concurrency"] += 1
+            return _rate_limited(self.profile, f"并发请求数超出上限 {self.profile.max_concurrency}")
+        if self.profile.rate_limit_rate and MockState.rng.random() < self.profile.rate_limit_rate:
+            return _rate_limited(self.profile, "请求过于频繁（模拟限流）")
+        self.acquired = True
+        MockState.inflight += 1
+        MockState.peak_inflight = max(MockState.peak_inflight, MockState.inflight)
+        return None
+
+    def release(self):
+        if self.acquired:
+            self.acquired = False
+            MockState.inflight -= 1
+
+
+class _SlotStreamingResponse(StreamingResponse):
+    """流式响应：发送结束或中断时归还并发名额"""
+
+    def __init__(self, slot: _Slot, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.slot.release()
+
+
+async def _generate(prompt: str, max_tokens: int, profile: MockProfile) -> Optional[List[str]]:
+    """等待模拟延迟后生成完整响应；模拟服务端错误时返回 None"""
+    await asyncio.sleep(_sample_latency(profile))
+    tokens = _completion_tokens(prompt, max_tokens, profile)
+    if profile.token_interval_ms:
+        await asyncio.sleep(len(tokens) * profile.token_interval_ms / 1000)
+    if profile.error_rate and MockState.rng.random() < profile.error_rate:
+        MockState.stats["errors"] += 1
+        return None
+    MockState.stats["completed"] += 1
+    return tokens
 
 
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(chat_request: ChatRequest, request: Request):
     """模拟聊天接口"""
-    response_text = generate_mock_response(request.prompt)
-    
-    return ChatResponse(response=response_text)
+    profile = _request_profile(request)
+    slot = _Slot(profile)
+    rejected = slot.acquire()
+    if rejected:
+        return rejected
+    try:
+        tokens = await _generate(chat_request.prompt, chat_request.max_tokens, profile)
+    finally:
+        slot.release()
+    if tokens is None:
+        return _error_response(500, "模拟服务端错误", "server_error")
+    return ChatResponse(response="".join(tokens))
+
+
+@app.post("/api/chat/batch")
+async def chat_batch(batch: BatchChatRequest, request: Request):
+    """批量聊天接口：整批占用一个并发名额，各条并发生成，失败的条目单独返回错误"""
+    profile = _request_profile(request)
+    slot = _Slot(profile)
+    rejected = slot.acquire()
+    if rejected:
+        return rejected
+    try:
+        outputs = await asyncio.gather(*[
+            _generate(item.prompt, item.max_tokens, profile) for item in batch.requests
+        ])
+    finally:
+        slot.release()
+    return {
+        "responses": [
+            {"response": "".join(tokens)} if tokens is not None
+            else {"error": {"message": "模拟服务端错误", "type": "server_error"}}
+            for tokens in outputs
+        ]
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(completion_request: ChatCompletionRequest, request: Request):
+    """OpenAI 兼容的对话补全接口（支持 stream=true 的 SSE 流式响应）"""
+    profile = _request_profile(request)
+    prompt = "\n".join(message.content for message in completion_request.messages if message.role == "user")
+    prompt_tokens = sum(len(tokenize(message.content)) for message in completion_request.messages)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+
+    def usage(completion_tokens: int) -> dict:
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+    slot = _Slot(profile)
+    rejected = slot.acquire()
+    if rejected:
+        return rejected
+
+    if not completion_request.stream:
+        try:
+            tokens = await _generate(prompt, completion_request.max_tokens, profile)
+        finally:
+            slot.release()
+        if tokens is None:
+            return _error_response(500, "模拟服务端错误", "server_error")
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": completion_request.model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "stop"
+            }],
+            "usage": usage(len(tokens))
+        }
+
+    # 流式响应：首 token 延迟在响应头发出之后，与真实服务一致（客户端据此测量首 token 时间）
+    include_usage = bool((completion_request.stream_options or {}).get("include_usage"))
+
+    def chunk(delta: dict, finish_reason: Optional[str] = None, **extra) -> str:
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": completion_request.model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+            **extra
+        }
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    async def events():
+        await asyncio.sleep(_sample_latency(profile))
+        tokens = _completion_tokens(prompt, completion_request.max_tokens, profile)
+        # 出错的流在中途断开，并推送错误事件
+        fail_at = (
+            MockState.rng.randrange(len(tokens) + 1)
+            if profile.error_rate and MockState.rng.random() < profile.error_rate else None
+        )
+        yield chunk({"role": "assistant", "content": ""})
+        for index, token in enumerate(tokens):
+            if index == fail_at:
+                break
+            if index and profile.token_interval_ms:
+                await asyncio.sleep(profile.token_interval_ms / 1000)
+            yield chunk({"content": token})
+        if fail_at is not None:
+            MockState.stats["errors"] += 1
+            error = {"error": {"message": "模拟服务端错误", "type": "server_error"}}
+            yield f"data: {json.dumps(error, ensure_ascii=False)}\n\n"
+            return
+        yield chunk({}, "stop")
+        if include_usage:
+            yield chunk(None, usage=usage(len(tokens)))
+        yield "data: [DONE]\n\n"
+        MockState.stats["completed"] += 1
+
+    # 名额在响应发送结束时归还（包括客户端在响应体开始发送前断开、生成器从未运行的情况）
+    return _SlotStreamingResponse(slot, events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/mock/config", response_model=MockProfile)
+async def get_mock_config():
+    """当前的响应特征配置"""
+    return MockState.profile
+
+
+@app.put("/mock/config", response_model=MockProfile)
+async def update_mock_config(profile: MockProfile):
+    """替换响应特征配置（未给出的字段恢复默认值）"""
+    MockState.configure(profile)
+    return MockState.profile
+
+
+@app.get("/mock/stats")
+async def get_mock_stats(reset: bool = False):
+    """请求统计（reset=true 时返回后清零）"""
+    stats = {**MockState.stats, "inflight": MockState.inflight, "peak_inflight": MockState.peak_inflight}
+    if reset:
+        MockState.reset_stats()
+    return stats
 
 
 @app.get("/")
@@ -78,20 +426,25 @@ async def root():
     return {
         "message": "智能体模拟API服务",
         "endpoint": "/api/chat",
-        "usage": "POST请求，body: {'prompt': '你的问题', 'max_tokens': 500, 'temperature': 0.7}"
+        "usage": "POST请求，body: {'prompt': '你的问题', 'max_tokens': 500, 'temperature': 0.7}",
+        "openai_endpoint": "/v1/chat/completions",
+        "batch_endpoint": "/api/chat/batch",
+        "config": "/mock/config"
     }
 
 
 if __name__ == "__main__":
     import uvicorn
+    port = int(os.getenv("MOCK_API_PORT", "9000"))
     print("=" * 50)
     print("启动模拟API服务器...")
-    print("API端点: http://localhost:9000/api/chat")
+    print(f"API端点: http://localhost:{port}/api/chat")
+    print(f"OpenAI 兼容端点: http://localhost:{port}/v1/chat/completions")
+    print(f"响应特征: {MockState.profile.model_dump()}")
     print("=" * 50)
     print("\n在评估任务中，使用以下配置：")
-    print("  智能体API端点: http://localhost:9000/api/chat")
+    print(f"  智能体API端点: http://localhost:{port}/api/chat")
     print("  API密钥: 留空")
     print("\n按 Ctrl+C 停止服务")
     print("=" * 50)
-    uvicorn.run(app, host="0.0.0.0", port=9000)
-
+    uvicorn.run(app, host="0.0.0.0", port=port)
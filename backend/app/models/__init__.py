@@ -1,15 +1,21 @@
 """数据模型模块"""
 
-from .database import Base, engine, get_db
+from .database import Base, engine, get_db, get_async_db
 from .user import User
 from .task import EvaluationTask, TaskStatus
 from .indicator import Indicator, IndicatorCategory
 from .result import EvaluationResult, ResultItem
+from .shard import TaskShard, ShardStatus
+from .sample_result import SampleResult, SampleResponse
+from .archive import TaskArchive
+from .leaderboard import LeaderboardEntry
+from .profile import TaskProfile
 
 __all__ = [
     "Base",
     "engine",
     "get_db",
+    "get_async_db",
     "User",
     "EvaluationTask",
     "TaskStatus",
@@ -17,5 +23,12 @@ __all__ = [
     "IndicatorCategory",
     "EvaluationResult",
     "ResultItem",
+    "TaskShard",
+    "ShardStatus",
+    "SampleResult",
+    "SampleResponse",
+    "TaskArchive",
+    "LeaderboardEntry",
+    "TaskProfile",
 ]
 
@@ -0,0 +1,26 @@
+"""归档记录模型"""
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from .database import Base
+
+
+class TaskArchive(Base):
+    """已归档任务的记录
+
+    任务的逐样本结果和响应写入 Parquet 文件后从数据库中删除，
+    数据库中只保留评估结果（汇总）和这条记录。
+    """
+    __tablename__ = "task_archives"
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey("evaluation_tasks.id"), nullable=False, unique=True)
+
+    completed_date = Column(String(10), nullable=False, index=True)  # 分区日期 YYYY-MM-DD
+    result_rows = Column(Integer, default=0)    # 归档的逐样本结果行数
+    response_rows = Column(Integer, default=0)  # 归档的响应行数
+
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    task = relationship("EvaluationTask", back_populates="archive")
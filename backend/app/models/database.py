@@ -1,23 +1,111 @@
 """数据库配置和会话管理"""
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+import asyncio
 import os
+import time
+import weakref
+from ..utils.metrics import DB_COMMIT_DURATION
+from .migrations import add_missing_enum_values
 
 # 数据库文件路径
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./agent_evaluation.db")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# SQLite 等待写锁的时间（毫秒），避免并发写入时立即报 "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+
+# 连接池配置（仅对 PostgreSQL 等服务端数据库生效）
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+def _engine_options() -> dict:
+    """同步/异步引擎共用的配置"""
+    if IS_SQLITE:
+        return {
+            "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        }
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _async_database_url(url: str) -> str:
+    """把同步驱动的连接串转换为对应的异步驱动"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if url.startswith("postgresql:") or url.startswith("postgresql+psycopg2:"):
+        # PostgreSQL 的异步驱动需要额外安装 asyncpg
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """SQLite 连接建立时设置 PRAGMA
+
+    WAL 模式允许读写并发（API读取不再被评估写入阻塞），
+    synchronous=NORMAL 在 WAL 下仍保证崩溃一致性，同时显著减少 fsync。
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
 
 # 创建数据库引擎
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
-    echo=False
-)
+engine = create_engine(DATABASE_URL, echo=False, **_engine_options())
+if IS_SQLITE:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _commit_started(session: Session):
+    session.info["commit_started"] = time.perf_counter()
+
+
+def _commit_finished(session: Session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        DB_COMMIT_DURATION.observe(time.perf_counter() - started)
+
+
+# 记录事务提交耗时（含提交前的 flush）；异步会话内部也是 Session，同样会触发
+event.listen(Session, "before_commit", _commit_started)
+event.listen(Session, "after_commit", _commit_finished)
+event.listen(Session, "after_rollback", lambda session: session.info.pop("commit_started", None))
+
+# 异步引擎按事件循环缓存：API服务、评估调度线程、分布式工作节点各自运行在不同的
+# 事件循环中，而异步驱动的连接和连接池不能跨事件循环共享
+_async_engines: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncEngine]" = weakref.WeakKeyDictionary()
+
+
+def get_async_engine() -> AsyncEngine:
+    """获取当前事件循环的异步引擎"""
+    loop = asyncio.get_running_loop()
+    async_engine = _async_engines.get(loop)
+    if async_engine is None:
+        async_engine = create_async_engine(_async_database_url(DATABASE_URL), echo=False, **_engine_options())
+        if IS_SQLITE:
+            event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        _async_engines[loop] = async_engine
+    return async_engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    """创建异步数据库会话（需在事件循环中调用）"""
+    return AsyncSession(get_async_engine(), autoflush=False, expire_on_commit=False)
+
 # 声明基类
 Base = declarative_base()
 
@@ -31,7 +119,38 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """获取异步数据库会话"""
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
 def init_db():
     """初始化数据库，创建所有表"""
     Base.metadata.create_all(bind=engine)
+    add_missing_enum_values(engine, Base.metadata)
+    _add_missing_columns()
+    _create_missing_indexes()
+
+
+def _add_missing_columns():
+    """为已存在的表补加新增的可空列（create_all 不修改已有的表）"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
 
+def _create_missing_indexes():
+    """为已存在的表补建新增的索引（create_all 只在建表时创建索引）"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
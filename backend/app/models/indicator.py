@@ -11,6 +11,7 @@ class IndicatorCategory(str, enum.Enum):
     BASIC_PERFORMANCE = "basic_performance"    # 基础性能指标
     GENERATION_TASK = "generation_task"       # 生成任务指标
     GENERALIZATION = "generalization"         # 通用化特征指标
+    EFFICIENCY = "efficiency"                 # 效率指标（延迟、吞吐量、错误率）
     CUSTOM = "custom"                         # 自定义指标
 
 
@@ -0,0 +1,34 @@
+"""排行榜模型"""
+
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, UniqueConstraint
+from .database import Base
+
+# indicator_id 为该值的行是综合得分
+OVERALL_INDICATOR_ID = 0
+
+
+class LeaderboardEntry(Base):
+    """排行榜条目（物化的结果汇总）
+
+    任务完成时为综合得分和每个指标各写入一行，排行榜查询只需走
+    (dataset_key, indicator_id, score) 索引，不需要读取和解析评估结果。
+    """
+    __tablename__ = "leaderboard_entries"
+    __table_args__ = (
+        UniqueConstraint("task_id", "indicator_id", name="uq_leaderboard_task_indicator"),
+        Index("ix_leaderboard_dataset_indicator_score", "dataset_key", "indicator_id", "score"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey("evaluation_tasks.id"), nullable=False)
+    result_id = Column(Integer, nullable=False)
+    dataset_key = Column(String(600), nullable=False)  # 数据集标识（类型 + 路径）
+    indicator_id = Column(Integer, nullable=False)     # 0 表示综合得分
+
+    score = Column(Float, nullable=False)
+
+    # 展示用的冗余字段，避免查询时关联任务表
+    task_name = Column(String(200))
+    agent_api_endpoint = Column(String(500))
+    processed_samples = Column(Integer)
+    completed_at = Column(DateTime(timezone=True))
@@ -0,0 +1,100 @@
+"""数据迁移"""
+
+from typing import Dict, List, Tuple
+from sqlalchemy import Enum, MetaData, inspect, text
+from sqlalchemy.engine import Engine
+from .types import decode_payload, encode_payload, is_encoded
+
+# 使用 CompressedJSON 存储的列：表名 -> 列名
+PAYLOAD_COLUMNS: Dict[str, List[str]] = {
+    "evaluation_results": ["detailed_results", "radar_chart_data"],
+    "result_items": ["raw_data"],
+}
+
+
+def migrate_payload_columns(engine: Engine, batch_size: int = 500) -> Dict[str, Tuple[int, int, int]]:
+    """把以 JSON 文本存储的旧结果数据转换为压缩格式
+
+    可重复执行，已转换的行会被跳过。返回 表名 -> (转换行数, 转换前字节数, 转换后字节数)。
+    """
+    if engine.dialect.name == "postgresql":
+        _alter_postgresql_columns(engine)
+
+    stats = {}
+    for table, columns in PAYLOAD_COLUMNS.items():
+        converted = bytes_before = bytes_after = 0
+        last_id = 0
+        select_sql = text(
+            f"SELECT id, {', '.join(columns)} FROM {table} WHERE id > :last_id ORDER BY id LIMIT :limit"
+        )
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(select_sql, {"last_id": last_id, "limit": batch_size}).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                for column_index, column in enumerate(columns, start=1):
+                    updates = []
+                    for row in rows:
+                        value = row[column_index]
+                        if value is None or is_encoded(value):
+                            continue
+                        encoded = encode_payload(decode_payload(value))
+                        bytes_before += len(value.encode("utf-8") if isinstance(value, str) else bytes(value))
+                        bytes_after += len(encoded)
+                        updates.append({"id": row[0], "value": encoded})
+                    if updates:
+                        conn.execute(text(f"UPDATE {table} SET {column} = :value WHERE id = :id"), updates)
+                        converted += len(updates)
+        stats[table] = (converted, bytes_before, bytes_after)
+    return stats
+
+
+def _alter_postgresql_columns(engine: Engine):
+    """PostgreSQL 中把 json 列改为 bytea（内容先保留为 UTF-8 JSON 文本，随后再压缩）"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, columns in PAYLOAD_COLUMNS.items():
+            column_types = {col["name"]: str(col["type"]).lower() for col in inspector.get_columns(table)}
+            for column in columns:
+                if column_types.get(column) != "bytea":
+                    conn.execute(text(
+                        f"ALTER TABLE {table} ALTER COLUMN {column} TYPE bytea "
+                        f"USING convert_to({column}::text, 'UTF8')"
+                    ))
+
+
+def add_missing_enum_values(engine: Engine, metadata: MetaData) -> List[Tuple[str, str]]:
+    """PostgreSQL 中为已存在的枚举类型补加新增的取值（create_all 不修改已有的类型）
+
+    枚举列在 PostgreSQL 中是原生 ENUM 类型，模型中新增枚举成员（如指标类别 EFFICIENCY）后，
+    旧库插入新取值会失败。其他数据库按字符串存储，无需处理。返回补加的 (类型名, 取值)。
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+
+    enum_types = {}
+    for table in metadata.sorted_tables:
+        for column in table.columns:
+            if isinstance(column.type, Enum) and column.type.native_enum and column.type.name:
+                enum_types[column.type.name] = column.type.enums
+
+    added = []
+    # ALTER TYPE ... ADD VALUE 新增的取值在提交前不能使用，逐条自动提交
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for type_name, values in enum_types.items():
+            existing = {
+                row[0] for row in conn.execute(text(
+                    "SELECT e.enumlabel FROM pg_enum e JOIN pg_type t ON t.oid = e.enumtypid "
+                    "WHERE t.typname = :name"
+                ), {"name": type_name})
+            }
+            if not existing:
+                # 类型尚不存在（对应的表由 create_all 新建）
+                continue
+            for value in values:
+                if value not in existing:
+                    escaped = value.replace("'", "''")
+                    conn.execute(text(f"ALTER TYPE {type_name} ADD VALUE IF NOT EXISTS '{escaped}'"))
+                    added.append((type_name, value))
+    return added
@@ -0,0 +1,30 @@
+"""任务性能剖析模型"""
+
+from sqlalchemy import Column, Integer, Float, Boolean, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from .database import Base
+from .types import CompressedJSON
+
+
+class TaskProfile(Base):
+    """任务最近一次执行的采样剖析数据
+
+    stacks 为折叠调用栈（"外层;...;内层" -> 采样次数），每个采样点对每个协程计一次，
+    因此并发执行时采样次数之和会大于采样轮数。
+    """
+    __tablename__ = "task_profiles"
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey("evaluation_tasks.id"), nullable=False, unique=True)
+
+    interval_ms = Column(Float, nullable=False)       # 采样间隔（毫秒）
+    duration_seconds = Column(Float, default=0.0)     # 剖析时长
+    ticks = Column(Integer, default=0)                # 采样轮数
+    sample_count = Column(Integer, default=0)         # 调用栈采样次数
+    truncated = Column(Boolean, default=False)        # 是否因达到采样上限而提前停止
+    stacks = Column(CompressedJSON)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    task = relationship("EvaluationTask", back_populates="profile")
@@ -4,6 +4,7 @@ from sqlalchemy import Column, Integer, String, Float, Text, DateTime, JSON, For
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .database import Base
+from .types import CompressedJSON
 
 
 class EvaluationResult(Base):
@@ -18,13 +19,13 @@ class EvaluationResult(Base):
     
     # 结果详情
     summary = Column(JSON)         # 结果摘要
-    detailed_results = Column(JSON) # 详细结果数据
+    detailed_results = Column(CompressedJSON) # 详细结果数据（压缩存储）
     
     # 分析报告
     analysis_report = Column(Text)  # 文本分析报告
     
     # 可视化数据
-    radar_chart_data = Column(JSON) # 雷达图数据
+    radar_chart_data = Column(CompressedJSON) # 雷达图数据（压缩存储）
     correlation_matrix = Column(JSON) # 指标关联矩阵
     
     # 时间戳
@@ -48,7 +49,7 @@ class ResultItem(Base):
     weighted_score = Column(Float)  # 加权后的得分
     
     # 详细数据
-    raw_data = Column(JSON)         # 原始计算结果
+    raw_data = Column(CompressedJSON)  # 原始计算结果（压缩存储）
     extra_metadata = Column(JSON)   # 额外的元数据（避免与SQLAlchemy的metadata冲突）
     
     # 时间戳
@@ -0,0 +1,42 @@
+"""逐样本结果模型"""
+
+from sqlalchemy import Column, Integer, String, Float, Text, JSON, ForeignKey, Index, UniqueConstraint
+from .database import Base
+
+
+class SampleResponse(Base):
+    """智能体对单个样本的响应"""
+    __tablename__ = "sample_responses"
+    __table_args__ = (
+        UniqueConstraint("task_id", "sample_index", name="uq_sample_response"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey("evaluation_tasks.id"), nullable=False)
+    sample_index = Column(Integer, nullable=False)  # 样本在数据集中的下标
+
+    response = Column(Text)  # 智能体响应文本
+    # 调用统计：latency_ms、ttft_ms（流式）、output_tokens、tokens_per_second、streamed
+    call_stats = Column(JSON(none_as_null=True))
+
+
+class SampleResult(Base):
+    """单个样本在单个指标上的得分
+
+    响应文本通过 (task_id, sample_index) 关联到 SampleResponse。
+    """
+    __tablename__ = "sample_results"
+    __table_args__ = (
+        UniqueConstraint("task_id", "sample_index", "indicator_id", name="uq_sample_result"),
+        # 按指标和得分范围筛选、查询得分最低的样本
+        Index("ix_sample_results_task_indicator_score", "task_id", "indicator_id", "score"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey("evaluation_tasks.id"), nullable=False)
+    sample_index = Column(Integer, nullable=False)  # 样本在数据集中的下标
+    indicator_id = Column(Integer, ForeignKey("indicators.id"), nullable=False)
+
+    score = Column(Float, nullable=False)
+    error = Column(String(500))  # 指标计算出错时的错误信息
+    details = Column(JSON(none_as_null=True))  # 指标返回的其他字段（如ROUGE的精确率/召回率）
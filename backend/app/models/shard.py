@@ -0,0 +1,48 @@
+"""分布式评估分片模型"""
+
+from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, UniqueConstraint, Enum as SQLEnum
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+import enum
+from .database import Base
+
+
+class ShardStatus(str, enum.Enum):
+    """分片状态枚举"""
+    PENDING = "pending"           # 等待领取
+    LEASED = "leased"             # 已被节点租约领取
+    COMPLETED = "completed"       # 已完成
+    FAILED = "failed"             # 多次处理失败，不再领取
+
+
+class TaskShard(Base):
+    """评估任务分片（一段连续的样本区间，由工作节点通过租约领取）"""
+    __tablename__ = "task_shards"
+    __table_args__ = (
+        UniqueConstraint("task_id", "shard_index", name="uq_task_shard_index"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(Integer, ForeignKey("evaluation_tasks.id"), nullable=False, index=True)
+    shard_index = Column(Integer, nullable=False)
+
+    # 样本区间 [start_index, end_index)
+    start_index = Column(Integer, nullable=False)
+    end_index = Column(Integer, nullable=False)
+
+    # 租约
+    status = Column(SQLEnum(ShardStatus), default=ShardStatus.PENDING, nullable=False, index=True)
+    lease_owner = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True, index=True)
+    attempts = Column(Integer, default=0)
+
+    # 分片的部分聚合结果（每个指标的可合并统计量及样本明细）
+    partial_results = Column(JSON)
+    processed_samples = Column(Integer, default=0)
+
+    # 时间戳
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # 关系
+    task = relationship("EvaluationTask", back_populates="shards")
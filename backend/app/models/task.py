@@ -1,6 +1,6 @@
 """评估任务模型"""
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, Index, Enum as SQLEnum
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -19,6 +19,12 @@ class TaskStatus(str, enum.Enum):
 class EvaluationTask(Base):
     """评估任务模型"""
     __tablename__ = "evaluation_tasks"
+    __table_args__ = (
+        # 任务列表按 (created_at, id) 键集分页
+        Index("ix_evaluation_tasks_created_id", "created_at", "id"),
+        # 增量查询最近变化的任务
+        Index("ix_evaluation_tasks_updated_at", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(200), nullable=False, index=True)
@@ -55,4 +61,7 @@ class EvaluationTask(Base):
     # 关系
     result = relationship("EvaluationResult", back_populates="task", uselist=False)
     user = relationship("User")
+    shards = relationship("TaskShard", back_populates="task", cascade="all, delete-orphan")
+    archive = relationship("TaskArchive", back_populates="task", uselist=False, cascade="all, delete-orphan")
+    profile = relationship("TaskProfile", back_populates="task", uselist=False, cascade="all, delete-orphan")
 
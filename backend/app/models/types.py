@@ -0,0 +1,107 @@
+"""自定义列类型
+
+CompressedJSON 用于体积较大的结果数据（详细结果、原始计算数据、雷达图数据）：
+写入时编码为 msgpack 并用 zstd 压缩，读取时透明解码。读取时同样兼容迁移前
+以 JSON 文本存储的旧数据。
+"""
+
+import json
+import zlib
+from typing import Any, Optional
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+try:
+    import msgpack
+    import zstandard
+except ImportError:  # 未安装时退化为 JSON + zlib
+    msgpack = None
+    zstandard = None
+
+# 编码格式（首字节），JSON 文本的首字节不会是这些值
+FORMAT_MSGPACK_ZSTD = 0x01   # msgpack + zstd
+FORMAT_MSGPACK = 0x02        # msgpack（数据较小，压缩不划算）
+FORMAT_JSON_ZLIB = 0x03      # JSON + zlib（未安装 msgpack/zstandard 时使用）
+
+# 小于该字节数的数据不压缩
+COMPRESS_MIN_BYTES = 256
+ZSTD_LEVEL = 3
+
+_zstd_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL) if zstandard else None
+_zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+
+def _normalize_keys(value: Any) -> Any:
+    """把字典键转换为字符串，保持与 JSON 列相同的读出结果（如指标ID键读出为字符串）"""
+    if isinstance(value, dict):
+        return {
+            (key if isinstance(key, str) else json.dumps(key)): _normalize_keys(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [_normalize_keys(item) for item in value]
+    return value
+
+
+def encode_payload(value: Any) -> bytes:
+    """编码结果数据"""
+    value = _normalize_keys(value)
+    if msgpack is None:
+        return bytes([FORMAT_JSON_ZLIB]) + zlib.compress(
+            json.dumps(value, ensure_ascii=False).encode("utf-8")
+        )
+    packed = msgpack.packb(value, use_bin_type=True)
+    if len(packed) < COMPRESS_MIN_BYTES:
+        return bytes([FORMAT_MSGPACK]) + packed
+    return bytes([FORMAT_MSGPACK_ZSTD]) + _zstd_compressor.compress(packed)
+
+
+def decode_payload(data: Any) -> Any:
+    """解码结果数据（兼容 JSON 文本格式的旧数据）"""
+    if isinstance(data, str):
+        return json.loads(data)
+    data = bytes(data)
+    if not data:
+        return None
+    fmt = data[0]
+    if fmt in (FORMAT_MSGPACK_ZSTD, FORMAT_MSGPACK):
+        if msgpack is None:
+            raise RuntimeError("读取压缩的结果数据需要安装 msgpack 和 zstandard")
+        body = data[1:]
+        if fmt == FORMAT_MSGPACK_ZSTD:
+            body = _zstd_decompressor.decompress(body)
+        return msgpack.unpackb(body, raw=False)
+    if fmt == FORMAT_JSON_ZLIB:
+        return json.loads(zlib.decompress(data[1:]).decode("utf-8"))
+    # 迁移前的 JSON 文本（部分驱动以字节形式返回）
+    return json.loads(data.decode("utf-8"))
+
+
+def is_encoded(data: Any) -> bool:
+    """数据是否已经是编码后的格式"""
+    return isinstance(data, (bytes, bytearray, memoryview)) and len(data) > 0 and bytes(data[:1])[0] in (
+        FORMAT_MSGPACK_ZSTD, FORMAT_MSGPACK, FORMAT_JSON_ZLIB
+    )
+
+
+class _RawBinary(LargeBinary):
+    """不做结果转换的二进制类型：迁移前的旧数据可能以文本形式读出，交给 decode_payload 处理"""
+
+    def result_processor(self, dialect, coltype):
+        return None
+
+
+class CompressedJSON(TypeDecorator):
+    """以压缩二进制存储的 JSON 数据"""
+
+    impl = _RawBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect) -> Optional[bytes]:
+        if value is None:
+            return None
+        return encode_payload(value)
+
+    def process_result_value(self, value: Any, dialect) -> Any:
+        if value is None:
+            return None
+        return decode_payload(value)
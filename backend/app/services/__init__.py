@@ -1,12 +1,26 @@
-"""服务层模块"""
+"""服务层模块
 
-from .task_service import TaskService
-from .indicator_service import IndicatorService
-from .evaluation_service import EvaluationService
+子模块按需导入，避免只需要任务列表等轻量接口的进程加载评估相关的依赖。
+"""
 
-__all__ = [
-    "TaskService",
-    "IndicatorService",
-    "EvaluationService",
-]
+import importlib
 
+# 导出名称 -> 所在子模块
+_EXPORTS = {
+    "TaskService": "task_service",
+    "IndicatorService": "indicator_service",
+    "EvaluationService": "evaluation_service",
+    "DistributedService": "distributed_service",
+    "ResultService": "result_service",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,70 @@
+"""智能体端点的 HTTP 客户端连接池
+
+每个事件循环中每个端点复用一个 httpx.AsyncClient，保持连接，避免每次调用都重新创建客户端、
+建立 TCP/TLS 连接。httpx 的连接绑定在创建它的事件循环上，因此按 (事件循环, 端点) 区分；
+调度线程、API 事件循环和分布式工作节点各自持有自己的客户端。
+"""
+
+import asyncio
+import threading
+from typing import Any, Dict, Tuple
+
+# 关闭其他事件循环中的客户端时的最长等待（秒）
+CLOSE_TIMEOUT_SECONDS = 5.0
+
+
+class AgentClientPool:
+    """按事件循环和端点复用的 httpx.AsyncClient"""
+
+    _clients: Dict[Tuple[asyncio.AbstractEventLoop, str], Any] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get(endpoint_key: str):
+        """获取当前事件循环中该端点的客户端，不存在时创建
+
+        超时按请求传入，客户端本身不限制连接数（在途请求数由调度器的端点名额控制）。
+        """
+        import httpx
+        loop = asyncio.get_running_loop()
+        with AgentClientPool._lock:
+            # 清理已关闭的事件循环留下的客户端
+            for key in [key for key in AgentClientPool._clients if key[0].is_closed()]:
+                del AgentClientPool._clients[key]
+            client = AgentClientPool._clients.get((loop, endpoint_key))
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(limits=httpx.Limits(max_connections=None))
+                AgentClientPool._clients[(loop, endpoint_key)] = client
+            return client
+
+    @staticmethod
+    async def close():
+        """关闭当前事件循环中的客户端（工作节点退出时调用）"""
+        loop = asyncio.get_running_loop()
+        with AgentClientPool._lock:
+            keys = [key for key in AgentClientPool._clients if key[0] is loop]
+            clients = [AgentClientPool._clients.pop(key) for key in keys]
+        for client in clients:
+            await client.aclose()
+
+    @staticmethod
+    async def close_all():
+        """关闭所有事件循环中的客户端（服务关闭时调用）
+
+        其他事件循环中的客户端提交到所属事件循环关闭；所属事件循环已停止时直接丢弃。
+        """
+        loop = asyncio.get_running_loop()
+        with AgentClientPool._lock:
+            entries = list(AgentClientPool._clients.items())
+            AgentClientPool._clients.clear()
+        for (client_loop, _), client in entries:
+            try:
+                if client_loop is loop:
+                    await client.aclose()
+                elif client_loop.is_running():
+                    await asyncio.wait_for(
+                        asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), client_loop)),
+                        CLOSE_TIMEOUT_SECONDS
+                    )
+            except Exception as e:
+                print(f"关闭智能体客户端失败: {e}")
@@ -0,0 +1,273 @@
+"""归档服务
+
+已完成任务的逐样本结果和响应按完成日期、任务ID分区写入 Parquet 文件：
+
+    {ARCHIVE_DIR}/sample_results/completed_date=2024-05-01/task_id=12/part-0.parquet
+    {ARCHIVE_DIR}/sample_responses/completed_date=2024-05-01/task_id=12/part-0.parquet
+
+逐样本结果按 (indicator_id, sample_index) 排序写入，每个行组的 indicator_id 范围很窄，
+按指标查询时可以借助行组统计信息跳过无关行组。
+"""
+
+import glob
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from ..models.archive import TaskArchive
+from ..models.database import DATABASE_URL
+from ..models.sample_result import SampleResult, SampleResponse
+from ..models.task import EvaluationTask, TaskStatus
+from ..services.sample_result_service import SampleResultService
+
+
+def _default_archive_dir() -> str:
+    """默认归档目录：SQLite 数据库文件所在目录下的 archive，其他数据库为 backend/archive
+
+    不使用相对于当前工作目录的路径，避免从不同目录启动服务时归档到不同位置。
+    """
+    url = make_url(DATABASE_URL)
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        return os.path.join(os.path.dirname(os.path.abspath(url.database)), "archive")
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "archive")
+
+
+# 归档文件根目录
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR") or _default_archive_dir()
+# 每个行组的最大行数
+ARCHIVE_ROW_GROUP_SIZE = int(os.getenv("ARCHIVE_ROW_GROUP_SIZE", "16384"))
+
+RESULTS_DATASET = "sample_results"
+RESPONSES_DATASET = "sample_responses"
+# 可查询的列
+RESULT_COLUMNS = ["task_id", "completed_date", "sample_index", "indicator_id", "score", "error", "details"]
+
+
+def _pyarrow():
+    """按需导入 pyarrow（只有归档相关功能需要）"""
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("归档功能需要安装 pyarrow")
+    return pyarrow
+
+
+class ArchiveService:
+    """逐样本数据的 Parquet 归档与查询"""
+
+    @staticmethod
+    def archive_completed_tasks(db: Session, older_than_days: int = 30, limit: Optional[int] = None) -> List[int]:
+        """归档完成时间早于 older_than_days 天的任务，返回归档的任务ID"""
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        query = (
+            db.query(EvaluationTask.id)
+            .outerjoin(TaskArchive, TaskArchive.task_id == EvaluationTask.id)
+            .filter(
+                EvaluationTask.status == TaskStatus.COMPLETED,
+                EvaluationTask.completed_at < cutoff,
+                TaskArchive.id.is_(None)
+            )
+            .order_by(EvaluationTask.completed_at)
+        )
+        if limit:
+            query = query.limit(limit)
+
+        archived = []
+        for (task_id,) in query.all():
+            ArchiveService.archive_task(db, task_id)
+            archived.append(task_id)
+        return archived
+
+    @staticmethod
+    def archive_task(db: Session, task_id: int) -> TaskArchive:
+        """归档单个已完成任务的逐样本数据，并从数据库中删除"""
+        pa = _pyarrow()
+        task = db.query(EvaluationTask).filter(EvaluationTask.id == task_id).first()
+        if not task:
+            raise ValueError(f"任务不存在: {task_id}")
+        if task.status != TaskStatus.COMPLETED:
+            raise ValueError(f"只能归档已完成的任务，当前状态: {task.status.value}")
+        if task.archive:
+            return task.archive
+
+        completed_date = (task.completed_at or task.updated_at or task.created_at).strftime("%Y-%m-%d")
+
+        results = (
+            db.query(
+                SampleResult.sample_index, SampleResult.indicator_id, SampleResult.score,
+                SampleResult.error, SampleResult.details
+            )
+            .filter(SampleResult.task_id == task_id)
+            .order_by(SampleResult.indicator_id, SampleResult.sample_index)
+            .all()
+        )
+        results_table = pa.table({
+            "sample_index": pa.array([row.sample_index for row in results], pa.int32()),
+            "indicator_id": pa.array([row.indicator_id for row in results], pa.int32()),
+            "score": pa.array([row.score for row in results], pa.float64()),
+            "error": pa.array([row.error for row in results], pa.string()),
+            "details": pa.array(
+                [json.dumps(row.details, ensure_ascii=False) if row.details is not None else None for row in results],
+                pa.string()
+            ),
+        })
+
+        responses = (
+            db.query(SampleResponse.sample_index, SampleResponse.response)
+            .filter(SampleResponse.task_id == task_id)
+            .order_by(SampleResponse.sample_index)
+            .all()
+        )
+        responses_table = pa.table({
+            "sample_index": pa.array([row.sample_index for row in responses], pa.int32()),
+            "response": pa.array([row.response for row in responses], pa.string()),
+        })
+
+        # 先写文件再提交数据库：中途失败时数据库中的数据完好，重新归档会覆盖文件
+        ArchiveService._write_partition(RESULTS_DATASET, completed_date, task_id, results_table)
+        ArchiveService._write_partition(RESPONSES_DATASET, completed_date, task_id, responses_table)
+
+        archive = TaskArchive(
+            task_id=task_id,
+            completed_date=completed_date,
+            result_rows=len(results),
+            response_rows=len(responses)
+        )
+        db.add(archive)
+        SampleResultService.delete_for_task(db, task_id)
+        db.commit()
+        return archive
+
+    @staticmethod
+    def delete_task_archive(db: Session, task_id: int):
+        """删除任务的归档文件（不提交事务，记录随任务级联删除）"""
+        archive = db.query(TaskArchive).filter(TaskArchive.task_id == task_id).first()
+        if not archive:
+            return
+        for dataset in (RESULTS_DATASET, RESPONSES_DATASET):
+            shutil.rmtree(ArchiveService._partition_dir(dataset, archive.completed_date, task_id), ignore_errors=True)
+        db.delete(archive)
+
+    @staticmethod
+    def query_samples(
+        task_ids: Optional[List[int]] = None,
+        indicator_ids: Optional[List[int]] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+        include_response: bool = False,
+        limit: int = 1000
+    ) -> Dict[str, Any]:
+        """查询归档的逐样本结果
+
+        任务和日期条件作用于分区目录，只打开匹配的文件；指标条件借助行组统计信息过滤；
+        只读取请求的列。
+        """
+        pa = _pyarrow()
+        columns = columns or RESULT_COLUMNS
+        unknown = [column for column in columns if column not in RESULT_COLUMNS]
+        if unknown:
+            raise ValueError(f"无效的列: {', '.join(unknown)}")
+
+        dataset = ArchiveService._open_dataset(RESULTS_DATASET, task_ids)
+        if dataset is None:
+            return {"items": [], "count": 0, "truncated": False}
+
+        field = pa.dataset.field
+        conditions = []
+        if task_ids:
+            conditions.append(field("task_id").isin(task_ids))
+        if start_date:
+            conditions.append(field("completed_date") >= start_date)
+        if end_date:
+            conditions.append(field("completed_date") <= end_date)
+        if indicator_ids:
+            conditions.append(field("indicator_id").isin(indicator_ids))
+        condition = None
+        for item in conditions:
+            condition = item if condition is None else condition & item
+
+        # 关联响应时需要定位到样本
+        read_columns = list(dict.fromkeys(columns + (["task_id", "sample_index"] if include_response else [])))
+        table = dataset.head(limit + 1, columns=read_columns, filter=condition)
+        truncated = table.num_rows > limit
+        items = table.slice(0, limit).to_pylist()
+
+        for item in items:
+            if item.get("details") is not None:
+                item["details"] = json.loads(item["details"])
+        if include_response and items:
+            responses = ArchiveService._load_responses(items)
+            for item in items:
+                item["response"] = responses.get((item["task_id"], item["sample_index"]))
+        return {"items": items, "count": len(items), "truncated": truncated}
+
+    @staticmethod
+    def _load_responses(items: List[Dict[str, Any]]) -> Dict[tuple, Optional[str]]:
+        """读取结果对应的响应文本"""
+        pa = _pyarrow()
+        task_ids = sorted({item["task_id"] for item in items})
+        dataset = ArchiveService._open_dataset(RESPONSES_DATASET, task_ids)
+        if dataset is None:
+            return {}
+        field = pa.dataset.field
+        sample_indices = sorted({item["sample_index"] for item in items})
+        table = dataset.to_table(
+            columns=["task_id", "sample_index", "response"],
+            filter=field("task_id").isin(task_ids) & field("sample_index").isin(sample_indices)
+        )
+        return {
+            (row["task_id"], row["sample_index"]): row["response"]
+            for row in table.to_pylist()
+        }
+
+    @staticmethod
+    def _open_dataset(name: str, task_ids: Optional[List[int]] = None):
+        """打开归档数据集；指定任务时只打开这些任务的分区文件，不扫描整个目录树"""
+        pa = _pyarrow()
+        root = os.path.join(ARCHIVE_DIR, name)
+        if not os.path.isdir(root):
+            return None
+        partitioning = pa.dataset.partitioning(
+            pa.schema([("completed_date", pa.string()), ("task_id", pa.int64())]),
+            flavor="hive"
+        )
+        if not task_ids:
+            return pa.dataset.dataset(root, format="parquet", partitioning=partitioning)
+
+        files = sorted(
+            path
+            for task_id in set(task_ids)
+            for path in glob.glob(os.path.join(root, "completed_date=*", f"task_id={task_id}", "*.parquet"))
+        )
+        if not files:
+            return None
+        return pa.dataset.dataset(
+            files, format="parquet", partitioning=partitioning, partition_base_dir=root
+        )
+
+    @staticmethod
+    def _partition_dir(dataset: str, completed_date: str, task_id: int) -> str:
+        return os.path.join(ARCHIVE_DIR, dataset, f"completed_date={completed_date}", f"task_id={task_id}")
+
+    @staticmethod
+    def _write_partition(dataset: str, completed_date: str, task_id: int, table):
+        """写入一个分区（先写临时文件再重命名）"""
+        pa = _pyarrow()
+        directory = ArchiveService._partition_dir(dataset, completed_date, task_id)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "part-0.parquet")
+        # 以 "." 开头的文件不会被数据集扫描到
+        tmp_path = os.path.join(directory, ".part-0.parquet.tmp")
+        pa.parquet.write_table(
+            table, tmp_path,
+            row_group_size=ARCHIVE_ROW_GROUP_SIZE,
+            compression="zstd",
+            write_statistics=True
+        )
+        os.replace(tmp_path, path)
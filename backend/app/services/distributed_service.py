@@ -0,0 +1,495 @@
+"""分布式评估服务
+
+任务被切分为若干样本区间（分片），多个工作节点通过共享数据库中的租约领取分片。
+每个节点把分片的部分聚合结果写回数据库，最后一个完成分片的节点负责合并生成
+EvaluationResult。租约过期的分片（节点崩溃或失联）会被其他节点重新领取；处理出错的
+分片立即释放租约重试，领取次数达到上限后分片标记为失败，任务随之失败。
+"""
+
+import asyncio
+import json
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from ..models.shard import TaskShard, ShardStatus
+from ..models.task import EvaluationTask, TaskStatus
+from ..services.task_service import TaskService
+from ..services.agent_clients import AgentClientPool
+from ..services.evaluation_service import EvaluationService
+from ..services.leaderboard_service import LeaderboardService
+from ..services.result_service import ResultCache
+from ..services.sample_result_service import SampleResultService
+from ..services.scheduler import EvaluationScheduler
+from ..services.usage_service import UsageService, UsageStats
+from ..utils.statistics import RunningStats, ValueStats
+from ..utils.tokens import load_encoding
+
+# 默认分片大小（样本数）
+DEFAULT_SHARD_SIZE = 100
+# 默认租约时长（秒），节点在处理过程中会周期性续约
+DEFAULT_LEASE_SECONDS = 60
+# 工作节点处理分片时的默认样本并发数
+DEFAULT_WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4"))
+# 分片最多被领取的次数（处理出错或节点失联都计一次），达到后分片标记为失败
+MAX_SHARD_ATTEMPTS = int(os.getenv("SHARD_MAX_ATTEMPTS", "3"))
+
+
+class DistributedService:
+    """基于租约的分布式评估服务"""
+
+    @staticmethod
+    def default_worker_id() -> str:
+        """生成默认的工作节点ID（主机名-进程号）"""
+        return f"{socket.gethostname()}-{os.getpid()}"
+
+    @staticmethod
+    async def prepare_task(db: Session, task_id: int, shard_size: int = DEFAULT_SHARD_SIZE) -> int:
+        """加载数据集并将任务切分为分片，返回分片数量"""
+        task = TaskService.get_task(db, task_id)
+        if not task:
+            raise ValueError(f"任务不存在: {task_id}")
+        if shard_size <= 0:
+            raise ValueError("分片大小必须大于0")
+
+        # 提前校验指标配置，避免所有节点领取后才失败
+        EvaluationService._load_indicators(db, task)
+        dataset = await EvaluationService._load_dataset(task)
+        total_samples = len(dataset)
+
+        # 清理上次运行留下的分片、结果和逐样本明细
+        if task.result:
+            ResultCache.invalidate(task.result.id)
+            db.delete(task.result)
+        for shard in list(task.shards):
+            db.delete(shard)
+        SampleResultService.delete_for_task(db, task_id)
+        LeaderboardService.remove_task(db, task_id)
+        db.flush()
+
+        for shard_index, start in enumerate(range(0, total_samples, shard_size)):
+            db.add(TaskShard(
+                task_id=task_id,
+                shard_index=shard_index,
+                start_index=start,
+                end_index=min(start + shard_size, total_samples),
+                status=ShardStatus.PENDING
+            ))
+        db.commit()
+
+        TaskService.update_task_progress(db, task_id, 0, total_samples)
+        TaskService.update_task_status(db, task_id, TaskStatus.RUNNING, "0%")
+        return (total_samples + shard_size - 1) // shard_size
+
+    @staticmethod
+    def claim_shard(
+        db: Session,
+        worker_id: str,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS
+    ) -> Optional[TaskShard]:
+        """领取一个可用分片（等待中或租约已过期），未领取到返回None
+
+        通过带条件的 UPDATE 实现比较并交换，多个节点同时领取同一分片时只有一个成功。
+        """
+        now = datetime.utcnow()
+        DistributedService._fail_exhausted_shards(db, now)
+        claimable = and_(
+            TaskShard.attempts < MAX_SHARD_ATTEMPTS,
+            or_(
+                TaskShard.status == ShardStatus.PENDING,
+                and_(TaskShard.status == ShardStatus.LEASED, TaskShard.lease_expires_at < now)
+            )
+        )
+        candidates = (
+            db.query(TaskShard.id)
+            .join(EvaluationTask, EvaluationTask.id == TaskShard.task_id)
+            .filter(EvaluationTask.status == TaskStatus.RUNNING)
+            .filter(claimable)
+            .order_by(TaskShard.task_id, TaskShard.shard_index)
+            .limit(10)
+            .all()
+        )
+
+        for (shard_id,) in candidates:
+            claimed = db.execute(
+                update(TaskShard)
+                .where(TaskShard.id == shard_id)
+                .where(claimable)
+                .values(
+                    status=ShardStatus.LEASED,
+                    lease_owner=worker_id,
+                    lease_expires_at=now + timedelta(seconds=lease_seconds),
+                    attempts=TaskShard.attempts + 1
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+            if claimed == 1:
+                return db.query(TaskShard).filter(TaskShard.id == shard_id).first()
+        return None
+
+    @staticmethod
+    def _fail_exhausted_shards(db: Session, now: datetime):
+        """把领取次数已达上限、租约又已过期的分片（节点每次处理都失联）标记为失败"""
+        exhausted = (
+            db.query(TaskShard.id, TaskShard.task_id)
+            .join(EvaluationTask, EvaluationTask.id == TaskShard.task_id)
+            .filter(EvaluationTask.status == TaskStatus.RUNNING)
+            .filter(TaskShard.attempts >= MAX_SHARD_ATTEMPTS)
+            .filter(or_(
+                TaskShard.status == ShardStatus.PENDING,
+                and_(TaskShard.status == ShardStatus.LEASED, TaskShard.lease_expires_at < now)
+            ))
+            .all()
+        )
+        for shard_id, task_id in exhausted:
+            failed = db.execute(
+                update(TaskShard)
+                .where(TaskShard.id == shard_id)
+                .where(TaskShard.status.in_([ShardStatus.PENDING, ShardStatus.LEASED]))
+                .values(
+                    status=ShardStatus.FAILED,
+                    partial_results={"error": "处理分片的节点失联"},
+                    lease_expires_at=None
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+            if failed == 1:
+                DistributedService.finalize_task(db, task_id)
+
+    @staticmethod
+    def release_shard(db: Session, shard_id: int, worker_id: str, error: Exception) -> bool:
+        """处理分片出错时释放租约：未达领取上限时放回等待领取，否则标记为失败并让任务失败
+
+        返回分片是否被标记为失败。
+        """
+        shard = db.query(TaskShard).filter(TaskShard.id == shard_id).first()
+        if shard is None:
+            return False
+        exhausted = (shard.attempts or 0) >= MAX_SHARD_ATTEMPTS
+        released = db.execute(
+            update(TaskShard)
+            .where(TaskShard.id == shard_id)
+            .where(TaskShard.status == ShardStatus.LEASED)
+            .where(TaskShard.lease_owner == worker_id)
+            .values(
+                status=ShardStatus.FAILED if exhausted else ShardStatus.PENDING,
+                partial_results={"error": str(error)[:500]},
+                lease_expires_at=None
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if released == 1 and exhausted:
+            DistributedService.finalize_task(db, shard.task_id)
+            return True
+        return False
+
+    @staticmethod
+    def renew_lease(
+        db: Session,
+        shard_id: int,
+        worker_id: str,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS
+    ) -> bool:
+        """续约，租约已被他人接管或任务不再运行时返回False"""
+        renewed = db.execute(
+            update(TaskShard)
+            .where(TaskShard.id == shard_id)
+            .where(TaskShard.status == ShardStatus.LEASED)
+            .where(TaskShard.lease_owner == worker_id)
+            .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if renewed != 1:
+            return False
+
+        status = (
+            db.query(EvaluationTask.status)
+            .join(TaskShard, TaskShard.task_id == EvaluationTask.id)
+            .filter(TaskShard.id == shard_id)
+            .scalar()
+        )
+        return status == TaskStatus.RUNNING
+
+    @staticmethod
+    def complete_shard(
+        db: Session,
+        shard_id: int,
+        worker_id: str,
+        partial_results: Dict[str, Any],
+        processed_samples: int,
+        response_rows: List[Dict[str, Any]] = None,
+        result_rows: List[Dict[str, Any]] = None
+    ) -> bool:
+        """提交分片的部分聚合结果和逐样本明细，仍持有租约时才会写入
+
+        明细与分片状态在同一事务中写入：先清理该区间可能残留的明细（之前持有租约的
+        节点失联前写入的），租约校验失败时整体回滚。
+        """
+        shard = db.query(TaskShard).filter(TaskShard.id == shard_id).first()
+        if shard is None:
+            return False
+        SampleResultService.delete_for_task(db, shard.task_id, shard.start_index, shard.end_index)
+        SampleResultService.write(db, response_rows or [], result_rows or [])
+
+        completed = db.execute(
+            update(TaskShard)
+            .where(TaskShard.id == shard_id)
+            .where(TaskShard.status == ShardStatus.LEASED)
+            .where(TaskShard.lease_owner == worker_id)
+            .values(
+                status=ShardStatus.COMPLETED,
+                partial_results=partial_results,
+                processed_samples=processed_samples,
+                lease_expires_at=None
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if completed != 1:
+            db.rollback()
+            return False
+        db.commit()
+        return True
+
+    @staticmethod
+    def build_partial_results(results: List[Dict[int, Dict[str, Any]]]) -> Dict[str, Any]:
+        """把分片内各样本的指标结果压缩为可合并的部分聚合"""
+        partial: Dict[str, RunningStats] = {}
+        values: Dict[str, ValueStats] = {}
+        for sample_results in results:
+            for ind_id, result_data in sample_results.items():
+                partial.setdefault(str(ind_id), RunningStats()).add(result_data.get("score", 0.0))
+                if result_data.get("value") is not None:
+                    values.setdefault(str(ind_id), ValueStats()).add(result_data)
+        merged = {ind_id: {"stats": stats.to_dict()} for ind_id, stats in partial.items()}
+        for ind_id, value_stats in values.items():
+            merged[ind_id]["values"] = value_stats.to_dict()
+        return merged
+
+    @staticmethod
+    def merge_partial_results(
+        partials: List[Dict[str, Any]],
+        indicators: List[Any]
+    ) -> Dict[int, Dict[str, Any]]:
+        """合并各分片的部分聚合，输出与 _aggregate_results 相同的结构"""
+        aggregated = {}
+        for indicator in indicators:
+            stats = RunningStats()
+            values = ValueStats()
+            for partial in partials:
+                entry = (partial or {}).get(str(indicator.id))
+                if entry:
+                    stats.merge(RunningStats.from_dict(entry["stats"]))
+                    if entry.get("values"):
+                        values.merge(ValueStats.from_dict(entry["values"]))
+
+            aggregated[indicator.id] = {
+                "score": stats.mean if stats.count else 0.0,
+                "min": stats.min if stats.count else 0.0,
+                "max": stats.max if stats.count else 0.0,
+                "std": stats.std,
+                "count": stats.count,
+                **values.summary(stats.count)
+            }
+        return aggregated
+
+    @staticmethod
+    def finalize_task(db: Session, task_id: int) -> bool:
+        """所有分片完成后合并生成最终结果，返回是否由本节点完成合并；有分片失败时任务标记为失败"""
+        task = TaskService.get_task(db, task_id)
+        if not task or task.status != TaskStatus.RUNNING or task.result:
+            return False
+
+        shards = (
+            db.query(TaskShard)
+            .filter(TaskShard.task_id == task_id)
+            .order_by(TaskShard.shard_index)
+            .all()
+        )
+        processed = sum(shard.processed_samples or 0 for shard in shards if shard.status == ShardStatus.COMPLETED)
+        total_samples = shards[-1].end_index if shards else 0
+        failed = [shard for shard in shards if shard.status == ShardStatus.FAILED]
+        if failed:
+            error = (failed[0].partial_results or {}).get("error") or "未知错误"
+            EvaluationService._mark_failed(db, task_id, RuntimeError(
+                f"分片 {failed[0].shard_index} 领取 {failed[0].attempts} 次后仍处理失败: {error}"
+            ))
+            return False
+        if any(shard.status != ShardStatus.COMPLETED for shard in shards):
+            TaskService.update_task_progress(db, task_id, processed, total_samples)
+            return False
+
+        indicators = EvaluationService._load_indicators(db, task)
+        aggregated_results = DistributedService.merge_partial_results(
+            [shard.partial_results for shard in shards], indicators
+        )
+        usage = UsageStats()
+        for shard in shards:
+            if (shard.partial_results or {}).get("usage"):
+                usage.merge(UsageStats.from_dict(shard.partial_results["usage"]))
+        try:
+            result = EvaluationService._save_result(
+                db, task, aggregated_results, indicators, total_samples, processed,
+                extra_summary={
+                    "distributed": True, "shards": len(shards),
+                    "usage": UsageService.summarize(usage, task)
+                }
+            )
+            LeaderboardService.record_result(db, task, result)
+            task.processed_samples = processed
+            task.total_samples = total_samples
+            TaskService.update_task_status(db, task_id, TaskStatus.COMPLETED, "100%")
+        except IntegrityError:
+            # 其他节点已抢先完成合并
+            db.rollback()
+            return False
+        return True
+
+    @staticmethod
+    async def process_shard(
+        db: Session,
+        shard: TaskShard,
+        worker_id: str,
+        dataset: List[Dict[str, Any]],
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        concurrency: int = DEFAULT_WORKER_CONCURRENCY
+    ) -> bool:
+        """处理一个已领取的分片，租约丢失或任务被取消时放弃并返回False
+
+        样本以有限并发处理，智能体调用与本地执行一样先获取端点名额；处理期间由后台协程
+        周期性续约，单次调用耗时超过租约也不会被其他节点重新领取。
+        """
+        task = TaskService.get_task(db, shard.task_id)
+        indicators = EvaluationService._load_indicators(db, task)
+        limiter = EvaluationScheduler.endpoint_limiter(task.agent_api_endpoint)
+
+        # 分片内位置 -> (智能体响应, 各指标结果, 调用统计)
+        outcomes: Dict[int, Tuple[str, Dict[int, Dict[str, Any]], Dict[str, Any]]] = {}
+        pending = iter(range(shard.start_index, shard.end_index))
+
+        async def worker():
+            for sample_index in pending:
+                outcomes[sample_index - shard.start_index] = await EvaluationService._evaluate_sample(
+                    task, dataset[sample_index], indicators, slot=limiter.slot(task.id)
+                )
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(max(int(concurrency), 1))]
+        processing = asyncio.gather(*workers)
+        renewer = asyncio.ensure_future(
+            DistributedService._keep_lease(db, shard.id, worker_id, lease_seconds)
+        )
+        try:
+            done, _ = await asyncio.wait([renewer, processing], return_when=asyncio.FIRST_COMPLETED)
+            if processing not in done:
+                # 续约失败：租约已被他人接管或任务已停止
+                print(f"节点 {worker_id} 放弃分片 {shard.task_id}/{shard.shard_index}（租约丢失或任务已停止）")
+                return False
+            # 样本处理出错时向上抛出，由调用方释放租约重试
+            processing.result()
+        finally:
+            for pending_task in [renewer, *workers]:
+                pending_task.cancel()
+            await asyncio.gather(renewer, processing, return_exceptions=True)
+
+        results = []
+        response_rows = []
+        result_rows = []
+        usage = UsageStats()
+        for position in range(len(outcomes)):
+            agent_response, sample_results, call_stats = outcomes[position]
+            sample_index = shard.start_index + position
+            results.append(sample_results)
+            usage.add(call_stats)
+            response_rows.append({
+                "task_id": task.id, "sample_index": sample_index,
+                "response": agent_response, "call_stats": call_stats
+            })
+            result_rows.extend(SampleResultService.build_rows(task.id, sample_index, sample_results))
+
+        partial_results = DistributedService.build_partial_results(results)
+        # token 用量随部分聚合提交，合并时汇总（键不是指标ID，不参与指标合并）
+        partial_results["usage"] = usage.to_dict()
+        if not DistributedService.complete_shard(
+            db, shard.id, worker_id, partial_results, len(results), response_rows, result_rows
+        ):
+            print(f"节点 {worker_id} 提交分片 {shard.task_id}/{shard.shard_index} 失败（租约已过期）")
+            return False
+
+        DistributedService.finalize_task(db, shard.task_id)
+        return True
+
+    @staticmethod
+    async def _keep_lease(db: Session, shard_id: int, worker_id: str, lease_seconds: int):
+        """每隔租约时长的 1/3 续约一次，续约失败时返回"""
+        while True:
+            await asyncio.sleep(lease_seconds / 3)
+            if not await asyncio.to_thread(DistributedService.renew_lease, db, shard_id, worker_id, lease_seconds):
+                return
+
+    @staticmethod
+    def _dataset_key(task: EvaluationTask) -> Tuple[int, Optional[str], str]:
+        """工作节点数据集缓存的键"""
+        return task.id, task.dataset_type, json.dumps(task.dataset_config or {}, sort_keys=True, ensure_ascii=False)
+
+    @staticmethod
+    async def run_worker(
+        session_factory,
+        worker_id: Optional[str] = None,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        poll_interval: float = 2.0,
+        exit_when_idle: bool = False,
+        concurrency: int = DEFAULT_WORKER_CONCURRENCY
+    ):
+        """工作节点主循环：不断领取并处理分片，concurrency 为分片内的样本并发数"""
+        worker_id = worker_id or DistributedService.default_worker_id()
+        # (任务ID, 数据集类型, 数据集配置) -> 数据集；任务修改配置后重新运行时不会沿用旧数据集
+        datasets: Dict[Tuple[int, Optional[str], str], List[Dict[str, Any]]] = {}
+        # 在线程中预先加载分词编码，避免估计 token 数时在事件循环上加载
+        await asyncio.to_thread(load_encoding)
+        print(f"工作节点 {worker_id} 已启动")
+
+        while True:
+            db = session_factory()
+            shard = None
+            try:
+                shard = DistributedService.claim_shard(db, worker_id, lease_seconds)
+                if shard is None:
+                    if exit_when_idle:
+                        break
+                    await asyncio.sleep(poll_interval)
+                    continue
+
+                print(f"节点 {worker_id} 领取分片 {shard.task_id}/{shard.shard_index} "
+                      f"[{shard.start_index}, {shard.end_index})")
+                dataset_key = DistributedService._dataset_key(shard.task)
+                if dataset_key not in datasets:
+                    if len(datasets) >= 4:
+                        datasets.clear()
+                    datasets[dataset_key] = await EvaluationService._load_dataset(shard.task)
+                await DistributedService.process_shard(
+                    db, shard, worker_id, datasets[dataset_key], lease_seconds, concurrency
+                )
+            except Exception as e:
+                print(f"节点 {worker_id} 处理分片失败: {e}")
+                db.rollback()
+                if shard is not None:
+                    try:
+                        # 释放租约以便重试，领取次数达到上限时分片和任务标记为失败
+                        if DistributedService.release_shard(db, shard.id, worker_id, e):
+                            print(f"分片 {shard.task_id}/{shard.shard_index} 已达最大领取次数，任务标记为失败")
+                    except Exception as release_error:
+                        # 释放失败时分片保持租约状态，过期后由其他节点重新领取
+                        print(f"节点 {worker_id} 释放分片失败: {release_error}")
+                        db.rollback()
+                await asyncio.sleep(poll_interval)
+            finally:
+                db.close()
+
+        await AgentClientPool.close()
+        print(f"工作节点 {worker_id} 已退出")
@@ -0,0 +1,213 @@
+"""评估任务的耗时与费用预估（试运行）
+
+从数据集中随机抽取少量样本调用智能体，测量调用耗时和 token 用量，并逐项测量所选指标的 CPU 耗时，
+据此外推完整执行的耗时、token 总量和费用。试运行不保存任何结果，也不改变任务状态，但会真实调用
+智能体端点（计入端点的费用）。
+
+试运行的智能体调用在调度线程中执行，与正在运行的任务共用端点的在途请求名额；指标计时在线程池中
+进行，不阻塞 API 的事件循环。
+
+外推模型：本进程中指标计算在事件循环线程上串行执行，智能体调用按并发数重叠，因此吞吐量取
+"并发数 / 平均调用耗时" 与 "1 / 每样本指标 CPU 耗时" 中的较小者；分布式工作节点逐个处理样本，
+每个节点的吞吐量为 1 / (调用耗时 + 指标 CPU 耗时)。
+"""
+
+import asyncio
+import math
+import random
+import time
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Tuple
+from ..models.indicator import Indicator
+from ..models.task import EvaluationTask
+from ..services.evaluation_service import EvaluationService
+from ..services.scheduler import EvaluationScheduler, DEFAULT_TASK_CONCURRENCY, MAX_INFLIGHT_PER_ENDPOINT
+from ..services.usage_service import UsageService, UsageStats
+from ..utils.indicators import IndicatorCalculator
+from ..utils.statistics import QuantileSketch, RunningStats
+from ..utils.tokens import load_encoding
+
+# 比较不同并发数时列出的候选值
+CONCURRENCY_CANDIDATES = (1, 2, 4, 8, 16, 32, 64)
+
+
+class EstimateService:
+    """试运行并外推任务的耗时、token 用量和费用"""
+
+    @staticmethod
+    async def estimate(
+        db: Session,
+        task: EvaluationTask,
+        probe_samples: int = 10,
+        concurrency: Optional[int] = None,
+        workers: Optional[int] = None,
+        seed: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """抽取 probe_samples 个样本试运行，按 concurrency（默认与启动任务时相同）外推完整执行的耗时；
+        workers 不为空时同时给出该数量的分布式工作节点的耗时
+        """
+        started = time.perf_counter()
+        dataset = await EvaluationService._load_dataset(task)
+        indicators = await asyncio.to_thread(EvaluationService._load_indicators, db, task)
+        if not dataset:
+            raise ValueError("数据集为空")
+        concurrency = concurrency or DEFAULT_TASK_CONCURRENCY
+        await asyncio.to_thread(load_encoding)
+
+        indices = sorted(random.Random(seed).sample(range(len(dataset)), min(probe_samples, len(dataset))))
+        samples = [dataset[index] for index in indices]
+        calls = await EvaluationScheduler.run_coroutine(
+            EstimateService._probe_agent(task, samples, min(concurrency, len(samples)))
+        )
+
+        usage = UsageStats()
+        latency = RunningStats()
+        latency_sketch = QuantileSketch()
+        for _, call_stats in calls:
+            usage.add(call_stats)
+            latency.add(call_stats["latency_ms"] or 0.0)
+            latency_sketch.add(call_stats["latency_ms"] or 0.0)
+        # 指标计算（首次使用时还会导入 NumPy、scikit-learn 等）放到线程中，thread_time 仍按该线程计时
+        indicator_costs = await asyncio.to_thread(EstimateService._time_indicators, samples, calls, indicators)
+
+        total_samples = len(dataset)
+        latency_seconds = latency.mean / 1000
+        cpu_seconds = sum(cost["cpu_ms_mean"] for cost in indicator_costs) / 1000
+        scenarios = [
+            EstimateService.project_wall_time(total_samples, latency_seconds, cpu_seconds, candidate)
+            for candidate in sorted(set(CONCURRENCY_CANDIDATES) | {concurrency})
+        ]
+        result = {
+            "task_id": task.id,
+            "total_samples": total_samples,
+            "probe": {
+                "samples": len(samples),
+                "sample_indices": indices,
+                "failed_calls": usage.failed_calls,
+                "error_rate": usage.failed_calls / usage.calls if usage.calls else 0.0,
+                "elapsed_seconds": round(time.perf_counter() - started, 3)
+            },
+            "latency": {
+                "mean_ms": latency.mean,
+                "p50_ms": latency_sketch.quantile(0.5),
+                "p90_ms": latency_sketch.quantile(0.9),
+                "max_ms": latency.max,
+                "unit": "ms"
+            },
+            "indicators": indicator_costs,
+            "indicator_cpu_ms_per_sample": cpu_seconds * 1000,
+            "wall_time": EstimateService.project_wall_time(total_samples, latency_seconds, cpu_seconds, concurrency),
+            # 超过该并发数后瓶颈变为指标计算，继续增大并发不再缩短耗时
+            "saturation_concurrency": math.ceil(latency_seconds / cpu_seconds) if cpu_seconds > 0 else None,
+            "scenarios": scenarios,
+            "usage": EstimateService.project_usage(usage, total_samples, task)
+        }
+        if workers:
+            per_sample = latency_seconds + cpu_seconds
+            result["distributed"] = {
+                "workers": workers,
+                "seconds": total_samples * per_sample / workers,
+                "samples_per_second": workers / per_sample if per_sample > 0 else None
+            }
+        return result
+
+    @staticmethod
+    async def _probe_agent(
+        task: EvaluationTask,
+        samples: List[Dict[str, Any]],
+        concurrency: int
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """以有限并发调用智能体，返回各样本的 (响应, 调用统计)（在调度线程中执行，与任务共用端点名额）"""
+        limiter = EvaluationScheduler.endpoint_limiter(task.agent_api_endpoint)
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def probe(sample: Dict[str, Any]):
+            prompt = sample.get("input", sample.get("prompt", ""))
+            async with semaphore:
+                response, call_stats = await EvaluationService._call_in_slot(
+                    limiter.slot(("estimate", task.id)),
+                    EvaluationService._call_agent(
+                        task.agent_api_endpoint, task.agent_api_key, prompt, task.agent_config
+                    )
+                )
+            UsageService.fill_estimates(call_stats, prompt, response)
+            return response, call_stats
+
+        return await asyncio.gather(*(probe(sample) for sample in samples))
+
+    @staticmethod
+    def _time_indicators(
+        samples: List[Dict[str, Any]],
+        calls: List[Tuple[str, Dict[str, Any]]],
+        indicators: List[Indicator]
+    ) -> List[Dict[str, Any]]:
+        """逐项测量指标在试运行样本上的 CPU 耗时
+
+        先在第一个样本上计算一遍不计时，排除首次使用时导入依赖、加载模型的开销。
+        """
+        costs = []
+        for indicator in indicators:
+            stats = RunningStats()
+            errors = 0
+            for run, position in enumerate([0] + list(range(len(samples)))):
+                response, call_stats = calls[position]
+                indicator_data = EvaluationService._prepare_indicator_data(
+                    samples[position], response, indicator, call_stats
+                )
+                cpu_started = time.thread_time()
+                try:
+                    # 试运行不是实际的评估工作，不计入 /metrics 的指标计算耗时
+                    IndicatorCalculator.calculate_indicator(
+                        indicator.name, indicator_data,
+                        calculation_function=indicator.calculation_function, record_metrics=False
+                    )
+                except Exception:
+                    if run > 0:
+                        errors += 1
+                if run > 0:
+                    stats.add((time.thread_time() - cpu_started) * 1000)
+            costs.append({
+                "indicator_id": indicator.id,
+                "name": indicator.name,
+                "cpu_ms_mean": stats.mean,
+                "cpu_ms_max": stats.max,
+                "errors": errors
+            })
+        return costs
+
+    @staticmethod
+    def project_wall_time(
+        total_samples: int,
+        latency_seconds: float,
+        cpu_seconds: float,
+        concurrency: int
+    ) -> Dict[str, Any]:
+        """按并发数外推本进程执行的耗时：智能体调用受并发数（及端点在途上限）约束，指标计算串行"""
+        effective = min(concurrency, MAX_INFLIGHT_PER_ENDPOINT)
+        agent_rate = effective / latency_seconds if latency_seconds > 0 else math.inf
+        cpu_rate = 1 / cpu_seconds if cpu_seconds > 0 else math.inf
+        rate = min(agent_rate, cpu_rate)
+        return {
+            "concurrency": concurrency,
+            "effective_concurrency": effective,
+            "seconds": total_samples / rate if rate != math.inf else 0.0,
+            "samples_per_second": rate if rate != math.inf else None,
+            "bottleneck": "indicator_cpu" if cpu_rate < agent_rate else "agent"
+        }
+
+    @staticmethod
+    def project_usage(usage: UsageStats, total_samples: int, task: EvaluationTask) -> Dict[str, Any]:
+        """按试运行的平均每次调用用量外推完整执行的 token 总量和费用"""
+        probe = UsageService.summarize(usage, task)
+        scale = total_samples / usage.calls if usage.calls else 0.0
+        prompt_tokens = usage.prompt_tokens * scale
+        completion_tokens = usage.completion_tokens * scale
+        return {
+            "probe": probe,
+            "prompt_tokens": round(prompt_tokens),
+            "completion_tokens": round(completion_tokens),
+            "total_tokens": round(prompt_tokens + completion_tokens),
+            "model": probe["model"],
+            "cost": UsageService.estimate_cost(prompt_tokens, completion_tokens, probe["price"]),
+            "currency": probe["currency"]
+        }
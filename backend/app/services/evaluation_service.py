@@ -1,173 +1,521 @@
 """评估服务"""
 
 import asyncio
+import json
+import os
+import time
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
-import httpx
-import numpy as np
+from ..models.database import AsyncSessionLocal
 from ..models.task import EvaluationTask, TaskStatus
 from ..models.result import EvaluationResult, ResultItem
-from ..models.indicator import Indicator
+from ..models.indicator import Indicator, IndicatorCategory
 from ..services.task_service import TaskService
-from ..services.indicator_service import IndicatorService
+from ..services.agent_clients import AgentClientPool
+from ..services.leaderboard_service import LeaderboardService
+from ..services.profiler import ProfileService, TaskProfiler
+from ..services.progress import ProgressTracker
+from ..services.resource_accounting import ResourceAccount
+from ..services.result_service import ResultCache
+from ..services.sample_result_service import SampleResultService, SampleResultBuffer
+from ..services.sampling import AdaptiveSampler
+from ..services.scheduler import EvaluationScheduler, DEFAULT_TASK_CONCURRENCY
+from ..services.task_registry import TaskRegistry, TaskCancelledError, CancellationToken
+from ..services.usage_service import UsageService, UsageStats
 from ..utils.data_loader import DataLoader
 from ..utils.indicators import IndicatorCalculator
+from ..utils.statistics import ValueStats
+from ..utils.tokens import load_encoding
+from ..utils.metrics import AGENT_CALL_DURATION, AGENT_CALLS, AGENT_TTFT, TASK_THROUGHPUT
+
+# 智能体调用超时（秒）：非流式调用等待完整响应的上限、建立连接的上限
+AGENT_TIMEOUT = float(os.getenv("AGENT_TIMEOUT", "30"))
+AGENT_CONNECT_TIMEOUT = float(os.getenv("AGENT_CONNECT_TIMEOUT", "10"))
+# 流式调用相邻数据块（含首个数据块）之间的最长等待，以及整个响应的上限
+AGENT_STREAM_IDLE_TIMEOUT = float(os.getenv("AGENT_STREAM_IDLE_TIMEOUT", "30"))
+AGENT_STREAM_MAX_SECONDS = float(os.getenv("AGENT_STREAM_MAX_SECONDS", "600"))
 
 
 class EvaluationService:
     """评估执行服务"""
     
     @staticmethod
-    async def execute_task(db: Session, task_id: int):
-        """执行评估任务"""
-        task = TaskService.get_task(db, task_id)
+    async def execute_task(db: Session, task_id: int, options: Optional[Dict[str, Any]] = None):
+        """执行评估任务
+        
+        Args:
+            options: 执行选项，mode 为 "adaptive" 时按随机顺序抽样并在置信区间收敛后
+                提前停止，sampling 中为 AdaptiveSampler 的参数；concurrency 为样本并发数，
+                priority 为端点繁忙时加权轮询的权重；profile 为 True 时采样剖析本次执行；
+                trace_memory 为 True 时用 tracemalloc 记录内存峰值（开销较大）
+        """
+        options = options or {}
+        sampler = None
+        if options.get("mode") == "adaptive":
+            sampler = AdaptiveSampler(**(options.get("sampling") or {}))
+        
+        # 同步会话的读写放到工作线程中执行：SQLite 写锁被本事件循环中的异步会话持有时，
+        # 在事件循环线程里阻塞等待会导致异步会话永远无法提交
+        task = await asyncio.to_thread(TaskService.get_task, db, task_id)
         if not task:
             raise ValueError(f"任务不存在: {task_id}")
         
-        # 更新任务状态为运行中
-        TaskService.update_task_status(db, task_id, TaskStatus.RUNNING, "0%")
+        # 登记取消令牌，供 /cancel 接口发送信号
+        token = TaskRegistry.register(task_id)
+        token.bind(asyncio.get_running_loop())
         
+        profiler = None
+        if options.get("profile"):
+            profiler = TaskProfiler()
+            profiler.start()
+        
+        # 资源统计，结束时写入结果的 summary["resources"]
+        account = ResourceAccount(task_id, trace_memory=bool(options.get("trace_memory")))
+        account.start()
+        
+        # 样本在数据集处理顺序中的位置 -> 该样本的指标结果
+        results: Dict[int, Dict[int, Dict[str, Any]]] = {}
+        indicators = []
+        total_samples = 0
+        writer = SampleResultBuffer(task_id)
+        # token 用量，结束时写入结果的 summary["usage"]
+        usage = UsageStats()
         try:
-            # 1. 加载数据集
-            # 如果数据集路径为空，使用默认路径
-            dataset_config = task.dataset_config or {}
-            file_path = dataset_config.get("file_path", "").strip()
-            if not file_path:
-                dataset_config = dataset_config.copy() if dataset_config else {}
-                dataset_config["file_path"] = "app/data/samples.json"
+            # 更新任务状态为运行中，清理上次保存的（部分）结果和逐样本明细；
+            # 令牌登记前已被取消的任务不再执行
+            if not await asyncio.to_thread(EvaluationService._reset_task, db, task):
+                print(f"任务 {task_id} 在开始执行前已被取消")
+                return
             
-            dataset = await DataLoader.load_data(task.dataset_type, dataset_config)
+            if sampler and sampler.max_cost is not None:
+                sampler.price = UsageService.task_price(task)
+                if sampler.price is None:
+                    raise ValueError("设置了费用预算，但找不到智能体模型的价格，请在 agent_config 中配置 pricing")
+            
+            # 1. 加载数据集（同时在线程中预先加载分词编码，首次加载可能需要下载编码文件）
+            await asyncio.to_thread(load_encoding)
+            dataset = await token.run(EvaluationService._load_dataset(task))
             total_samples = len(dataset)
-            TaskService.update_task_progress(db, task_id, 0, total_samples)
             
             # 2. 获取选中的指标
-            indicators = []
-            for ind_id in task.selected_indicators:
-                indicator = IndicatorService.get_indicator(db, ind_id)
-                if indicator:
-                    indicators.append(indicator)
-            
-            if not indicators:
-                raise ValueError("未选择任何评估指标")
+            indicators = await asyncio.to_thread(EvaluationService._load_indicators, db, task)
             
-            # 3. 执行评估
-            results = []
-            processed = 0
-            
-            for sample in dataset:
-                # 调用智能体API
-                agent_response = await EvaluationService._call_agent(
-                    task.agent_api_endpoint,
-                    task.agent_api_key,
-                    sample.get("input", sample.get("prompt", ""))
+            # 3. 执行评估（执行循环中的写入走异步会话，不阻塞事件循环）
+            # 进度通过事件总线实时推送，数据库只做节流写入
+            tracker = ProgressTracker(
+                task_id, total_samples,
+                flush_callback=lambda processed, total: EvaluationService._flush_progress(
+                    task_id, processed, total, writer.write_lock
                 )
-                
-                # 计算每个指标
-                sample_results = {}
-                for indicator in indicators:
-                    indicator_data = EvaluationService._prepare_indicator_data(
-                        sample, agent_response, indicator
-                    )
-                    try:
-                        result = IndicatorCalculator.calculate_indicator(
-                            indicator.name,
-                            indicator_data,
-                            calculation_function=indicator.calculation_function
-                        )
-                        sample_results[indicator.id] = result
-                    except Exception as e:
-                        print(f"计算指标 {indicator.name} 时出错: {e}")
-                        import traceback
-                        traceback.print_exc()
-                        sample_results[indicator.id] = {"score": 0.0, "error": str(e)}
-                
-                results.append(sample_results)
-                processed += 1
-                
-                # 更新进度
-                if processed % 10 == 0 or processed == total_samples:
-                    TaskService.update_task_progress(db, task_id, processed, total_samples)
-            
-            # 4. 聚合结果
-            aggregated_results = EvaluationService._aggregate_results(results, indicators)
-            
-            # 5. 计算加权总分
-            overall_score = EvaluationService._calculate_overall_score(
-                aggregated_results,
-                task.indicator_weights
             )
+            await tracker.flush()
             
-            # 6. 生成分析报告
-            analysis_report = EvaluationService._generate_analysis_report(
-                aggregated_results, indicators, overall_score
+            # 自适应模式按随机顺序处理，保证提前停止时的估计无偏
+            order = sampler.order(total_samples) if sampler else range(total_samples)
+            stop_reason = await EvaluationService._run_samples(
+                task, dataset, order, indicators, results, token, tracker, writer, sampler,
+                concurrency=options.get("concurrency") or DEFAULT_TASK_CONCURRENCY,
+                weight=options.get("priority") or 1,
+                usage=usage
             )
+            if stop_reason:
+                print(f"任务 {task_id} 提前停止（{stop_reason}），已处理样本: {len(results)}/{total_samples}")
             
-            # 7. 生成可视化数据
-            radar_chart_data = EvaluationService._generate_radar_chart_data(
-                aggregated_results, indicators
+            # 4-8. 聚合并保存结果
+            await writer.flush()
+            extra_summary = {}
+            if sampler:
+                await tracker.flush()
+                extra_summary = sampler.summary(tracker.indicator_stats, stop_reason)
+            extra_summary["resources"] = account.finish()
+            extra_summary["usage"] = UsageService.summarize(usage, task)
+            await asyncio.to_thread(
+                EvaluationService._complete_task, db, task, results, indicators, total_samples,
+                extra_summary, None if stop_reason else "100%"
             )
             
-            # 8. 保存结果
-            result = EvaluationResult(
-                task_id=task_id,
-                overall_score=overall_score,
-                summary={
-                    "total_samples": total_samples,
-                    "indicators_count": len(indicators),
-                    "timestamp": datetime.utcnow().isoformat()
-                },
-                detailed_results=aggregated_results,
-                analysis_report=analysis_report,
-                radar_chart_data=radar_chart_data
+        except TaskCancelledError:
+            print(f"任务 {task_id} 已取消，已完成样本: {len(results)}")
+            save_partial = token.save_partial and results and indicators
+            # 等待被中断的样本协程留下的写入完成，部分结果与逐样本明细保持一致；
+            # 不保留部分结果时也要等写入完成后再清理明细
+            try:
+                await writer.flush()
+            except Exception as e:
+                print(f"任务 {task_id} 写入逐样本明细失败，不保留部分结果: {e}")
+                save_partial = False
+            await asyncio.to_thread(
+                EvaluationService._cancel_task, db, task_id, results, indicators, total_samples,
+                save_partial, account.finish(), UsageService.summarize(usage, task)
             )
-            db.add(result)
-            db.flush()
             
-            # 创建结果项
-            for ind_id, result_data in aggregated_results.items():
-                indicator = IndicatorService.get_indicator(db, ind_id)
-                weight = task.indicator_weights.get(ind_id, 1.0)
-                score = result_data.get("score", 0.0)
+        except Exception as e:
+            await asyncio.to_thread(EvaluationService._mark_failed, db, task_id, e)
+            raise e
+        
+        finally:
+            TaskRegistry.unregister(task_id, token)
+            TASK_THROUGHPUT.remove(task_id)
+            if ResourceAccount.active(task_id) is account:
+                account.finish()
+            if profiler:
+                profiler.stop()
+                try:
+                    await asyncio.to_thread(ProfileService.save, db, task_id, profiler)
+                except Exception as e:
+                    print(f"保存任务 {task_id} 的剖析数据失败: {e}")
+    
+    @staticmethod
+    def _reset_task(db: Session, task: EvaluationTask) -> bool:
+        """任务开始运行：更新状态并清理上次的结果，任务已被取消时返回 False
+        
+        取消令牌登记之前，取消接口直接把任务写为已取消，因此切换为运行中必须是条件更新。
+        """
+        if not TaskService.transition_task_status(
+            db, task.id, TaskStatus.RUNNING, "0%", unless=[TaskStatus.CANCELLED]
+        ):
+            return False
+        db.refresh(task)
+        if task.result:
+            ResultCache.invalidate(task.result.id)
+            db.delete(task.result)
+        SampleResultService.delete_for_task(db, task.id)
+        LeaderboardService.remove_task(db, task.id)
+        ProfileService.delete_for_task(db, task.id)
+        db.commit()
+        return True
+    
+    @staticmethod
+    def _complete_task(
+        db: Session,
+        task: EvaluationTask,
+        results: Dict[int, Dict[int, Dict[str, Any]]],
+        indicators: List[Indicator],
+        total_samples: int,
+        extra_summary: Optional[Dict[str, Any]],
+        progress: Optional[str]
+    ):
+        """聚合已完成样本的结果，保存并把任务标记为完成"""
+        aggregated_results = EvaluationService._aggregate_results(
+            EvaluationService._ordered(results), indicators
+        )
+        result = EvaluationService._save_result(
+            db, task, aggregated_results, indicators, total_samples, len(results),
+            extra_summary=extra_summary
+        )
+        LeaderboardService.record_result(db, task, result)
+        TaskService.update_task_status(db, task.id, TaskStatus.COMPLETED, progress)
+        db.commit()
+    
+    @staticmethod
+    def _cancel_task(
+        db: Session,
+        task_id: int,
+        results: Dict[int, Dict[int, Dict[str, Any]]],
+        indicators: List[Indicator],
+        total_samples: int,
+        save_partial: bool,
+        resources: Optional[Dict[str, Any]] = None,
+        usage: Optional[Dict[str, Any]] = None
+    ):
+        """任务被取消：按需用已完成的样本生成部分结果，并把任务标记为已取消"""
+        db.rollback()
+        if results:
+            TaskService.update_task_progress(db, task_id, len(results), total_samples)
+        task = TaskService.get_task(db, task_id)
+        if save_partial:
+            aggregated_results = EvaluationService._aggregate_results(
+                EvaluationService._ordered(results), indicators
+            )
+            EvaluationService._save_result(
+                db, task, aggregated_results, indicators, total_samples, len(results),
+                extra_summary={"partial": True, "cancelled": True, "resources": resources, "usage": usage}
+            )
+        else:
+            # 不保留部分结果时清理已写入的逐样本明细
+            SampleResultService.delete_for_task(db, task_id)
+        TaskService.update_task_status(db, task_id, TaskStatus.CANCELLED, task.progress)
+        db.commit()
+    
+    @staticmethod
+    async def _run_samples(
+        task: EvaluationTask,
+        dataset: List[Dict[str, Any]],
+        order,
+        indicators: List[Indicator],
+        results: Dict[int, Dict[int, Dict[str, Any]]],
+        token: CancellationToken,
+        tracker: ProgressTracker,
+        writer: SampleResultBuffer,
+        sampler: Optional[AdaptiveSampler] = None,
+        concurrency: int = 1,
+        weight: int = 1,
+        usage: Optional[UsageStats] = None
+    ) -> Optional[str]:
+        """以有限并发处理样本，结果按处理顺序中的位置写入 results 并批量落库，返回提前停止原因
+        
+        智能体调用需先从调度器获取端点名额，多个任务共用同一端点时按权重轮询；
+        usage 不为空时累计各次调用的 token 用量。
+        """
+        limiter = EvaluationScheduler.endpoint_limiter(task.agent_api_endpoint)
+        pending = iter(enumerate(order))
+        stop = {"reason": None}
+        
+        async def worker():
+            for position, index in pending:
+                if stop["reason"]:
+                    return
+                # 收到取消信号后不再派发新样本
+                token.raise_if_cancelled()
                 
-                result_item = ResultItem(
-                    result_id=result.id,
-                    indicator_id=ind_id,
-                    score=score,
-                    weighted_score=score * weight,
-                    raw_data=result_data
+                agent_response, sample_results, call_stats = await EvaluationService._evaluate_sample(
+                    task, dataset[index], indicators, token,
+                    slot=limiter.slot(task.id, weight)
                 )
-                db.add(result_item)
-            
-            # 更新任务（通过关系设置result）
-            task.result = result
-            TaskService.update_task_status(db, task_id, TaskStatus.COMPLETED, "100%")
-            db.commit()
-            
-        except Exception as e:
-            error_message = str(e)
-            # 记录详细错误信息
-            print(f"任务 {task_id} 执行失败: {error_message}")
-            TaskService.update_task_status(db, task_id, TaskStatus.FAILED, "错误")
-            # 尝试保存错误信息到任务描述或日志
+                results[position] = sample_results
+                if usage is not None:
+                    usage.add(call_stats)
+                await writer.add(index, agent_response, sample_results, call_stats)
+                await tracker.record(sample_results)
+                
+                if sampler and not stop["reason"]:
+                    stop["reason"] = sampler.should_stop(tracker.indicator_stats, len(results), usage)
+        
+        if sampler:
+            # 时间预算从派发第一个样本时开始计算
+            sampler.start()
+        workers = [asyncio.ensure_future(worker()) for _ in range(max(int(concurrency), 1))]
+        TaskProfiler.track(*workers)
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for pending_worker in workers:
+                pending_worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+        return stop["reason"]
+    
+    @staticmethod
+    async def _flush_progress(task_id: int, processed: int, total: int, write_lock: asyncio.Lock):
+        """通过异步会话写入进度（与逐样本结果的写入共用写锁）"""
+        async with write_lock:
+            async with AsyncSessionLocal() as session:
+                await TaskService.update_task_progress_async(session, task_id, processed, total)
+    
+    @staticmethod
+    def _ordered(results: Dict[int, Dict[int, Dict[str, Any]]]) -> List[Dict[int, Dict[str, Any]]]:
+        """按处理顺序排列样本结果"""
+        return [results[position] for position in sorted(results)]
+    
+    @staticmethod
+    def _mark_failed(db: Session, task_id: int, error: Exception):
+        """将任务标记为失败并记录错误信息"""
+        error_message = str(error)
+        # 记录详细错误信息
+        print(f"任务 {task_id} 执行失败: {error_message}")
+        db.rollback()
+        TaskService.update_task_status(db, task_id, TaskStatus.FAILED, "错误")
+        # 尝试保存错误信息到任务描述或日志
+        try:
+            task = TaskService.get_task(db, task_id)
+            if task:
+                # 将错误信息保存到任务描述中（如果原本没有描述）
+                if not task.description or task.description == "无描述":
+                    task.description = f"执行失败: {error_message[:200]}"  # 限制长度
+                db.commit()
+        except:
+            pass
+        db.commit()
+    
+    @staticmethod
+    async def _load_dataset(task: EvaluationTask) -> List[Dict[str, Any]]:
+        """加载任务的数据集"""
+        # 如果数据集路径为空，使用默认路径
+        dataset_config = task.dataset_config or {}
+        file_path = dataset_config.get("file_path", "").strip()
+        if not file_path:
+            dataset_config = dataset_config.copy() if dataset_config else {}
+            dataset_config["file_path"] = "app/data/samples.json"
+        
+        return await DataLoader.load_data(task.dataset_type, dataset_config)
+    
+    @staticmethod
+    def _load_indicators(db: Session, task: EvaluationTask) -> List[Indicator]:
+        """获取任务选中的指标"""
+        selected = task.selected_indicators or []
+        by_id = {
+            indicator.id: indicator
+            for indicator in db.query(Indicator).filter(Indicator.id.in_(selected)).all()
+        } if selected else {}
+        indicators = [by_id[ind_id] for ind_id in selected if ind_id in by_id]
+        
+        if not indicators:
+            raise ValueError("未选择任何评估指标")
+        return indicators
+    
+    @staticmethod
+    async def _evaluate_sample(
+        task: EvaluationTask,
+        sample: Dict[str, Any],
+        indicators: List[Indicator],
+        token: Optional[CancellationToken] = None,
+        slot=None
+    ) -> Tuple[str, Dict[int, Dict[str, Any]], Dict[str, Any]]:
+        """调用智能体并计算单个样本的各项指标，返回 (智能体响应, 各指标结果, 调用统计)
+        
+        slot 为可选的异步上下文管理器（如端点名额），只在调用智能体期间持有。
+        """
+        # 调用智能体API（取消时立即中断进行中的请求）
+        prompt = sample.get("input", sample.get("prompt", ""))
+        call = EvaluationService._call_agent(
+            task.agent_api_endpoint,
+            task.agent_api_key,
+            prompt,
+            task.agent_config
+        )
+        if slot is not None:
+            call = EvaluationService._call_in_slot(slot, call)
+        agent_response, call_stats = await (token.run(call) if token else call)
+        # 端点没有返回用量时按本地分词估计 token 数
+        UsageService.fill_estimates(call_stats, prompt, agent_response)
+        
+        # 计算每个指标
+        sample_results = {}
+        cpu_started = time.thread_time()
+        for indicator in indicators:
+            indicator_data = EvaluationService._prepare_indicator_data(
+                sample, agent_response, indicator, call_stats
+            )
             try:
-                task = TaskService.get_task(db, task_id)
-                if task:
-                    # 将错误信息保存到任务描述中（如果原本没有描述）
-                    if not task.description or task.description == "无描述":
-                        task.description = f"执行失败: {error_message[:200]}"  # 限制长度
-                    db.commit()
-            except:
-                pass
-            db.commit()
-            raise e
+                result = IndicatorCalculator.calculate_indicator(
+                    indicator.name,
+                    indicator_data,
+                    calculation_function=indicator.calculation_function
+                )
+                sample_results[indicator.id] = result
+            except Exception as e:
+                print(f"计算指标 {indicator.name} 时出错: {e}")
+                import traceback
+                traceback.print_exc()
+                sample_results[indicator.id] = {"score": 0.0, "error": str(e)}
+        
+        account = ResourceAccount.current()
+        if account:
+            account.indicator_cpu_seconds += time.thread_time() - cpu_started
+        return agent_response, sample_results, call_stats
+    
+    @staticmethod
+    async def _call_in_slot(slot, call):
+        """持有名额期间执行调用"""
+        async with slot:
+            return await call
+    
+    @staticmethod
+    def _save_result(
+        db: Session,
+        task: EvaluationTask,
+        aggregated_results: Dict[int, Dict[str, Any]],
+        indicators: List[Indicator],
+        total_samples: int,
+        processed_samples: int,
+        extra_summary: Optional[Dict[str, Any]] = None
+    ) -> EvaluationResult:
+        """根据聚合结果生成报告并保存（不提交事务）"""
+        # 5. 计算加权总分
+        overall_score = EvaluationService._calculate_overall_score(
+            aggregated_results,
+            task.indicator_weights
+        )
+        
+        # 6. 生成分析报告
+        analysis_report = EvaluationService._generate_analysis_report(
+            aggregated_results, indicators, overall_score
+        )
+        
+        # 7. 生成可视化数据
+        radar_chart_data = EvaluationService._generate_radar_chart_data(
+            aggregated_results, indicators
+        )
+        
+        # 8. 保存结果
+        summary = {
+            "total_samples": total_samples,
+            "processed_samples": processed_samples,
+            "indicators_count": len(indicators),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        efficiency = EvaluationService._efficiency_summary(aggregated_results, indicators)
+        if efficiency:
+            summary["efficiency"] = efficiency
+        if extra_summary:
+            summary.update(extra_summary)
+        
+        result = EvaluationResult(
+            task_id=task.id,
+            overall_score=overall_score,
+            summary=summary,
+            detailed_results=aggregated_results,
+            analysis_report=analysis_report,
+            radar_chart_data=radar_chart_data
+        )
+        db.add(result)
+        db.flush()
+        
+        # 创建结果项
+        for ind_id, result_data in aggregated_results.items():
+            weight = task.indicator_weights.get(ind_id, 1.0)
+            score = result_data.get("score", 0.0)
+            
+            result_item = ResultItem(
+                result_id=result.id,
+                indicator_id=ind_id,
+                score=score,
+                weighted_score=score * weight,
+                raw_data=result_data
+            )
+            db.add(result_item)
+        
+        # 更新任务（通过关系设置result）
+        task.result = result
+        return result
+    
+    @staticmethod
+    def _is_openai_compatible(api_endpoint: str) -> bool:
+        """DeepSeek/OpenAI 及路径为 /chat/completions 的兼容端点"""
+        path = api_endpoint.split("?", 1)[0].rstrip("/")
+        return (
+            "openai.com" in api_endpoint or "deepseek.com" in api_endpoint
+            or path.endswith("/chat/completions")
+        )
     
     @staticmethod
-    async def _call_agent(api_endpoint: str, api_key: str, prompt: str) -> str:
-        """调用智能体API"""
+    async def _call_agent(
+        api_endpoint: str,
+        api_key: str,
+        prompt: str,
+        agent_config: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """调用智能体API，返回 (响应文本, 调用统计)
+        
+        调用统计包括开始时间 started_at、总耗时 latency_ms、流式模式下的首 token 时间 ttft_ms、
+        端点返回的输入/输出 token 数（prompt_tokens/output_tokens）、输出吞吐量（流式模式按首 token 之后的生成时间计算）和是否失败 failed。agent_config 中
+        stream 为真且端点兼容 OpenAI 格式时以 SSE 流式接收，idle_timeout 为相邻数据块之间
+        的最长等待；非流式调用的等待上限为 timeout。
+        """
+        import httpx
+        agent_config = agent_config or {}
+        stats = {
+            "started_at": time.time(), "latency_ms": None, "ttft_ms": None,
+            "prompt_tokens": None, "output_tokens": None, "tokens_per_second": None,
+            "streamed": False, "failed": False
+        }
         if not api_endpoint:
             # 模拟响应（用于测试）
-            return f"模拟响应: {prompt[:50]}..."
+            AGENT_CALLS.inc("mock", "mock")
+            EvaluationService._account_agent_call(0, 0, False)
+            stats["latency_ms"] = 0.0
+            return f"模拟响应: {prompt[:50]}...", stats
         
         headers = {
             "Content-Type": "application/json",
@@ -177,15 +525,20 @@ class EvaluationService:
         
         # 检测API类型并适配请求格式
         # DeepSeek/OpenAI格式
-        if "openai.com" in api_endpoint or "deepseek.com" in api_endpoint or "api.deepseek.com" in api_endpoint:
+        openai_compatible = EvaluationService._is_openai_compatible(api_endpoint)
+        stream = openai_compatible and bool(agent_config.get("stream"))
+        if openai_compatible:
             payload = {
-                "model": "deepseek-chat",  # DeepSeek默认模型，可根据需要修改
+                "model": agent_config.get("model") or "deepseek-chat",  # DeepSeek默认模型
                 "messages": [
                     {"role": "user", "content": prompt}
                 ],
                 "max_tokens": 500,
                 "temperature": 0.7
             }
+            if stream:
+                payload["stream"] = True
+                payload["stream_options"] = {"include_usage": True}
         else:
             # 通用格式（兼容自定义API）
             payload = {
@@ -194,42 +547,171 @@ class EvaluationService:
                 "temperature": 0.7
             }
         
+        # 流式模式的读超时作用于每个数据块，即空闲超时
+        read_timeout = float(agent_config.get("idle_timeout") or AGENT_STREAM_IDLE_TIMEOUT) if stream \
+            else float(agent_config.get("timeout") or AGENT_TIMEOUT)
+        timeout = httpx.Timeout(read_timeout, connect=AGENT_CONNECT_TIMEOUT)
+        
+        endpoint_key = EvaluationScheduler._endpoint_key(api_endpoint)
+        # 复用端点的连接池，计时从发出请求开始，不包含创建客户端的开销
+        client = AgentClientPool.get(endpoint_key)
+        status = "error"
+        bytes_sent = bytes_received = 0
+        start = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(api_endpoint, json=payload, headers=headers)
-                if response.status_code == 200:
-                    data = response.json()
-                    # DeepSeek/OpenAI格式：{"choices": [{"message": {"content": "..."}}]}
-                    if isinstance(data, dict):
-                        if "choices" in data and len(data["choices"]) > 0:
-                            # OpenAI/DeepSeek格式
-                            return data["choices"][0].get("message", {}).get("content", "")
-                        elif "response" in data:
-                            return data["response"]
-                        elif "text" in data:
-                            return data["text"]
-                    return str(data)
-                else:
-                    error_detail = ""
-                    try:
-                        error_data = response.json()
-                        error_detail = error_data.get("error", {}).get("message", str(error_data))
-                    except:
-                        error_detail = response.text[:200]
-                    return f"API错误 {response.status_code}: {error_detail}"
+            if stream:
+                async def stream_call() -> str:
+                    nonlocal status, bytes_sent, bytes_received
+                    async with client.stream(
+                        "POST", api_endpoint, json=payload, headers=headers, timeout=timeout
+                    ) as response:
+                        status = str(response.status_code)
+                        bytes_sent = len(response.request.content)
+                        if response.status_code == 200:
+                            text, failed = await EvaluationService._read_stream(response, start, stats)
+                            bytes_received = response.num_bytes_downloaded
+                            if failed:
+                                status = "stream_error"
+                            return text
+                        await response.aread()
+                        bytes_received = len(response.content)
+                        return EvaluationService._error_text(response)
+                
+                # 用 wait_for 限制整个流式响应的时长（asyncio.timeout 需要 Python 3.11）
+                return await asyncio.wait_for(stream_call(), AGENT_STREAM_MAX_SECONDS), stats
+            
+            response = await client.post(api_endpoint, json=payload, headers=headers, timeout=timeout)
+            status = str(response.status_code)
+            bytes_sent = len(response.request.content)
+            bytes_received = len(response.content)
+            if response.status_code == 200:
+                data = response.json()
+                # DeepSeek/OpenAI格式：{"choices": [{"message": {"content": "..."}}]}
+                if isinstance(data, dict):
+                    EvaluationService._record_usage(data.get("usage"), stats)
+                    if "choices" in data and len(data["choices"]) > 0:
+                        # OpenAI/DeepSeek格式
+                        return data["choices"][0].get("message", {}).get("content", ""), stats
+                    elif "response" in data:
+                        return data["response"], stats
+                    elif "text" in data:
+                        return data["text"], stats
+                return str(data), stats
+            else:
+                return EvaluationService._error_text(response), stats
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            # 请求没有发出，不产生 token 用量
+            stats["prompt_tokens"] = stats["output_tokens"] = 0
+            if isinstance(e, httpx.ConnectTimeout):
+                status = "timeout"
+            return f"API调用失败: {str(e) or '超时'}", stats
+        except (httpx.TimeoutException, asyncio.TimeoutError, TimeoutError) as e:
+            status = "timeout"
+            return f"API调用失败: {str(e) or '超时'}", stats
         except Exception as e:
-            return f"API调用失败: {str(e)}"
+            return f"API调用失败: {str(e)}", stats
+        finally:
+            elapsed = time.perf_counter() - start
+            stats["latency_ms"] = round(elapsed * 1000, 3)
+            stats["failed"] = status != "200"
+            EvaluationService._finish_call_stats(stats, elapsed)
+            AGENT_CALL_DURATION.observe(elapsed, endpoint_key)
+            if stats["ttft_ms"] is not None:
+                AGENT_TTFT.observe(stats["ttft_ms"] / 1000, endpoint_key)
+            AGENT_CALLS.inc(endpoint_key, status)
+            EvaluationService._account_agent_call(bytes_sent, bytes_received, status != "200")
+    
+    @staticmethod
+    async def _read_stream(response, start: float, stats: Dict[str, Any]) -> Tuple[str, bool]:
+        """逐块拼接 SSE 流式响应，返回 (响应文本, 是否中途出错)，同时记录首 token 时间"""
+        stats["streamed"] = True
+        parts = []
+        chunks = 0
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    event = json.loads(data)
+                except ValueError:
+                    continue
+                if event.get("error"):
+                    error = event["error"]
+                    message = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+                    return f"API调用失败: 流式响应中断: {message}", True
+                EvaluationService._record_usage(event.get("usage"), stats)
+                for choice in event.get("choices") or []:
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        if stats["ttft_ms"] is None:
+                            stats["ttft_ms"] = round((time.perf_counter() - start) * 1000, 3)
+                        parts.append(content)
+                        chunks += 1
+            return "".join(parts), False
+        finally:
+            if stats["output_tokens"] is None:
+                # 端点未返回用量时按内容块数估计（OpenAI 兼容服务通常每块一个 token），
+                # 中途出错或超时的流也计入已收到的部分
+                stats["output_tokens"] = chunks
+    
+    @staticmethod
+    def _record_usage(usage: Any, stats: Dict[str, Any]):
+        """记录 OpenAI 格式响应中 usage 块的输入/输出 token 数"""
+        if not isinstance(usage, dict):
+            return
+        if usage.get("prompt_tokens") is not None:
+            stats["prompt_tokens"] = usage["prompt_tokens"]
+        if usage.get("completion_tokens") is not None:
+            stats["output_tokens"] = usage["completion_tokens"]
+    
+    @staticmethod
+    def _finish_call_stats(stats: Dict[str, Any], elapsed: float):
+        """计算输出吞吐量：流式按首 token 之后的生成时间，非流式按总耗时"""
+        tokens = stats["output_tokens"]
+        if not tokens:
+            return
+        duration = elapsed - stats["ttft_ms"] / 1000 if stats["ttft_ms"] is not None else elapsed
+        if duration > 0:
+            stats["tokens_per_second"] = round(tokens / duration, 3)
+    
+    @staticmethod
+    def _error_text(response) -> str:
+        """非 200 响应的错误描述"""
+        error_detail = ""
+        try:
+            error_data = response.json()
+            error_detail = error_data.get("error", {}).get("message", str(error_data))
+        except:
+            error_detail = response.text[:200]
+        return f"API错误 {response.status_code}: {error_detail}"
+    
+    @staticmethod
+    def _account_agent_call(bytes_sent: int, bytes_received: int, failed: bool):
+        """把智能体调用计入当前任务的资源统计"""
+        account = ResourceAccount.current()
+        if account:
+            account.record_agent_call(bytes_sent, bytes_received, failed)
     
     @staticmethod
     def _prepare_indicator_data(
         sample: Dict[str, Any],
         agent_response: str,
-        indicator: Indicator
+        indicator: Indicator,
+        call_stats: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
-        """准备指标计算所需的数据"""
+        """准备指标计算所需的数据（效率类指标使用智能体调用统计）"""
         indicator_name = indicator.name
         
-        if indicator_name in ["accuracy", "precision", "recall", "f1_score"]:
+        if indicator.category == IndicatorCategory.EFFICIENCY:
+            return {
+                "call_stats": call_stats or {},
+                "response": agent_response,
+                "config": indicator.default_config or {}
+            }
+        elif indicator_name in ["accuracy", "precision", "recall", "f1_score"]:
             # 对于分类任务，需要将输出转换为标签
             y_true_str = sample.get("expected_output", sample.get("label", ""))
             y_pred_str = agent_response
@@ -304,20 +786,24 @@ class EvaluationService:
         results: List[Dict[int, Dict[str, Any]]],
         indicators: List[Indicator]
     ) -> Dict[int, Dict[str, Any]]:
-        """聚合所有样本的结果"""
+        """聚合所有样本的结果（逐样本明细保存在 sample_results 表中）
+        
+        带实测值的指标（效率类指标的 value）另外用分位数草图汇总 p50/p90/p99。
+        """
+        import numpy as np
         aggregated = {}
         
         for indicator in indicators:
             ind_id = indicator.id
             scores = []
-            all_data = []
+            values = ValueStats()
             
             for sample_result in results:
-                if ind_id in sample_result:
-                    result_data = sample_result[ind_id]
-                    score = result_data.get("score", 0.0)
-                    scores.append(score)
-                    all_data.append(result_data)
+                result_data = sample_result.get(ind_id)
+                if result_data is not None:
+                    scores.append(result_data.get("score", 0.0))
+                    if "value" in result_data:
+                        values.add(result_data)
             
             if scores:
                 aggregated[ind_id] = {
@@ -326,7 +812,7 @@ class EvaluationService:
                     "max": max(scores),
                     "std": float(np.std(scores)) if len(scores) > 1 else 0.0,
                     "count": len(scores),
-                    "detailed": all_data
+                    **values.summary(len(scores))
                 }
             else:
                 aggregated[ind_id] = {
@@ -334,12 +820,31 @@ class EvaluationService:
                     "min": 0.0,
                     "max": 0.0,
                     "std": 0.0,
-                    "count": 0,
-                    "detailed": []
+                    "count": 0
                 }
         
         return aggregated
     
+    @staticmethod
+    def _efficiency_summary(
+        aggregated_results: Dict[int, Dict[str, Any]],
+        indicators: List[Indicator]
+    ) -> Dict[str, Dict[str, Any]]:
+        """效率类指标的分位数、每秒请求数和错误率（写入结果的 summary["efficiency"]）"""
+        efficiency = {}
+        for indicator in indicators:
+            entry = aggregated_results.get(indicator.id)
+            if indicator.category != IndicatorCategory.EFFICIENCY or not entry:
+                continue
+            item = {"score": entry["score"]}
+            for key in ("value_p50", "value_p90", "value_p99", "unit", "requests_per_second"):
+                if key in entry:
+                    item[key.replace("value_", "")] = entry[key]
+            if indicator.calculation_function == "success_rate":
+                item["error_rate"] = 1.0 - entry["score"] if entry["count"] else 0.0
+            efficiency[indicator.name] = item
+        return efficiency
+    
     @staticmethod
     def _calculate_overall_score(
         aggregated_results: Dict[int, Dict[str, Any]],
@@ -382,6 +887,12 @@ class EvaluationService:
                     f"(范围: {result['min']:.4f} - {result['max']:.4f}, "
                     f"标准差: {result['std']:.4f})\n"
                 )
+                if result.get("value_count"):
+                    unit = result.get("unit") or ""
+                    report_lines.append(
+                        f"  - 实测值: p50 {result['value_p50']:.1f} {unit}, "
+                        f"p90 {result['value_p90']:.1f} {unit}, p99 {result['value_p99']:.1f} {unit}\n"
+                    )
         
         return "".join(report_lines)
     
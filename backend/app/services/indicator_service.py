@@ -75,6 +75,37 @@ class IndicatorService:
                 "category": IndicatorCategory.GENERALIZATION,
                 "calculation_function": "portability"
             },
+            {
+                "name": "latency",
+                "display_name": "响应延迟",
+                "description": "智能体调用的总耗时，不超过目标值得满分，超出时按 目标值/实际值 计分；失败的调用得 0 分",
+                "category": IndicatorCategory.EFFICIENCY,
+                "calculation_function": "latency",
+                "default_config": {"target_ms": 2000}
+            },
+            {
+                "name": "ttft",
+                "display_name": "首token时间",
+                "description": "流式调用收到第一个token的耗时（非流式调用为总耗时），计分方式同响应延迟",
+                "category": IndicatorCategory.EFFICIENCY,
+                "calculation_function": "ttft",
+                "default_config": {"target_ms": 1000}
+            },
+            {
+                "name": "output_throughput",
+                "display_name": "输出吞吐量",
+                "description": "每秒输出的token数，达到目标值得满分，低于目标值时按比例计分",
+                "category": IndicatorCategory.EFFICIENCY,
+                "calculation_function": "output_throughput",
+                "default_config": {"target_tokens_per_second": 30}
+            },
+            {
+                "name": "success_rate",
+                "display_name": "调用成功率",
+                "description": "智能体调用成功（HTTP 200 且响应完整）的比例，即 1 - 错误率",
+                "category": IndicatorCategory.EFFICIENCY,
+                "calculation_function": "success_rate"
+            },
         ]
         
         for ind_data in builtin_indicators:
@@ -0,0 +1,164 @@
+"""排行榜服务"""
+
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..models.leaderboard import LeaderboardEntry, OVERALL_INDICATOR_ID
+from ..models.result import EvaluationResult
+from ..models.task import EvaluationTask, TaskStatus
+
+# 未配置数据集路径的任务使用的默认数据集（与评估执行时一致）
+DEFAULT_DATASET_PATH = "app/data/samples.json"
+
+
+class LeaderboardService:
+    """排行榜的增量维护与查询"""
+
+    @staticmethod
+    def dataset_key(task: EvaluationTask) -> str:
+        """任务所用数据集的标识：类型 + 规范化后的路径"""
+        dataset_config = task.dataset_config or {}
+        dataset_type = task.dataset_type or dataset_config.get("type") or "json"
+        file_path = (dataset_config.get("file_path") or "").strip() or DEFAULT_DATASET_PATH
+        return f"{dataset_type}:{os.path.normpath(file_path)}"
+
+    @staticmethod
+    def record_result(
+        db: Session,
+        task: EvaluationTask,
+        result: EvaluationResult,
+        completed_at: Optional[datetime] = None
+    ):
+        """任务完成时写入排行榜条目（不提交事务，与结果在同一事务中提交）"""
+        LeaderboardService.remove_task(db, task.id)
+        dataset_key = LeaderboardService.dataset_key(task)
+        common = {
+            "task_id": task.id,
+            "result_id": result.id,
+            "dataset_key": dataset_key,
+            "task_name": task.name,
+            "agent_api_endpoint": task.agent_api_endpoint,
+            "processed_samples": (result.summary or {}).get("processed_samples"),
+            "completed_at": completed_at or datetime.utcnow()
+        }
+        rows = [dict(common, indicator_id=OVERALL_INDICATOR_ID, score=result.overall_score or 0.0)]
+        for ind_id, result_data in (result.detailed_results or {}).items():
+            rows.append(dict(common, indicator_id=int(ind_id), score=float(result_data.get("score", 0.0))))
+        db.bulk_insert_mappings(LeaderboardEntry, rows)
+
+    @staticmethod
+    def remove_task(db: Session, task_id: int):
+        """删除任务的排行榜条目（不提交事务）"""
+        db.query(LeaderboardEntry).filter(LeaderboardEntry.task_id == task_id).delete(synchronize_session=False)
+
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """根据已完成任务的评估结果重建排行榜，返回写入的任务数"""
+        db.query(LeaderboardEntry).delete(synchronize_session=False)
+        rows = (
+            db.query(EvaluationTask, EvaluationResult)
+            .join(EvaluationResult, EvaluationResult.task_id == EvaluationTask.id)
+            .filter(EvaluationTask.status == TaskStatus.COMPLETED)
+            .all()
+        )
+        for task, result in rows:
+            LeaderboardService.record_result(db, task, result, completed_at=task.completed_at)
+        db.commit()
+        return len(rows)
+
+    @staticmethod
+    def backfill_if_empty(db: Session) -> int:
+        """排行榜为空但已有完成的结果时（如升级后首次启动）重建"""
+        if db.query(LeaderboardEntry.id).first() is not None:
+            return 0
+        if db.query(EvaluationResult.id).first() is None:
+            return 0
+        return LeaderboardService.rebuild(db)
+
+    @staticmethod
+    def get_datasets(db: Session) -> List[Dict[str, Any]]:
+        """排行榜中的数据集及其任务数"""
+        rows = (
+            db.query(LeaderboardEntry.dataset_key, func.count(LeaderboardEntry.id))
+            .filter(LeaderboardEntry.indicator_id == OVERALL_INDICATOR_ID)
+            .group_by(LeaderboardEntry.dataset_key)
+            .order_by(func.count(LeaderboardEntry.id).desc())
+            .all()
+        )
+        return [{"dataset_key": dataset_key, "tasks": count} for dataset_key, count in rows]
+
+    @staticmethod
+    def get_ranking(
+        db: Session,
+        dataset_key: str,
+        indicator_id: int = OVERALL_INDICATOR_ID,
+        limit: int = 50,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """按得分降序排名（走 dataset_key, indicator_id, score 索引）"""
+        base = db.query(LeaderboardEntry).filter(
+            LeaderboardEntry.dataset_key == dataset_key,
+            LeaderboardEntry.indicator_id == indicator_id
+        )
+        entries = (
+            base.order_by(LeaderboardEntry.score.desc(), LeaderboardEntry.completed_at, LeaderboardEntry.task_id)
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+        return {
+            "dataset_key": dataset_key,
+            "indicator_id": indicator_id,
+            "total": base.count(),
+            "items": [
+                dict(LeaderboardService._serialize(entry), rank=offset + position + 1)
+                for position, entry in enumerate(entries)
+            ]
+        }
+
+    @staticmethod
+    def compare(db: Session, task_ids: List[int]) -> Dict[str, Any]:
+        """多个任务的综合得分和各指标得分对比"""
+        entries = (
+            db.query(LeaderboardEntry)
+            .filter(LeaderboardEntry.task_id.in_(task_ids))
+            .order_by(LeaderboardEntry.task_id, LeaderboardEntry.indicator_id)
+            .all()
+        )
+        tasks: Dict[int, Dict[str, Any]] = {}
+        for entry in entries:
+            item = tasks.get(entry.task_id)
+            if item is None:
+                item = tasks[entry.task_id] = dict(LeaderboardService._serialize(entry), scores={})
+                item.pop("score")
+            if entry.indicator_id == OVERALL_INDICATOR_ID:
+                item["overall_score"] = entry.score
+            else:
+                item["scores"][str(entry.indicator_id)] = entry.score
+
+        # 每个指标上的最高分，便于前端高亮
+        best: Dict[str, Dict[str, Any]] = {}
+        for item in tasks.values():
+            for metric, score in [("overall", item.get("overall_score"))] + list(item["scores"].items()):
+                if score is not None and (metric not in best or score > best[metric]["score"]):
+                    best[metric] = {"task_id": item["task_id"], "score": score}
+        return {
+            "tasks": [tasks[task_id] for task_id in task_ids if task_id in tasks],
+            "missing": [task_id for task_id in task_ids if task_id not in tasks],
+            "best": best
+        }
+
+    @staticmethod
+    def _serialize(entry: LeaderboardEntry) -> Dict[str, Any]:
+        return {
+            "task_id": entry.task_id,
+            "result_id": entry.result_id,
+            "task_name": entry.task_name,
+            "agent_api_endpoint": entry.agent_api_endpoint,
+            "dataset_key": entry.dataset_key,
+            "score": entry.score,
+            "processed_samples": entry.processed_samples,
+            "completed_at": entry.completed_at.isoformat() if entry.completed_at else None
+        }
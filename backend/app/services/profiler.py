@@ -0,0 +1,263 @@
+"""任务级采样剖析
+
+评估任务与其他任务共用调度器的事件循环，cProfile 这类按线程统计的剖析器无法区分
+不同任务，也看不到协程挂起等待（如等待智能体响应）的时间。这里改为由后台线程定时采样
+任务自己的协程：
+
+- 正在事件循环线程上运行的协程：取线程的真实调用栈（CPU 耗时，如分词、LCS）；
+- 挂起的协程：沿 cr_await 链还原异步调用栈（等待耗时，如智能体调用、数据库提交）；
+  等待 asyncio.to_thread 时在栈顶标出在线程中执行的函数。
+
+结果为折叠调用栈（"外层;...;内层" -> 采样次数），可导出为 collapsed 文本或 speedscope JSON。
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set
+from sqlalchemy.orm import Session
+from ..models.profile import TaskProfile
+
+# 采样间隔（毫秒）
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+# 调用栈采样次数上限，达到后停止采样（限制长任务的开销和存储）
+PROFILE_MAX_SAMPLES = int(os.getenv("PROFILE_MAX_SAMPLES", "200000"))
+# 单个调用栈的最大深度
+PROFILE_MAX_DEPTH = 64
+# 连续采样失败达到该次数后停止采样（偶发失败来自与事件循环并发读取协程状态，持续失败说明无法采样）
+PROFILE_MAX_CONSECUTIVE_ERRORS = 10
+
+logger = logging.getLogger(__name__)
+
+_CWD = os.getcwd() + os.sep
+
+_active_profiler: contextvars.ContextVar[Optional["TaskProfiler"]] = contextvars.ContextVar(
+    "active_profiler", default=None
+)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    # 缩短路径：第三方包取 site-packages 之后的部分，项目代码取相对路径
+    _, marker, package_path = filename.rpartition("site-packages" + os.sep)
+    if marker:
+        filename = package_path
+    elif filename.startswith(_CWD):
+        filename = filename[len(_CWD):]
+    # co_qualname 需要 Python 3.11，更早的版本只有函数名
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({filename}:{code.co_firstlineno})"
+
+
+class TaskProfiler:
+    """单个评估任务的采样剖析器
+
+    在执行任务的事件循环中创建；任务内新建的协程（如并发处理样本的 worker）
+    需通过 track 登记后才会被采样。
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, max_samples: int = PROFILE_MAX_SAMPLES):
+        self.interval_ms = interval_ms
+        self.max_samples = max_samples
+        self.stacks: Counter = Counter()
+        self.ticks = 0
+        self.sample_count = 0
+        self.truncated = False
+        self.errors = 0
+        self.duration_seconds = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._token = None
+        self._started = 0.0
+
+    @staticmethod
+    def track(*tasks: asyncio.Task):
+        """把协程登记到当前上下文中的剖析器（未开启剖析时无操作）"""
+        profiler = _active_profiler.get()
+        if profiler is not None:
+            profiler._tasks.update(tasks)
+
+    def start(self):
+        """开始采样当前协程（需在事件循环中调用）"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._tasks.add(asyncio.current_task())
+        self._token = _active_profiler.set(self)
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="task-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止采样"""
+        if self._token is not None:
+            _active_profiler.reset(self._token)
+            self._token = None
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.duration_seconds = time.perf_counter() - self._started
+
+    def _run(self):
+        interval = self.interval_ms / 1000
+        errors = 0
+        while not self._stop.wait(interval):
+            try:
+                self._sample()
+                errors = 0
+            except Exception:
+                # 采样与事件循环并发读取协程状态，偶发的不一致只丢弃这一轮；只记录第一次失败
+                if not self.errors:
+                    logger.warning("剖析采样失败", exc_info=True)
+                self.errors += 1
+                errors += 1
+                if errors >= PROFILE_MAX_CONSECUTIVE_ERRORS:
+                    logger.warning("剖析采样连续失败 %d 次，停止采样", errors)
+                    return
+            if self.sample_count >= self.max_samples:
+                self.truncated = True
+                return
+
+    def _sample(self):
+        self.ticks += 1
+        running = asyncio.current_task(self._loop)
+        for task in list(self._tasks):
+            if task.done():
+                self._tasks.discard(task)
+                continue
+            stack = self._task_stack(task, running)
+            if stack:
+                self.stacks[";".join(stack)] += 1
+                self.sample_count += 1
+
+    def _task_stack(self, task: asyncio.Task, running: Optional[asyncio.Task], depth: int = 0) -> List[str]:
+        if task is running:
+            stack = self._running_stack(task)
+            if stack:
+                return stack
+        return self._suspended_stack(task, running, depth)
+
+    def _running_stack(self, task: asyncio.Task) -> List[str]:
+        """正在运行的协程：线程调用栈中从任务入口协程开始的部分"""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        root = task.get_coro().cr_frame
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            if frame is root:
+                break
+            frame = frame.f_back
+        else:
+            # 采样时协程刚好让出了控制权
+            return []
+        return [_frame_label(item) for item in reversed(frames[-PROFILE_MAX_DEPTH:])]
+
+    def _suspended_stack(self, task: asyncio.Task, running: Optional[asyncio.Task], depth: int) -> List[str]:
+        """挂起的协程：沿 await 链还原的异步调用栈
+
+        链的末端若是在等待另一个子任务（如 CancellationToken.run 中的 await inflight），
+        接着展开子任务的调用栈。
+        """
+        stack = []
+        awaitable: Any = task.get_coro()
+        leaf = None
+        while awaitable is not None and len(stack) < PROFILE_MAX_DEPTH:
+            frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+            if frame is None:
+                break
+            leaf = frame
+            stack.append(_frame_label(frame))
+            if frame.f_code is asyncio.to_thread.__code__:
+                func = frame.f_locals.get("func")
+                if func is not None:
+                    stack.append(f"[thread] {getattr(func, '__qualname__', repr(func))}")
+                return stack
+            awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+
+        if leaf is not None and depth < 4:
+            for value in list(leaf.f_locals.values()):
+                if isinstance(value, asyncio.Task) and value is not task:
+                    if value.done():
+                        # 子任务已完成，等待事件循环调度回来
+                        return stack + ["[ready]"]
+                    return stack + self._task_stack(value, running, depth + 1)
+        return stack
+
+    def to_record(self) -> Dict[str, Any]:
+        """用于保存的剖析数据"""
+        return {
+            "interval_ms": self.interval_ms,
+            "duration_seconds": round(self.duration_seconds, 3),
+            "ticks": self.ticks,
+            "sample_count": self.sample_count,
+            "truncated": self.truncated,
+            "stacks": dict(self.stacks)
+        }
+
+
+class ProfileService:
+    """剖析数据的保存与导出"""
+
+    @staticmethod
+    def save(db: Session, task_id: int, profiler: TaskProfiler) -> TaskProfile:
+        """保存任务的剖析数据（替换上一次的）"""
+        ProfileService.delete_for_task(db, task_id)
+        profile = TaskProfile(task_id=task_id, **profiler.to_record())
+        db.add(profile)
+        db.commit()
+        return profile
+
+    @staticmethod
+    def get(db: Session, task_id: int) -> Optional[TaskProfile]:
+        return db.query(TaskProfile).filter(TaskProfile.task_id == task_id).first()
+
+    @staticmethod
+    def delete_for_task(db: Session, task_id: int):
+        """删除任务的剖析数据（不提交事务）"""
+        db.query(TaskProfile).filter(TaskProfile.task_id == task_id).delete(synchronize_session=False)
+
+
+def to_collapsed(stacks: Dict[str, int]) -> str:
+    """折叠调用栈文本（flamegraph.pl / speedscope 均可直接导入）"""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+def to_speedscope(stacks: Dict[str, int], interval_ms: float, name: str) -> Dict[str, Any]:
+    """speedscope 的 sampled 格式，权重为采样次数乘以采样间隔（毫秒）"""
+    frames: List[Dict[str, str]] = []
+    frame_index: Dict[str, int] = {}
+    samples: List[List[int]] = []
+    weights: List[float] = []
+    for stack, count in sorted(stacks.items()):
+        sample = []
+        for label in stack.split(";"):
+            index = frame_index.get(label)
+            if index is None:
+                index = frame_index[label] = len(frames)
+                frames.append({"name": label})
+            sample.append(index)
+        samples.append(sample)
+        weights.append(count * interval_ms)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights
+        }],
+        "name": name,
+        "exporter": "agent-evaluation"
+    }
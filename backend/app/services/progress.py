@@ -0,0 +1,160 @@
+"""任务进度事件总线与进度跟踪"""
+
+import asyncio
+import inspect
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from ..utils.metrics import SAMPLES_PROCESSED, TASK_THROUGHPUT
+from ..utils.statistics import RunningStats
+
+# 进度写入数据库的最小间隔（秒）
+PROGRESS_FLUSH_INTERVAL = 3.0
+# 进度事件推送的最小间隔（秒）
+PROGRESS_PUBLISH_INTERVAL = 0.5
+
+
+class TaskEventBus:
+    """进程内的任务事件总线
+
+    评估执行器运行在后台线程各自的事件循环中，而订阅者（SSE连接）运行在
+    API服务的事件循环中，因此发布时通过 call_soon_threadsafe 投递到订阅者的队列。
+    """
+
+    _subscribers: Dict[int, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+    _latest: Dict[int, Dict[str, Any]] = {}
+    _lock = threading.Lock()
+
+    # 每个订阅者队列的容量，慢速客户端只会丢失中间的进度事件
+    QUEUE_SIZE = 100
+
+    @staticmethod
+    def subscribe(task_id: int) -> asyncio.Queue:
+        """订阅任务事件（需在事件循环中调用）"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=TaskEventBus.QUEUE_SIZE)
+        with TaskEventBus._lock:
+            TaskEventBus._subscribers.setdefault(task_id, []).append(
+                (asyncio.get_running_loop(), queue)
+            )
+        return queue
+
+    @staticmethod
+    def unsubscribe(task_id: int, queue: asyncio.Queue):
+        """取消订阅"""
+        with TaskEventBus._lock:
+            subscribers = TaskEventBus._subscribers.get(task_id, [])
+            subscribers[:] = [(loop, q) for loop, q in subscribers if q is not queue]
+            if not subscribers:
+                TaskEventBus._subscribers.pop(task_id, None)
+
+    @staticmethod
+    def latest(task_id: int) -> Optional[Dict[str, Any]]:
+        """获取任务最近一次发布的事件"""
+        with TaskEventBus._lock:
+            return TaskEventBus._latest.get(task_id)
+
+    @staticmethod
+    def publish(task_id: int, event_type: str, data: Dict[str, Any]):
+        """发布事件（线程安全）"""
+        event = {"event": event_type, "data": data}
+        with TaskEventBus._lock:
+            TaskEventBus._latest[task_id] = event
+            subscribers = list(TaskEventBus._subscribers.get(task_id, []))
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(TaskEventBus._offer, queue, event)
+            except RuntimeError:
+                # 订阅者的事件循环已关闭
+                pass
+
+    @staticmethod
+    def clear(task_id: int):
+        """清理任务最近的事件（任务删除时调用）"""
+        with TaskEventBus._lock:
+            TaskEventBus._latest.pop(task_id, None)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: Dict[str, Any]):
+        if queue.full():
+            # 丢弃最旧的事件，保证订阅者总能拿到最新进度
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        queue.put_nowait(event)
+
+
+class ProgressTracker:
+    """执行器内的进度跟踪
+
+    每个样本完成后更新吞吐量、剩余时间和各指标的滚动平均分，按固定间隔推送事件，
+    并且最多每隔 PROGRESS_FLUSH_INTERVAL 秒写一次数据库。
+    """
+
+    def __init__(
+        self,
+        task_id: int,
+        total_samples: int,
+        flush_callback=None,
+        flush_interval: float = PROGRESS_FLUSH_INTERVAL,
+        publish_interval: float = PROGRESS_PUBLISH_INTERVAL
+    ):
+        self.task_id = task_id
+        self.total_samples = total_samples
+        self.processed = 0
+        self.indicator_stats: Dict[int, RunningStats] = {}
+        self._flush_callback = flush_callback
+        self._flush_interval = flush_interval
+        self._publish_interval = publish_interval
+        self._started = time.monotonic()
+        self._last_flush = self._started
+        self._last_publish = 0.0
+
+    async def record(self, sample_results: Dict[int, Dict[str, Any]]):
+        """记录一个已完成的样本"""
+        self.processed += 1
+        SAMPLES_PROCESSED.inc()
+        for ind_id, result_data in sample_results.items():
+            stats = self.indicator_stats.get(ind_id)
+            if stats is None:
+                stats = self.indicator_stats[ind_id] = RunningStats()
+            stats.add(result_data.get("score", 0.0))
+
+        now = time.monotonic()
+        finished = self.processed >= self.total_samples
+        if finished or now - self._last_publish >= self._publish_interval:
+            self._last_publish = now
+            snapshot = self.snapshot()
+            TaskEventBus.publish(self.task_id, "progress", snapshot)
+            TASK_THROUGHPUT.set(snapshot["throughput"], self.task_id)
+        if finished or now - self._last_flush >= self._flush_interval:
+            await self.flush()
+
+    async def flush(self):
+        """把当前进度写入数据库（flush_callback 可以是协程函数）"""
+        self._last_flush = time.monotonic()
+        if self._flush_callback:
+            outcome = self._flush_callback(self.processed, self.total_samples)
+            if inspect.isawaitable(outcome):
+                await outcome
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前进度快照"""
+        elapsed = time.monotonic() - self._started
+        throughput = self.processed / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total_samples - self.processed, 0)
+        percent = int(self.processed / self.total_samples * 100) if self.total_samples > 0 else 0
+        return {
+            "task_id": self.task_id,
+            "status": "running",
+            "processed_samples": self.processed,
+            "total_samples": self.total_samples,
+            "progress": f"{percent}%",
+            "elapsed_seconds": round(elapsed, 3),
+            "throughput": round(throughput, 3),
+            "eta_seconds": round(remaining / throughput, 1) if throughput > 0 else None,
+            "partial_scores": {
+                str(ind_id): stats.mean for ind_id, stats in self.indicator_stats.items()
+            }
+        }
@@ -0,0 +1,161 @@
+"""任务级资源统计
+
+每次执行任务时记录资源消耗，任务结束后写入评估结果的 summary["resources"]，
+用于估算工作节点规模、发现指标计算代码的内存回退。
+
+统计对象保存在上下文变量中，任务内创建的协程和 asyncio.to_thread 都会继承，
+因此智能体调用和数据库写入可以归属到具体任务。CPU 时间和 RSS 是进程级的，
+多个任务并发执行时互相包含；indicator_cpu_seconds 只统计本任务的指标计算，可直接比较。
+"""
+
+import contextvars
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, Optional, Set
+import psutil
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 采样进程 RSS 峰值的间隔（秒）
+RESOURCE_RSS_INTERVAL = float(os.getenv("RESOURCE_RSS_INTERVAL", "0.25"))
+
+_WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+
+_current_account: contextvars.ContextVar[Optional["ResourceAccount"]] = contextvars.ContextVar(
+    "resource_account", default=None
+)
+
+
+class ResourceAccount:
+    """单次任务执行的资源消耗"""
+
+    _active: Dict[int, "ResourceAccount"] = {}
+    _lock = threading.Lock()
+    _process = psutil.Process()
+    _rss_thread: Optional[threading.Thread] = None
+    # 开启了 tracemalloc 的统计对象
+    _tracing: Set["ResourceAccount"] = set()
+
+    def __init__(self, task_id: int, trace_memory: bool = False):
+        self.task_id = task_id
+        self.trace_memory = trace_memory
+        self.agent_calls = 0
+        self.agent_errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.db_statements = 0
+        self.db_rows_written = 0
+        self.indicator_cpu_seconds = 0.0
+        self.peak_rss = 0
+        self.tracemalloc_peak: Optional[int] = None
+        self._started_wall = 0.0
+        self._started_cpu = 0.0
+        self._elapsed: Optional[float] = None
+        self._cpu: Optional[float] = None
+        self._token = None
+
+    @staticmethod
+    def current() -> Optional["ResourceAccount"]:
+        """当前上下文中的统计对象（不在任务执行中时为 None）"""
+        return _current_account.get()
+
+    @staticmethod
+    def active(task_id: int) -> Optional["ResourceAccount"]:
+        """本进程中正在执行的任务的统计对象"""
+        return ResourceAccount._active.get(task_id)
+
+    def start(self):
+        """开始统计（需在任务的协程中调用，之后创建的协程和线程都会继承）"""
+        self._token = _current_account.set(self)
+        self._started_wall = time.perf_counter()
+        self._started_cpu = time.process_time()
+        self.peak_rss = ResourceAccount._process.memory_info().rss
+        with ResourceAccount._lock:
+            ResourceAccount._active[self.task_id] = self
+            if self.trace_memory:
+                if not ResourceAccount._tracing and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+                ResourceAccount._tracing.add(self)
+            if ResourceAccount._rss_thread is None or not ResourceAccount._rss_thread.is_alive():
+                ResourceAccount._rss_thread = threading.Thread(
+                    target=ResourceAccount._watch_rss, name="resource-rss", daemon=True
+                )
+                ResourceAccount._rss_thread.start()
+
+    def finish(self) -> Dict[str, Any]:
+        """结束统计，返回写入 summary 的数据"""
+        if self._token is not None:
+            _current_account.reset(self._token)
+            self._token = None
+        self._elapsed = time.perf_counter() - self._started_wall
+        self._cpu = time.process_time() - self._started_cpu
+        self._record_rss()
+        with ResourceAccount._lock:
+            if ResourceAccount._active.get(self.task_id) is self:
+                del ResourceAccount._active[self.task_id]
+            if self in ResourceAccount._tracing:
+                # 并发任务共用 tracemalloc，峰值为本任务执行期间整个进程的峰值
+                self.tracemalloc_peak = tracemalloc.get_traced_memory()[1]
+                ResourceAccount._tracing.discard(self)
+                if not ResourceAccount._tracing:
+                    tracemalloc.stop()
+        return self.snapshot()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前统计（执行中的任务返回截至目前的数值）"""
+        elapsed = self._elapsed if self._elapsed is not None else time.perf_counter() - self._started_wall
+        cpu = self._cpu if self._cpu is not None else time.process_time() - self._started_cpu
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "cpu_seconds": round(cpu, 3),
+            "indicator_cpu_seconds": round(self.indicator_cpu_seconds, 3),
+            "peak_rss_bytes": self.peak_rss,
+            "tracemalloc_peak_bytes": self.tracemalloc_peak,
+            "agent_calls": self.agent_calls,
+            "agent_errors": self.agent_errors,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "db_write_statements": self.db_statements,
+            "db_rows_written": self.db_rows_written
+        }
+
+    def record_agent_call(self, bytes_sent: int, bytes_received: int, failed: bool):
+        self.agent_calls += 1
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+        if failed:
+            self.agent_errors += 1
+
+    def _record_rss(self):
+        try:
+            rss = ResourceAccount._process.memory_info().rss
+        except psutil.Error:
+            return
+        if rss > self.peak_rss:
+            self.peak_rss = rss
+
+    @staticmethod
+    def _watch_rss():
+        """有任务在执行时定期采样 RSS，更新各任务的峰值"""
+        while True:
+            with ResourceAccount._lock:
+                accounts = list(ResourceAccount._active.values())
+                if not accounts:
+                    ResourceAccount._rss_thread = None
+                    return
+            for account in accounts:
+                account._record_rss()
+            time.sleep(RESOURCE_RSS_INTERVAL)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_db_writes(conn, cursor, statement, parameters, context, executemany):
+    """统计当前任务的数据库写语句和写入行数（批量执行按参数组数计）"""
+    account = _current_account.get()
+    if account is None or not statement.lstrip()[:6].upper().startswith(_WRITE_STATEMENTS):
+        return
+    account.db_statements += 1
+    account.db_rows_written += len(parameters) if executemany else 1
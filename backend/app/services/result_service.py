@@ -0,0 +1,164 @@
+"""评估结果服务"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+from sqlalchemy.orm import Session, selectinload
+from ..models.result import EvaluationResult, ResultItem
+
+# 缓存的已序列化结果数量上限
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+
+
+class CachedResult:
+    """已序列化的评估结果"""
+
+    __slots__ = ("result_id", "task_id", "created_at", "body", "etag")
+
+    def __init__(self, result_id: int, task_id: int, created_at: Optional[datetime], body: bytes):
+        self.result_id = result_id
+        self.task_id = task_id
+        self.created_at = created_at
+        self.body = body
+        self.etag = f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+class ResultCache:
+    """按结果ID缓存序列化后的评估结果（LRU）
+
+    结果生成后不再修改，只会在任务重新执行或删除时整体删除，删除处负责调用 invalidate。
+    其他进程（多个 API 进程、分布式工作节点）删除或重新生成结果时本进程收不到失效，
+    因此读取时还要按结果的创建时间校验缓存。
+    """
+
+    _entries: "OrderedDict[int, CachedResult]" = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get(result_id: int) -> Optional[CachedResult]:
+        with ResultCache._lock:
+            entry = ResultCache._entries.get(result_id)
+            if entry is not None:
+                ResultCache._entries.move_to_end(result_id)
+            return entry
+
+    @staticmethod
+    def put(entry: CachedResult):
+        with ResultCache._lock:
+            ResultCache._entries[entry.result_id] = entry
+            ResultCache._entries.move_to_end(entry.result_id)
+            while len(ResultCache._entries) > RESULT_CACHE_SIZE:
+                ResultCache._entries.popitem(last=False)
+
+    @staticmethod
+    def invalidate(result_id: Optional[int]):
+        if result_id is None:
+            return
+        with ResultCache._lock:
+            ResultCache._entries.pop(result_id, None)
+
+    @staticmethod
+    def clear():
+        with ResultCache._lock:
+            ResultCache._entries.clear()
+
+
+class ResultService:
+    """评估结果的查询与序列化"""
+
+    @staticmethod
+    def get_result(db: Session, result_id: int) -> Optional[CachedResult]:
+        """按结果ID获取序列化结果，优先读缓存
+
+        与 get_task_result 相同，先查询结果的创建时间校验缓存：结果可能由其他 API 进程或分布式
+        工作节点以相同的ID重新生成，本进程的缓存不会被失效。
+        """
+        row = (
+            db.query(EvaluationResult.id, EvaluationResult.created_at)
+            .filter(EvaluationResult.id == result_id)
+            .first()
+        )
+        if row is None:
+            ResultCache.invalidate(result_id)
+            return None
+        entry = ResultCache.get(row.id)
+        if entry is not None and entry.created_at == row.created_at:
+            return entry
+        return ResultService._load(db, EvaluationResult.id == row.id)
+
+    @staticmethod
+    def get_task_result(db: Session, task_id: int) -> Optional[CachedResult]:
+        """获取任务的序列化结果
+
+        只查询结果的ID和创建时间来定位缓存，创建时间不一致说明结果已被重新生成
+        （SQLite 可能复用被删除结果的ID）。
+        """
+        row = (
+            db.query(EvaluationResult.id, EvaluationResult.created_at)
+            .filter(EvaluationResult.task_id == task_id)
+            .first()
+        )
+        if row is None:
+            return None
+        entry = ResultCache.get(row.id)
+        if entry is not None and entry.created_at == row.created_at:
+            return entry
+        return ResultService._load(db, EvaluationResult.id == row.id)
+
+    @staticmethod
+    def _load(db: Session, criterion) -> Optional[CachedResult]:
+        """一次性加载结果、结果项和指标（避免逐项懒加载），序列化后放入缓存"""
+        result = (
+            db.query(EvaluationResult)
+            .options(selectinload(EvaluationResult.result_items).joinedload(ResultItem.indicator))
+            .filter(criterion)
+            .first()
+        )
+        if result is None:
+            return None
+        body = json.dumps(ResultService.serialize(result), ensure_ascii=False).encode("utf-8")
+        entry = CachedResult(result.id, result.task_id, result.created_at, body)
+        ResultCache.put(entry)
+        return entry
+
+    @staticmethod
+    def serialize(result: EvaluationResult) -> Dict[str, Any]:
+        """评估结果的响应格式"""
+        result_items = [
+            {
+                "indicator_id": item.indicator_id,
+                "indicator_name": item.indicator.name if item.indicator else "",
+                "score": item.score,
+                "weighted_score": item.weighted_score,
+                "raw_data": item.raw_data
+            }
+            for item in result.result_items
+        ]
+
+        return {
+            "id": result.id,
+            "task_id": result.task_id,
+            "overall_score": result.overall_score,
+            "summary": result.summary,
+            "detailed_results": result.detailed_results,
+            "analysis_report": result.analysis_report,
+            "radar_chart_data": result.radar_chart_data,
+            "correlation_matrix": result.correlation_matrix,
+            "result_items": result_items,
+            "created_at": result.created_at.isoformat()
+        }
+
+    @staticmethod
+    def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+        """If-None-Match 是否命中（支持多个ETag、弱校验前缀和 *）"""
+        if not if_none_match:
+            return False
+        candidates = [value.strip() for value in if_none_match.split(",")]
+        return any(
+            candidate == "*" or candidate.removeprefix("W/") == etag
+            for candidate in candidates
+        )
@@ -0,0 +1,232 @@
+"""逐样本结果服务"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+from sqlalchemy import and_, or_, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..models.database import AsyncSessionLocal
+from ..models.sample_result import SampleResult, SampleResponse
+
+# 每批写入的最大行数
+SAMPLE_RESULT_BATCH_SIZE = 500
+
+
+class SampleResultService:
+    """逐样本结果的批量写入与清理"""
+
+    @staticmethod
+    def build_rows(
+        task_id: int,
+        sample_index: int,
+        sample_results: Dict[int, Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """把一个样本的各指标结果转换为 sample_results 的行"""
+        rows = []
+        for ind_id, result_data in sample_results.items():
+            details = {k: v for k, v in result_data.items() if k not in ("score", "error")}
+            error = result_data.get("error")
+            rows.append({
+                "task_id": task_id,
+                "sample_index": sample_index,
+                "indicator_id": ind_id,
+                "score": float(result_data.get("score", 0.0)),
+                "error": str(error)[:500] if error else None,
+                "details": details or None
+            })
+        return rows
+
+    @staticmethod
+    def write(db: Session, response_rows: List[Dict[str, Any]], result_rows: List[Dict[str, Any]]):
+        """批量插入（不经过ORM对象，不提交事务）"""
+        for start in range(0, len(response_rows), SAMPLE_RESULT_BATCH_SIZE):
+            db.bulk_insert_mappings(SampleResponse, response_rows[start:start + SAMPLE_RESULT_BATCH_SIZE])
+        for start in range(0, len(result_rows), SAMPLE_RESULT_BATCH_SIZE):
+            db.bulk_insert_mappings(SampleResult, result_rows[start:start + SAMPLE_RESULT_BATCH_SIZE])
+
+    @staticmethod
+    async def write_async(session: AsyncSession, response_rows: List[Dict[str, Any]], result_rows: List[Dict[str, Any]]):
+        """异步批量插入（executemany，不提交事务）"""
+        for model, rows in ((SampleResponse, response_rows), (SampleResult, result_rows)):
+            for start in range(0, len(rows), SAMPLE_RESULT_BATCH_SIZE):
+                await session.execute(insert(model), rows[start:start + SAMPLE_RESULT_BATCH_SIZE])
+
+    @staticmethod
+    def delete_for_task(
+        db: Session,
+        task_id: int,
+        start_index: Optional[int] = None,
+        end_index: Optional[int] = None
+    ):
+        """删除任务（或任务中某个样本区间）的逐样本结果（不提交事务）"""
+        for model in (SampleResult, SampleResponse):
+            query = db.query(model).filter(model.task_id == task_id)
+            if start_index is not None:
+                query = query.filter(model.sample_index >= start_index)
+            if end_index is not None:
+                query = query.filter(model.sample_index < end_index)
+            query.delete(synchronize_session=False)
+
+    @staticmethod
+    def encode_cursor(sample_index: int, indicator_id: int) -> str:
+        """生成分页游标"""
+        return f"{sample_index}:{indicator_id}"
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[int, int]:
+        """解析分页游标"""
+        try:
+            sample_index, indicator_id = cursor.split(":")
+            return int(sample_index), int(indicator_id)
+        except ValueError:
+            raise ValueError(f"无效的分页游标: {cursor}")
+
+    @staticmethod
+    def get_samples(
+        db: Session,
+        task_id: int,
+        indicator_id: Optional[int] = None,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+        errors_only: bool = False,
+        after: Optional[str] = None,
+        limit: int = 100,
+        include_response: bool = False
+    ) -> Dict[str, Any]:
+        """按 (sample_index, indicator_id) 键集分页查询逐样本结果"""
+        query = SampleResultService._base_query(db, task_id, include_response)
+        if indicator_id is not None:
+            query = query.filter(SampleResult.indicator_id == indicator_id)
+        if min_score is not None:
+            query = query.filter(SampleResult.score >= min_score)
+        if max_score is not None:
+            query = query.filter(SampleResult.score <= max_score)
+        if errors_only:
+            query = query.filter(SampleResult.error.isnot(None))
+        if after:
+            last_sample, last_indicator = SampleResultService.decode_cursor(after)
+            query = query.filter(or_(
+                SampleResult.sample_index > last_sample,
+                and_(SampleResult.sample_index == last_sample, SampleResult.indicator_id > last_indicator)
+            ))
+
+        rows = (
+            query.order_by(SampleResult.sample_index, SampleResult.indicator_id)
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        items = [SampleResultService._serialize(row, include_response) for row in rows]
+        next_cursor = None
+        if has_more and items:
+            next_cursor = SampleResultService.encode_cursor(items[-1]["sample_index"], items[-1]["indicator_id"])
+        return {"items": items, "next_cursor": next_cursor, "limit": limit}
+
+    @staticmethod
+    def get_worst_samples(
+        db: Session,
+        task_id: int,
+        indicator_ids: List[int],
+        k: int = 10,
+        include_response: bool = True
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """每个指标得分最低的k个样本（走 task_id, indicator_id, score 索引）"""
+        worst = {}
+        for indicator_id in indicator_ids:
+            rows = (
+                SampleResultService._base_query(db, task_id, include_response)
+                .filter(SampleResult.indicator_id == indicator_id)
+                .order_by(SampleResult.score, SampleResult.sample_index)
+                .limit(k)
+                .all()
+            )
+            worst[indicator_id] = [SampleResultService._serialize(row, include_response) for row in rows]
+        return worst
+
+    @staticmethod
+    def _base_query(db: Session, task_id: int, include_response: bool):
+        if include_response:
+            return (
+                db.query(SampleResult, SampleResponse.response, SampleResponse.call_stats)
+                .outerjoin(SampleResponse, and_(
+                    SampleResponse.task_id == SampleResult.task_id,
+                    SampleResponse.sample_index == SampleResult.sample_index
+                ))
+                .filter(SampleResult.task_id == task_id)
+            )
+        return db.query(SampleResult).filter(SampleResult.task_id == task_id)
+
+    @staticmethod
+    def _serialize(row, include_response: bool) -> Dict[str, Any]:
+        sample_result, response, call_stats = (row[0], row[1], row[2]) if include_response else (row, None, None)
+        item = {
+            "sample_index": sample_result.sample_index,
+            "indicator_id": sample_result.indicator_id,
+            "score": sample_result.score,
+            "error": sample_result.error,
+            "details": sample_result.details
+        }
+        if include_response:
+            item["response"] = response
+            item["call_stats"] = call_stats
+        return item
+
+
+class SampleResultBuffer:
+    """执行过程中缓冲逐样本结果，积累到一批后通过异步会话写入数据库
+
+    写入不阻塞事件循环，其他样本的智能体调用可以在提交期间继续进行。
+    同一任务的写入通过 write_lock 串行执行：事件循环繁忙时一个写事务会跨越多次调度，
+    并发的写事务会在 SQLite 的写锁上互相等待直至超时（进度写入也应持有该锁）。
+    每批写入在独立的 asyncio 任务中进行，调用 flush 的协程被取消时已取走的一批仍会写完。
+    """
+
+    def __init__(self, task_id: int, batch_size: int = SAMPLE_RESULT_BATCH_SIZE):
+        self.task_id = task_id
+        self.batch_size = batch_size
+        self._responses: List[Dict[str, Any]] = []
+        self._results: List[Dict[str, Any]] = []
+        self.write_lock = asyncio.Lock()
+        # 进行中的写入
+        self._writes: Set[asyncio.Future] = set()
+
+    async def add(
+        self,
+        sample_index: int,
+        response: str,
+        sample_results: Dict[int, Dict[str, Any]],
+        call_stats: Optional[Dict[str, Any]] = None
+    ):
+        """记录一个样本，缓冲区满时写入并提交"""
+        self._responses.append({
+            "task_id": self.task_id,
+            "sample_index": sample_index,
+            "response": response,
+            "call_stats": call_stats
+        })
+        self._results.extend(SampleResultService.build_rows(self.task_id, sample_index, sample_results))
+        if len(self._results) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        """写入缓冲区中的所有行并提交，同时等待进行中的写入完成
+
+        写入受 shield 保护：取消（如任务被取消时中断其他样本协程）只中断等待，不中断写入，
+        之后再调用一次 flush 即可确认所有已记录的样本都已落库。
+        """
+        if self._responses or self._results:
+            # 先取走缓冲区，提交期间其他协程记录的样本进入下一批
+            responses, results = self._responses, self._results
+            self._responses, self._results = [], []
+            write = asyncio.ensure_future(self._write(responses, results))
+            self._writes.add(write)
+            write.add_done_callback(self._writes.discard)
+        if self._writes:
+            await asyncio.shield(asyncio.gather(*self._writes))
+
+    async def _write(self, responses: List[Dict[str, Any]], results: List[Dict[str, Any]]):
+        async with self.write_lock:
+            async with AsyncSessionLocal() as session:
+                await SampleResultService.write_async(session, responses, results)
+                await session.commit()
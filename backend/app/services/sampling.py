@@ -0,0 +1,119 @@
+"""自适应抽样（提前停止）"""
+
+import random
+import time
+from typing import Any, Dict, List, Optional
+from ..services.usage_service import UsageService, UsageStats
+from ..utils.statistics import RunningStats
+
+
+class StopReason:
+    """提前停止原因"""
+    CONVERGED = "converged"           # 所有指标的置信区间半宽均低于容差
+    TIME_BUDGET = "time_budget"       # 达到时间预算
+    SAMPLE_BUDGET = "sample_budget"   # 达到样本（调用次数）预算
+    TOKEN_BUDGET = "token_budget"     # 达到 token 预算（输入 + 输出）
+    COST_BUDGET = "cost_budget"       # 达到费用预算
+
+
+class AdaptiveSampler:
+    """按随机顺序处理样本，跟踪各指标均值的置信区间，收敛或超出预算时提前停止"""
+
+    def __init__(
+        self,
+        tolerance: float = 0.02,
+        confidence: float = 0.95,
+        min_samples: int = 30,
+        max_samples: Optional[int] = None,
+        time_budget_seconds: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        max_cost: Optional[float] = None,
+        seed: Optional[int] = None
+    ):
+        if tolerance <= 0:
+            raise ValueError("容差必须大于0")
+        if not 0 < confidence < 1:
+            raise ValueError("置信水平必须在(0, 1)之间")
+        self.tolerance = tolerance
+        self.confidence = confidence
+        self.min_samples = max(min_samples, 2)
+        self.max_samples = max_samples
+        self.time_budget_seconds = time_budget_seconds
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        # 按费用预算停止时使用的价格，由执行器按任务的模型设置（见 UsageService.lookup_price）
+        self.price: Optional[Dict[str, Any]] = None
+        self.seed = seed if seed is not None else random.randrange(2 ** 31)
+        # 时间预算的起点：开始派发样本时（不含加载数据集和指标的时间）
+        self._started: Optional[float] = None
+
+    def start(self):
+        """开始计时（派发第一个样本前调用，重复调用不重置）"""
+        if self._started is None:
+            self._started = time.monotonic()
+
+    def order(self, total_samples: int) -> List[int]:
+        """随机的样本处理顺序（固定种子可复现）"""
+        indices = list(range(total_samples))
+        random.Random(self.seed).shuffle(indices)
+        return indices
+
+    def should_stop(
+        self,
+        indicator_stats: Dict[int, RunningStats],
+        processed: int,
+        usage: Optional[UsageStats] = None
+    ) -> Optional[str]:
+        """判断是否应当停止，返回停止原因；usage 为已完成调用的累计 token 用量"""
+        if self.max_samples is not None and processed >= self.max_samples:
+            return StopReason.SAMPLE_BUDGET
+        if (
+            self.time_budget_seconds is not None and self._started is not None
+            and time.monotonic() - self._started >= self.time_budget_seconds
+        ):
+            return StopReason.TIME_BUDGET
+        if usage is not None:
+            if self.max_tokens is not None and usage.prompt_tokens + usage.completion_tokens >= self.max_tokens:
+                return StopReason.TOKEN_BUDGET
+            if self.max_cost is not None and self.price is not None:
+                cost = UsageService.estimate_cost(usage.prompt_tokens, usage.completion_tokens, self.price)
+                if cost >= self.max_cost:
+                    return StopReason.COST_BUDGET
+        if processed < self.min_samples or not indicator_stats:
+            return None
+        if all(
+            stats.ci_half_width(self.confidence) <= self.tolerance
+            for stats in indicator_stats.values()
+        ):
+            return StopReason.CONVERGED
+        return None
+
+    def summary(self, indicator_stats: Dict[int, RunningStats], stop_reason: Optional[str]) -> Dict[str, Any]:
+        """写入结果摘要的抽样信息"""
+        intervals = {}
+        for ind_id, stats in indicator_stats.items():
+            half_width = stats.ci_half_width(self.confidence)
+            half_width = None if half_width == float("inf") else half_width
+            intervals[str(ind_id)] = {
+                "mean": stats.mean,
+                "half_width": half_width,
+                "lower": stats.mean - half_width if half_width is not None else None,
+                "upper": stats.mean + half_width if half_width is not None else None,
+                "count": stats.count
+            }
+        return {
+            "early_stopped": stop_reason is not None,
+            "stop_reason": stop_reason,
+            "sampling": {
+                "mode": "adaptive",
+                "tolerance": self.tolerance,
+                "confidence": self.confidence,
+                "min_samples": self.min_samples,
+                "max_samples": self.max_samples,
+                "time_budget_seconds": self.time_budget_seconds,
+                "max_tokens": self.max_tokens,
+                "max_cost": self.max_cost,
+                "seed": self.seed
+            },
+            "confidence_intervals": intervals
+        }
@@ -0,0 +1,264 @@
+"""公平调度器
+
+所有本地执行的评估任务运行在同一个调度线程的事件循环中：
+- 每个用户同时运行的任务数有上限，超出的任务排队等待（状态保持为 pending）；
+- 每个智能体端点在所有任务之间共享一个在途请求上限；
+- 端点繁忙时按任务权重轮询（加权轮询）分配请求名额，大任务无法饿死小任务。
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from ..models.database import SessionLocal
+from ..services.system_metrics import SystemMetricsSampler
+
+# 每个用户同时运行的任务数上限（未登录用户共用一个配额）
+MAX_TASKS_PER_USER = int(os.getenv("SCHEDULER_MAX_TASKS_PER_USER", "4"))
+# 每个智能体端点在所有任务间共享的在途请求上限
+MAX_INFLIGHT_PER_ENDPOINT = int(os.getenv("SCHEDULER_MAX_INFLIGHT_PER_ENDPOINT", "8"))
+# 单个任务默认的样本并发数
+DEFAULT_TASK_CONCURRENCY = int(os.getenv("SCHEDULER_TASK_CONCURRENCY", "4"))
+
+
+class FairLimiter:
+    """加权轮询的公平信号量
+
+    名额空闲时直接获取；名额用尽时，按 key（任务）分别排队，释放的名额按
+    加权轮询交给下一个 key：权重为 w 的 key 每轮最多连续获得 w 个名额。
+    只能在同一个事件循环中使用。
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(capacity, 1)
+        self.inflight = 0
+        self._waiters: Dict[Any, Deque[asyncio.Future]] = {}
+        self._weights: Dict[Any, int] = {}
+        self._credits: Dict[Any, int] = {}
+        self._ring: Deque[Any] = deque()
+
+    @property
+    def waiting(self) -> int:
+        """排队中的请求数"""
+        return sum(len(queue) for queue in self._waiters.values())
+
+    async def acquire(self, key: Any, weight: int = 1):
+        """获取一个名额"""
+        if self.inflight < self.capacity and not self._ring:
+            self.inflight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        if key not in self._waiters:
+            self._waiters[key] = deque()
+            self._weights[key] = max(int(weight), 1)
+            self._credits[key] = self._weights[key]
+            self._ring.append(key)
+        self._waiters[key].append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 名额已经转交给我们，但调用方被取消，交给下一个等待者
+                self.release()
+            else:
+                queue = self._waiters.get(key)
+                if queue and future in queue:
+                    queue.remove(future)
+                    if not queue:
+                        self._drop(key)
+            raise
+
+    def release(self):
+        """释放名额，优先按加权轮询转交给排队者"""
+        while self._ring:
+            key = self._ring[0]
+            queue = self._waiters[key]
+            future = queue.popleft()
+            self._credits[key] -= 1
+            if not queue:
+                self._drop(key)
+            elif self._credits[key] <= 0:
+                # 本轮配额用完，轮到下一个任务
+                self._credits[key] = self._weights[key]
+                self._ring.rotate(-1)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.inflight -= 1
+
+    def _drop(self, key: Any):
+        self._waiters.pop(key, None)
+        self._weights.pop(key, None)
+        self._credits.pop(key, None)
+        try:
+            self._ring.remove(key)
+        except ValueError:
+            pass
+
+    @asynccontextmanager
+    async def slot(self, key: Any, weight: int = 1):
+        """以上下文管理器的方式占用一个名额"""
+        await self.acquire(key, weight)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class EvaluationScheduler:
+    """本地评估任务调度器（进程内单例）"""
+
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _thread: Optional[threading.Thread] = None
+    _lock = threading.Lock()
+    # 用户 -> 正在运行的任务数
+    _running: Dict[Optional[int], int] = {}
+    # 用户 -> 排队中的 (任务ID, 执行选项)
+    _queued: Dict[Optional[int], Deque[Tuple[int, Dict[str, Any]]]] = {}
+    # 端点 -> 公平信号量（仅在调度线程中访问）
+    _limiters: Dict[str, FairLimiter] = {}
+    # 其他事件循环 -> 端点 -> 公平信号量（事件循环被回收后自动清理）
+    _loop_limiters = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def submit(task_id: int, user_id: Optional[int], options: Dict[str, Any]) -> Dict[str, Any]:
+        """提交任务：用户配额未满时立即执行，否则排队"""
+        with EvaluationScheduler._lock:
+            if EvaluationScheduler._running.get(user_id, 0) < MAX_TASKS_PER_USER:
+                EvaluationScheduler._running[user_id] = EvaluationScheduler._running.get(user_id, 0) + 1
+                launch = True
+            else:
+                queue = EvaluationScheduler._queued.setdefault(user_id, deque())
+                queue.append((task_id, options))
+                launch = False
+                position = len(queue)
+
+        if launch:
+            EvaluationScheduler._launch(task_id, user_id, options)
+            return {"queued": False}
+        return {"queued": True, "position": position}
+
+    @staticmethod
+    def is_queued(task_id: int) -> bool:
+        """任务是否在排队中"""
+        with EvaluationScheduler._lock:
+            return any(
+                entry[0] == task_id
+                for queue in EvaluationScheduler._queued.values()
+                for entry in queue
+            )
+
+    @staticmethod
+    def dequeue(task_id: int) -> bool:
+        """从排队队列中移除任务（取消排队中的任务时调用）"""
+        with EvaluationScheduler._lock:
+            for queue in EvaluationScheduler._queued.values():
+                for entry in list(queue):
+                    if entry[0] == task_id:
+                        queue.remove(entry)
+                        return True
+        return False
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        """调度器状态"""
+        with EvaluationScheduler._lock:
+            running = {str(user): count for user, count in EvaluationScheduler._running.items() if count}
+            queued = {str(user): len(queue) for user, queue in EvaluationScheduler._queued.items() if queue}
+        return {
+            "running_tasks_by_user": running,
+            "queued_tasks_by_user": queued,
+            "endpoints": {
+                endpoint: {"inflight": limiter.inflight, "waiting": limiter.waiting, "capacity": limiter.capacity}
+                for endpoint, limiter in list(EvaluationScheduler._limiters.items())
+            }
+        }
+
+    @staticmethod
+    def endpoint_limiter(api_endpoint: Optional[str]) -> FairLimiter:
+        """获取端点的公平信号量
+
+        调度线程中的任务共享端点名额；在其他事件循环中执行时（如分布式工作节点）由该事件循环中的
+        调用共享另一组名额。需要与本进程的任务共用名额时，通过 run_coroutine 在调度线程中执行。
+        """
+        loop = asyncio.get_running_loop()
+        if loop is EvaluationScheduler._loop:
+            limiters = EvaluationScheduler._limiters
+        else:
+            limiters = EvaluationScheduler._loop_limiters.setdefault(loop, {})
+        key = EvaluationScheduler._endpoint_key(api_endpoint)
+        limiter = limiters.get(key)
+        if limiter is None:
+            limiter = limiters[key] = FairLimiter(MAX_INFLIGHT_PER_ENDPOINT)
+        return limiter
+
+    @staticmethod
+    async def run_coroutine(coro):
+        """在调度线程的事件循环中执行协程并等待结果（调用方被取消时一并取消）"""
+        loop = EvaluationScheduler._ensure_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    @staticmethod
+    def _endpoint_key(api_endpoint: Optional[str]) -> str:
+        if not api_endpoint:
+            return "mock"
+        parts = urlsplit(api_endpoint)
+        return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+    @staticmethod
+    def _ensure_loop() -> asyncio.AbstractEventLoop:
+        with EvaluationScheduler._lock:
+            if EvaluationScheduler._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="evaluation-scheduler", daemon=True
+                )
+                thread.start()
+                EvaluationScheduler._loop = loop
+                EvaluationScheduler._thread = thread
+                SystemMetricsSampler.watch_loop("scheduler", loop)
+            return EvaluationScheduler._loop
+
+    @staticmethod
+    def _launch(task_id: int, user_id: Optional[int], options: Dict[str, Any]):
+        loop = EvaluationScheduler._ensure_loop()
+        asyncio.run_coroutine_threadsafe(
+            EvaluationScheduler._run(task_id, user_id, options), loop
+        )
+
+    @staticmethod
+    async def _run(task_id: int, user_id: Optional[int], options: Dict[str, Any]):
+        # 延迟导入，避免与评估服务循环导入
+        from ..services.evaluation_service import EvaluationService
+
+        db = SessionLocal()
+        try:
+            await EvaluationService.execute_task(db, task_id, options)
+        except Exception as e:
+            print(f"调度任务 {task_id} 执行失败: {e}")
+        finally:
+            db.close()
+            EvaluationScheduler._finish(user_id)
+
+    @staticmethod
+    def _finish(user_id: Optional[int]):
+        """任务结束，释放用户配额并启动该用户排队中的下一个任务"""
+        with EvaluationScheduler._lock:
+            queue = EvaluationScheduler._queued.get(user_id)
+            next_entry = queue.popleft() if queue else None
+            if next_entry is None:
+                EvaluationScheduler._running[user_id] -= 1
+        if next_entry is not None:
+            EvaluationScheduler._launch(next_entry[0], user_id, next_entry[1])
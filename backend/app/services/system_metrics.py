@@ -0,0 +1,185 @@
+"""系统指标后台采样
+
+采样线程按固定间隔记录 CPU、内存、磁盘和本进程的资源占用，以及各事件循环的延迟，
+写入固定长度的环形缓冲区。接口直接返回缓冲区中的数据，不会阻塞线程池。
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+import psutil
+
+# 采样间隔（秒）
+SYSTEM_METRICS_INTERVAL = float(os.getenv("SYSTEM_METRICS_INTERVAL", "2"))
+# 环形缓冲区保存的采样点数
+SYSTEM_METRICS_HISTORY = int(os.getenv("SYSTEM_METRICS_HISTORY", "300"))
+
+DISK_PATH = "C:\\" if os.name == "nt" else "/"
+
+
+class SystemMetricsSampler:
+    """系统指标采样器（进程内单例，每个 worker 进程各自采样）"""
+
+    _samples: Deque[Dict[str, Any]] = deque(maxlen=SYSTEM_METRICS_HISTORY)
+    _lock = threading.Lock()
+    _thread: Optional[threading.Thread] = None
+    _stop = threading.Event()
+    _process = psutil.Process()
+    # 名称 -> 被监测的事件循环
+    _loops: Dict[str, asyncio.AbstractEventLoop] = {}
+    # 名称 -> 最近一次测得的事件循环延迟（毫秒）
+    _loop_lag_ms: Dict[str, float] = {}
+    # 名称 -> 尚未执行的探测回调的投递时间
+    _pending_probes: Dict[str, float] = {}
+
+    @staticmethod
+    def start():
+        """启动采样线程（重复调用无副作用）"""
+        with SystemMetricsSampler._lock:
+            if SystemMetricsSampler._thread and SystemMetricsSampler._thread.is_alive():
+                return
+            SystemMetricsSampler._stop.clear()
+            # 首次调用 cpu_percent 只建立基准，之后每次返回与上次调用之间的平均值
+            psutil.cpu_percent(interval=None)
+            SystemMetricsSampler._process.cpu_percent(interval=None)
+            thread = threading.Thread(target=SystemMetricsSampler._run, name="system-metrics", daemon=True)
+            thread.start()
+            SystemMetricsSampler._thread = thread
+
+    @staticmethod
+    def stop():
+        """停止采样线程"""
+        SystemMetricsSampler._stop.set()
+
+    @staticmethod
+    def watch_loop(name: str, loop: asyncio.AbstractEventLoop):
+        """登记需要测量延迟的事件循环"""
+        SystemMetricsSampler._loops[name] = loop
+
+    @staticmethod
+    def latest() -> Dict[str, Any]:
+        """最新的采样；采样线程尚未产生数据时立即采样一次（不阻塞）"""
+        with SystemMetricsSampler._lock:
+            if SystemMetricsSampler._samples:
+                return SystemMetricsSampler._samples[-1]
+        return SystemMetricsSampler.sample()
+
+    @staticmethod
+    def history(points: int) -> List[Dict[str, Any]]:
+        """最近 points 个采样点的精简时间序列"""
+        with SystemMetricsSampler._lock:
+            samples = list(SystemMetricsSampler._samples)[-points:] if points > 0 else []
+        return [
+            {
+                "timestamp": sample["timestamp"],
+                "cpu_percent": sample["cpu"]["percent"],
+                "memory_percent": sample["memory"]["percent"],
+                "process_rss": sample["process"]["rss"],
+                "loop_lag_ms": sample["event_loops"]
+            }
+            for sample in samples
+        ]
+
+    @staticmethod
+    def sample() -> Dict[str, Any]:
+        """采集一次系统和进程指标"""
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(DISK_PATH)
+        process = SystemMetricsSampler._process
+        with process.oneshot():
+            process_memory = process.memory_info()
+            process_info = {
+                "pid": process.pid,
+                "rss": process_memory.rss,
+                "vms": process_memory.vms,
+                "cpu_percent": process.cpu_percent(interval=None),
+                "threads": process.num_threads(),
+                "open_files": SystemMetricsSampler._safe_count(process.open_files),
+                # psutil 6.0 起改名为 net_connections，5.9.x 只有 connections
+                "connections": SystemMetricsSampler._safe_count(
+                    getattr(process, "net_connections", None) or process.connections
+                )
+            }
+        children = []
+        for child in process.children(recursive=True):
+            try:
+                children.append({"pid": child.pid, "rss": child.memory_info().rss})
+            except psutil.Error:
+                continue
+        process_info["children"] = children
+
+        return {
+            "timestamp": time.time(),
+            "cpu": {
+                "percent": psutil.cpu_percent(interval=None),
+                "count": psutil.cpu_count()
+            },
+            "memory": {
+                "total": memory.total,
+                "available": memory.available,
+                "used": memory.used,
+                "percent": memory.percent
+            },
+            "disk": {
+                "total": disk.total,
+                "used": disk.used,
+                "free": disk.free
+            },
+            "process": process_info,
+            "event_loops": dict(SystemMetricsSampler._loop_lag_ms)
+        }
+
+    @staticmethod
+    def _safe_count(getter) -> Optional[int]:
+        try:
+            return len(getter())
+        except (psutil.Error, OSError):
+            return None
+
+    @staticmethod
+    def _probe_loops():
+        """测量事件循环延迟：从采样线程投递回调，记录回调实际执行前等待的时间
+
+        上一次投递的回调还没执行时（事件循环被阻塞），延迟按已等待的时间计算。
+        """
+        now = time.perf_counter()
+        for name, loop in list(SystemMetricsSampler._loops.items()):
+            if loop.is_closed():
+                SystemMetricsSampler._forget_loop(name)
+                continue
+            pending_since = SystemMetricsSampler._pending_probes.get(name)
+            if pending_since is not None:
+                SystemMetricsSampler._loop_lag_ms[name] = round((now - pending_since) * 1000, 3)
+                continue
+
+            def record(name=name, scheduled=now):
+                SystemMetricsSampler._pending_probes.pop(name, None)
+                SystemMetricsSampler._loop_lag_ms[name] = round((time.perf_counter() - scheduled) * 1000, 3)
+
+            SystemMetricsSampler._pending_probes[name] = now
+            try:
+                loop.call_soon_threadsafe(record)
+            except RuntimeError:
+                # 事件循环已关闭
+                SystemMetricsSampler._forget_loop(name)
+
+    @staticmethod
+    def _forget_loop(name: str):
+        SystemMetricsSampler._loops.pop(name, None)
+        SystemMetricsSampler._loop_lag_ms.pop(name, None)
+        SystemMetricsSampler._pending_probes.pop(name, None)
+
+    @staticmethod
+    def _run():
+        while not SystemMetricsSampler._stop.is_set():
+            try:
+                SystemMetricsSampler._probe_loops()
+                sample = SystemMetricsSampler.sample()
+                with SystemMetricsSampler._lock:
+                    SystemMetricsSampler._samples.append(sample)
+            except Exception as e:
+                print(f"系统指标采样失败: {e}")
+            SystemMetricsSampler._stop.wait(SYSTEM_METRICS_INTERVAL)
@@ -0,0 +1,110 @@
+"""运行中任务注册表（取消信号）"""
+
+import asyncio
+import threading
+from typing import Dict, Optional, Set
+
+
+class TaskCancelledError(Exception):
+    """任务被用户取消"""
+
+
+class CancellationToken:
+    """协作式取消令牌
+
+    执行器在自己的事件循环中运行，取消请求来自API线程池，
+    因此通过 call_soon_threadsafe 把取消动作投递回执行器的事件循环，
+    立即中断正在进行的智能体HTTP请求。
+    """
+
+    def __init__(self, task_id: int):
+        self.task_id = task_id
+        self.save_partial = False
+        self._event = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inflight: Set[asyncio.Task] = set()
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已请求取消"""
+        return self._event.is_set()
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """绑定执行器所在的事件循环"""
+        self._loop = loop
+
+    def cancel(self, save_partial: bool = False):
+        """请求取消（线程安全）"""
+        self.save_partial = save_partial
+        self._event.set()
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._cancel_inflight)
+            except RuntimeError:
+                # 事件循环已关闭，执行器会在下一个检查点退出
+                pass
+
+    def _cancel_inflight(self):
+        for inflight in list(self._inflight):
+            inflight.cancel()
+
+    async def run(self, coro):
+        """在可取消的子任务中执行协程，取消时抛出 TaskCancelledError"""
+        if self.cancelled:
+            coro.close()
+            raise TaskCancelledError(f"任务已取消: {self.task_id}")
+
+        inflight = asyncio.ensure_future(coro)
+        self._inflight.add(inflight)
+        try:
+            return await inflight
+        except asyncio.CancelledError:
+            if self.cancelled:
+                raise TaskCancelledError(f"任务已取消: {self.task_id}")
+            raise
+        finally:
+            self._inflight.discard(inflight)
+
+    def raise_if_cancelled(self):
+        """在检查点抛出取消异常"""
+        if self.cancelled:
+            raise TaskCancelledError(f"任务已取消: {self.task_id}")
+
+
+class TaskRegistry:
+    """当前进程中正在执行的任务"""
+
+    _tokens: Dict[int, CancellationToken] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def register(task_id: int) -> CancellationToken:
+        """登记正在执行的任务，返回其取消令牌"""
+        token = CancellationToken(task_id)
+        with TaskRegistry._lock:
+            TaskRegistry._tokens[task_id] = token
+        return token
+
+    @staticmethod
+    def unregister(task_id: int, token: CancellationToken = None):
+        """移除任务登记"""
+        with TaskRegistry._lock:
+            current = TaskRegistry._tokens.get(task_id)
+            if current is not None and (token is None or current is token):
+                del TaskRegistry._tokens[task_id]
+
+    @staticmethod
+    def get(task_id: int) -> Optional[CancellationToken]:
+        """获取任务的取消令牌"""
+        with TaskRegistry._lock:
+            return TaskRegistry._tokens.get(task_id)
+
+    @staticmethod
+    def cancel(task_id: int, save_partial: bool = False) -> bool:
+        """向正在执行的任务发送取消信号，任务不在本进程中运行时返回False"""
+        token = TaskRegistry.get(task_id)
+        if token is None:
+            return False
+        token.cancel(save_partial=save_partial)
+        return True
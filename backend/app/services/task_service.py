@@ -1,10 +1,19 @@
 """任务服务"""
 
+from sqlalchemy import and_, func, or_, select, type_coerce, update, String
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+import base64
+import json
 from datetime import datetime
 from ..models.task import EvaluationTask, TaskStatus
 from ..models.result import EvaluationResult
+from ..services.archive_service import ArchiveService
+from ..services.leaderboard_service import LeaderboardService
+from ..services.progress import TaskEventBus
+from ..services.result_service import ResultCache
+from ..services.sample_result_service import SampleResultService
 
 
 class TaskService:
@@ -68,6 +77,119 @@ class TaskService:
             query = query.filter(EvaluationTask.user_id == user_id)
         return query.order_by(EvaluationTask.created_at.desc()).offset(skip).limit(limit).all()
     
+    @staticmethod
+    def get_tasks_page(
+        db: Session,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        status: TaskStatus = None,
+        user_id: int = None
+    ) -> Dict[str, Any]:
+        """按 (created_at, id) 倒序键集分页获取任务列表，cursor 为上一页返回的 next_cursor"""
+        # 直接比较数据库中存储的时间值：SQLite 里是文本，绑定 datetime 参数时格式不一致会导致漏行/重复
+        created_raw = type_coerce(EvaluationTask.created_at, String)
+        query = db.query(EvaluationTask, created_raw)
+        if status:
+            query = query.filter(EvaluationTask.status == status)
+        if user_id:
+            query = query.filter(EvaluationTask.user_id == user_id)
+        if cursor:
+            last_created, last_id = TaskService.decode_cursor(cursor)
+            query = query.filter(or_(
+                created_raw < last_created,
+                and_(created_raw == last_created, EvaluationTask.id < last_id)
+            ))
+        
+        rows = (
+            query.order_by(EvaluationTask.created_at.desc(), EvaluationTask.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more and rows:
+            last_task, last_created = rows[-1]
+            next_cursor = TaskService.encode_cursor(str(last_created), last_task.id)
+        return {"items": [task for task, _ in rows], "next_cursor": next_cursor, "limit": limit}
+    
+    @staticmethod
+    def get_changed_tasks(
+        db: Session,
+        since: Optional[str] = None,
+        limit: int = 500,
+        user_id: int = None
+    ) -> Dict[str, Any]:
+        """获取 since 之后有变化（创建或更新）的任务，按更新时间升序
+        
+        since 为上一次返回的 next_since（数据库时间）。时间精度可能只到秒，
+        同一秒内的变化会被再次返回，客户端按ID合并即可。
+        """
+        updated_raw = type_coerce(EvaluationTask.updated_at, String)
+        created_raw = type_coerce(EvaluationTask.created_at, String)
+        server_time = TaskService.get_server_time(db)
+        
+        query = db.query(EvaluationTask, updated_raw, created_raw)
+        if user_id:
+            query = query.filter(EvaluationTask.user_id == user_id)
+        if since:
+            # 创建后从未更新过的任务 updated_at 为空，按创建时间判断
+            query = query.filter(or_(
+                updated_raw >= since,
+                and_(EvaluationTask.updated_at.is_(None), created_raw >= since)
+            ))
+        
+        rows = (
+            query.order_by(func.coalesce(EvaluationTask.updated_at, EvaluationTask.created_at), EvaluationTask.id)
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if has_more:
+            # 未返回完的变化从最后一条的时间继续
+            _, last_updated, last_created = rows[-1]
+            next_since = str(last_updated or last_created)
+        else:
+            next_since = server_time
+        return {"items": [task for task, _, _ in rows], "next_since": next_since, "has_more": has_more}
+    
+    @staticmethod
+    def get_status_counts(db: Session, user_id: int = None) -> Dict[str, Any]:
+        """按状态统计任务数量"""
+        query = db.query(EvaluationTask.status, func.count(EvaluationTask.id))
+        if user_id:
+            query = query.filter(EvaluationTask.user_id == user_id)
+        counts = {status.value: 0 for status in TaskStatus}
+        for status, count in query.group_by(EvaluationTask.status).all():
+            counts[status.value] = count
+        return {
+            "total": sum(counts.values()),
+            "by_status": counts,
+            # 可作为 get_changed_tasks 的起点
+            "server_time": TaskService.get_server_time(db)
+        }
+    
+    @staticmethod
+    def get_server_time(db: Session) -> str:
+        """数据库当前时间（与 updated_at 的存储格式一致）"""
+        return str(db.query(type_coerce(func.now(), String)).scalar())
+    
+    @staticmethod
+    def encode_cursor(created_at: str, task_id: int) -> str:
+        """生成任务列表的分页游标"""
+        raw = json.dumps([created_at, task_id]).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, int]:
+        """解析任务列表的分页游标"""
+        try:
+            created_at, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return str(created_at), int(task_id)
+        except (ValueError, TypeError):
+            raise ValueError(f"无效的分页游标: {cursor}")
+    
     @staticmethod
     def update_task_status(
         db: Session,
@@ -86,13 +208,65 @@ class TaskService:
         
         if status == TaskStatus.RUNNING and not task.started_at:
             task.started_at = datetime.utcnow()
-        elif status in [TaskStatus.COMPLETED, TaskStatus.FAILED]:
+        elif status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]:
             task.completed_at = datetime.utcnow()
         
         db.commit()
         db.refresh(task)
+        TaskService._publish_status(task)
+        return task
+    
+    @staticmethod
+    def transition_task_status(
+        db: Session,
+        task_id: int,
+        status: TaskStatus,
+        progress: str = None,
+        only_from: Optional[List[TaskStatus]] = None,
+        unless: Optional[List[TaskStatus]] = None
+    ) -> Optional[EvaluationTask]:
+        """条件更新任务状态：当前状态在 only_from 中且不在 unless 中时才更新，未更新时返回 None
+        
+        判断和写入在同一条 UPDATE 中完成，用于状态可能被其他线程并发修改的场景
+        （如取消请求与执行器开始运行竞争）。
+        """
+        values: Dict[str, Any] = {"status": status}
+        if progress:
+            values["progress"] = progress
+        if status == TaskStatus.RUNNING:
+            values["started_at"] = func.coalesce(EvaluationTask.started_at, datetime.utcnow())
+        elif status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]:
+            values["completed_at"] = datetime.utcnow()
+        
+        conditions = [EvaluationTask.id == task_id]
+        if only_from:
+            conditions.append(EvaluationTask.status.in_(only_from))
+        if unless:
+            conditions.append(EvaluationTask.status.not_in(unless))
+        updated = db.execute(
+            update(EvaluationTask).where(*conditions).values(**values)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            db.rollback()
+            return None
+        db.commit()
+        task = TaskService.get_task(db, task_id)
+        db.refresh(task)
+        TaskService._publish_status(task)
         return task
     
+    @staticmethod
+    def _publish_status(task: EvaluationTask):
+        """推送状态变更事件"""
+        TaskEventBus.publish(task.id, "status", {
+            "task_id": task.id,
+            "status": task.status.value,
+            "processed_samples": task.processed_samples,
+            "total_samples": task.total_samples,
+            "progress": task.progress
+        })
+    
     @staticmethod
     def update_task_progress(
         db: Session,
@@ -115,6 +289,28 @@ class TaskService:
         db.refresh(task)
         return task
     
+    @staticmethod
+    async def update_task_progress_async(
+        session: AsyncSession,
+        task_id: int,
+        processed_samples: int,
+        total_samples: int
+    ):
+        """异步更新任务进度（评估执行循环中使用，单条UPDATE，不阻塞事件循环）"""
+        values = {"processed_samples": processed_samples, "total_samples": total_samples}
+        if total_samples > 0:
+            values["progress"] = f"{int((processed_samples / total_samples) * 100)}%"
+        await session.execute(
+            update(EvaluationTask).where(EvaluationTask.id == task_id).values(**values)
+        )
+        await session.commit()
+    
+    @staticmethod
+    async def get_task_async(session: AsyncSession, task_id: int) -> Optional[EvaluationTask]:
+        """异步获取任务"""
+        result = await session.execute(select(EvaluationTask).where(EvaluationTask.id == task_id))
+        return result.scalar_one_or_none()
+    
     @staticmethod
     def update_task(
         db: Session,
@@ -131,9 +327,9 @@ class TaskService:
         if not task:
             return None
         
-        # 只允许更新待执行或失败的任务
-        if task.status not in [TaskStatus.PENDING, TaskStatus.FAILED]:
-            raise ValueError(f"只能编辑待执行或失败的任务，当前状态: {task.status.value}")
+        # 只允许更新待执行、失败或已取消的任务
+        if task.status not in [TaskStatus.PENDING, TaskStatus.FAILED, TaskStatus.CANCELLED]:
+            raise ValueError(f"只能编辑待执行、失败或已取消的任务，当前状态: {task.status.value}")
         
         # 更新字段
         if name is not None:
@@ -164,8 +360,8 @@ class TaskService:
         if indicator_weights is not None:
             task.indicator_weights = indicator_weights
         
-        # 如果任务之前失败，重置状态
-        if task.status == TaskStatus.FAILED:
+        # 如果任务之前失败或被取消，重置状态
+        if task.status in [TaskStatus.FAILED, TaskStatus.CANCELLED]:
             task.status = TaskStatus.PENDING
             task.progress = "0%"
             task.processed_samples = 0
@@ -187,7 +383,13 @@ class TaskService:
         if not task:
             return False
         
+        if task.result:
+            ResultCache.invalidate(task.result.id)
+        SampleResultService.delete_for_task(db, task_id)
+        ArchiveService.delete_task_archive(db, task_id)
+        LeaderboardService.remove_task(db, task_id)
         db.delete(task)
         db.commit()
+        TaskEventBus.clear(task_id)
         return True
 
@@ -0,0 +1,157 @@
+"""Token 用量与费用估算
+
+每次智能体调用的 token 数优先取响应中的 usage（OpenAI/DeepSeek 格式），通用端点没有返回用量时
+用本地分词估计。任务结束时汇总为结果的 summary["usage"]，并按价格表估算费用。
+
+价格表为模型名 -> 每百万 token 的输入/输出价格，可通过 MODEL_PRICES_PATH 指向的 JSON 文件
+补充或覆盖，单个任务也可以在 agent_config["pricing"] 中直接指定价格。
+"""
+
+import json
+import os
+from typing import Any, Dict, Optional
+from ..models.task import EvaluationTask
+from ..utils.tokens import estimate_tokens
+
+# 自定义价格表（JSON 文件，格式同 DEFAULT_MODEL_PRICES）
+MODEL_PRICES_PATH = os.getenv("MODEL_PRICES_PATH")
+
+# 默认价格表（每百万 token，参考各服务商公布的标准价格，变动时以服务商为准）
+DEFAULT_MODEL_PRICES: Dict[str, Dict[str, Any]] = {
+    "deepseek-chat": {"input_per_million": 0.27, "output_per_million": 1.10, "currency": "USD"},
+    "deepseek-reasoner": {"input_per_million": 0.55, "output_per_million": 2.19, "currency": "USD"},
+    "gpt-4o": {"input_per_million": 2.50, "output_per_million": 10.00, "currency": "USD"},
+    "gpt-4o-mini": {"input_per_million": 0.15, "output_per_million": 0.60, "currency": "USD"},
+}
+
+
+class UsageStats:
+    """一批智能体调用的 token 用量（可在分片间合并）"""
+
+    __slots__ = ("calls", "failed_calls", "estimated_calls", "prompt_tokens", "completion_tokens")
+
+    def __init__(self):
+        self.calls = 0
+        self.failed_calls = 0
+        self.estimated_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def add(self, call_stats: Dict[str, Any]):
+        """计入一次调用（失败的调用同样计入已发送的输入和已收到的输出 token，端点通常照常计费）"""
+        self.calls += 1
+        if call_stats.get("failed"):
+            self.failed_calls += 1
+        if call_stats.get("tokens_estimated"):
+            self.estimated_calls += 1
+        self.prompt_tokens += call_stats.get("prompt_tokens") or 0
+        self.completion_tokens += call_stats.get("output_tokens") or 0
+
+    def merge(self, other: "UsageStats") -> "UsageStats":
+        """合并另一批调用的用量（原地修改并返回自身）"""
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        return self
+
+    def to_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UsageStats":
+        stats = cls()
+        for name in cls.__slots__:
+            setattr(stats, name, int(data.get(name, 0)))
+        return stats
+
+
+class UsageService:
+    """token 用量统计与费用估算"""
+
+    _prices: Optional[Dict[str, Dict[str, Any]]] = None
+
+    @staticmethod
+    def fill_estimates(call_stats: Dict[str, Any], prompt: str, response: str):
+        """端点没有返回用量时用本地分词估计 token 数
+
+        失败的调用只估计输入（请求已发出），输出按已收到的部分计（流式调用中断时由调用方记录），
+        response 此时是错误描述，不参与估计。
+        """
+        if call_stats.get("prompt_tokens") is None:
+            call_stats["prompt_tokens"] = estimate_tokens(prompt)
+            call_stats["tokens_estimated"] = True
+        if call_stats.get("failed"):
+            return
+        if call_stats.get("output_tokens") is None:
+            call_stats["output_tokens"] = estimate_tokens(response)
+            call_stats["tokens_estimated"] = True
+
+    @staticmethod
+    def prices() -> Dict[str, Dict[str, Any]]:
+        """价格表（默认价格叠加 MODEL_PRICES_PATH 中的配置）"""
+        if UsageService._prices is None:
+            prices = dict(DEFAULT_MODEL_PRICES)
+            if MODEL_PRICES_PATH:
+                with open(MODEL_PRICES_PATH, encoding="utf-8") as f:
+                    prices.update(json.load(f))
+            UsageService._prices = prices
+        return UsageService._prices
+
+    @staticmethod
+    def agent_model(task: EvaluationTask) -> Optional[str]:
+        """任务调用的模型名：agent_config["model"]，OpenAI 兼容端点默认为 deepseek-chat"""
+        from .evaluation_service import EvaluationService
+        agent_config = task.agent_config or {}
+        if agent_config.get("model"):
+            return agent_config["model"]
+        if task.agent_api_endpoint and EvaluationService._is_openai_compatible(task.agent_api_endpoint):
+            return "deepseek-chat"
+        return None
+
+    @staticmethod
+    def lookup_price(model: Optional[str], agent_config: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """查找价格：任务配置的 pricing 优先，其次按模型名精确匹配，再按最长前缀匹配（如 gpt-4o-2024-08-06）"""
+        pricing = (agent_config or {}).get("pricing")
+        if pricing:
+            return {
+                "input_per_million": float(pricing.get("input_per_million", 0)),
+                "output_per_million": float(pricing.get("output_per_million", 0)),
+                "currency": pricing.get("currency", "USD")
+            }
+        if not model:
+            return None
+        prices = UsageService.prices()
+        if model in prices:
+            return prices[model]
+        prefixes = [name for name in prices if model.startswith(name)]
+        return prices[max(prefixes, key=len)] if prefixes else None
+
+    @staticmethod
+    def estimate_cost(prompt_tokens: float, completion_tokens: float, price: Optional[Dict[str, Any]]) -> Optional[float]:
+        """按价格估算费用，没有价格时返回 None"""
+        if not price:
+            return None
+        return (
+            prompt_tokens * price["input_per_million"]
+            + completion_tokens * price["output_per_million"]
+        ) / 1_000_000
+
+    @staticmethod
+    def task_price(task: EvaluationTask) -> Optional[Dict[str, Any]]:
+        """任务调用的模型的价格，找不到时返回 None"""
+        return UsageService.lookup_price(UsageService.agent_model(task), task.agent_config)
+
+    @staticmethod
+    def summarize(usage: UsageStats, task: EvaluationTask) -> Dict[str, Any]:
+        """写入结果 summary["usage"] 的用量与费用"""
+        model = UsageService.agent_model(task)
+        price = UsageService.lookup_price(model, task.agent_config)
+        return {
+            **usage.to_dict(),
+            "total_tokens": usage.prompt_tokens + usage.completion_tokens,
+            "avg_prompt_tokens": usage.prompt_tokens / usage.calls if usage.calls else 0.0,
+            "avg_completion_tokens": usage.completion_tokens / usage.calls if usage.calls else 0.0,
+            "model": model,
+            "price": price,
+            "cost": UsageService.estimate_cost(usage.prompt_tokens, usage.completion_tokens, price),
+            "currency": price["currency"] if price else None
+        }
@@ -1,15 +1,33 @@
-"""工具函数模块"""
+"""工具函数模块
 
-from .auth import verify_password, get_password_hash, create_access_token, verify_token
-from .indicators import IndicatorCalculator
-from .data_loader import DataLoader
+子模块按需导入：indicators 依赖 NumPy/scikit-learn，auth 依赖 jose/passlib，
+在包级别直接导入会拖慢 API 进程启动并常驻内存。
+"""
 
-__all__ = [
-    "verify_password",
-    "get_password_hash",
-    "create_access_token",
-    "verify_token",
-    "IndicatorCalculator",
-    "DataLoader",
-]
+import importlib
 
+# 导出名称 -> 所在子模块
+_EXPORTS = {
+    "verify_password": "auth",
+    "get_password_hash": "auth",
+    "create_access_token": "auth",
+    "verify_token": "auth",
+    "IndicatorCalculator": "indicators",
+    "DataLoader": "data_loader",
+    "RunningStats": "statistics",
+    "QuantileSketch": "statistics",
+    "ValueStats": "statistics",
+    "MetricsRegistry": "metrics",
+    "estimate_tokens": "tokens",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
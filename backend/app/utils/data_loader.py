@@ -4,8 +4,7 @@ import json
 import csv
 import os
 from typing import List, Dict, Any
-import aiohttp
-import pandas as pd
+from .metrics import DATASET_LOAD_DURATION
 
 
 class DataLoader:
@@ -63,12 +62,14 @@ class DataLoader:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"文件不存在: {file_path}")
         
+        import pandas as pd
         df = pd.read_csv(file_path)
         return df.to_dict('records')
     
     @staticmethod
     async def load_from_api(api_url: str, headers: Dict[str, str] = None) -> List[Dict[str, Any]]:
         """从API加载数据"""
+        import aiohttp
         async with aiohttp.ClientSession() as session:
             async with session.get(api_url, headers=headers) as response:
                 if response.status != 200:
@@ -83,7 +84,13 @@ class DataLoader:
     
     @staticmethod
     async def load_data(dataset_type: str, config: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """统一的数据加载接口"""
+        """统一的数据加载接口（记录加载耗时）"""
+        label = dataset_type if dataset_type in ("json", "csv", "api") else "unknown"
+        with DATASET_LOAD_DURATION.time(label):
+            return await DataLoader._load_data(dataset_type, config)
+
+    @staticmethod
+    async def _load_data(dataset_type: str, config: Dict[str, Any]) -> List[Dict[str, Any]]:
         if dataset_type == "json":
             file_path = config.get("file_path")
             if not file_path:
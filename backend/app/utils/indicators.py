@@ -1,10 +1,14 @@
-"""评估指标计算器"""
+"""评估指标计算器
+
+NumPy 和 scikit-learn 在首次计算相应指标时才导入，API 进程启动时不加载。
+"""
 
 import re
+import time
 from typing import List, Dict, Any, Optional
 from collections import Counter
-import numpy as np
-from sklearn.metrics import accuracy_score, precision_recall_fscore_support
+from .metrics import INDICATOR_DURATION
+from .tokens import estimate_tokens
 
 
 class IndicatorCalculator:
@@ -15,11 +19,13 @@ class IndicatorCalculator:
         """计算准确率"""
         if len(y_true) != len(y_pred):
             raise ValueError("真实值和预测值长度不一致")
+        from sklearn.metrics import accuracy_score
         return accuracy_score(y_true, y_pred)
     
     @staticmethod
     def calculate_precision_recall_f1(y_true: List[Any], y_pred: List[Any], average: str = "binary") -> Dict[str, float]:
         """计算精确率、召回率和F1分数"""
+        from sklearn.metrics import precision_recall_fscore_support
         precision, recall, f1, _ = precision_recall_fscore_support(
             y_true, y_pred, average=average, zero_division=0
         )
@@ -145,6 +151,7 @@ class IndicatorCalculator:
             return 0.0
         # 计算不同领域的平均得分
         scores = [r.get("score", 0.0) for r in results]
+        import numpy as np
         return float(np.mean(scores)) if scores else 0.0
     
     @staticmethod
@@ -186,11 +193,63 @@ class IndicatorCalculator:
             "transferred_score": transferred_score
         }
     
+    @staticmethod
+    def calculate_latency(call_stats: Dict[str, Any], target_ms: float, first_token: bool = False) -> Dict[str, Any]:
+        """计算响应延迟（first_token 为真时计算首 token 时间）
+        
+        value 为实测毫秒数，用于聚合分位数。失败的调用得 0 分，但仍按实际耗时计入分位数
+        （超时等失败往往是最慢的调用，剔除后尾延迟会被低估）；没有收到首 token 时取失败前的总耗时。
+        started_at 用于计算任务实际达到的每秒请求数。
+        """
+        failed = bool(call_stats.get("failed"))
+        latency_ms = call_stats.get("latency_ms") or 0.0
+        if first_token and call_stats.get("ttft_ms") is not None:
+            latency_ms = call_stats["ttft_ms"]
+        if failed:
+            score = 0.0
+        else:
+            score = min(1.0, target_ms / latency_ms) if latency_ms > 0 else 1.0
+        result = {
+            "score": score,
+            "value": latency_ms,
+            "unit": "ms"
+        }
+        if failed:
+            result["failed"] = True
+        if not first_token and call_stats.get("started_at") is not None:
+            result["started_at"] = call_stats["started_at"]
+        return result
+    
+    @staticmethod
+    def calculate_output_throughput(
+        call_stats: Dict[str, Any],
+        response: str,
+        target_tokens_per_second: float
+    ) -> Dict[str, Any]:
+        """计算输出吞吐量（token/秒），端点没有返回用量时按响应文本估计 token 数"""
+        if call_stats.get("failed"):
+            return {"score": 0.0, "value": None, "unit": "tokens/s"}
+        tokens_per_second = call_stats.get("tokens_per_second")
+        if tokens_per_second is None:
+            latency_ms = call_stats.get("latency_ms") or 0.0
+            duration = (latency_ms - (call_stats.get("ttft_ms") or 0.0)) / 1000
+            if duration <= 0:
+                # 模拟响应等没有耗时的调用
+                return {"score": 1.0, "value": None, "unit": "tokens/s"}
+            tokens = call_stats.get("output_tokens") or estimate_tokens(response)
+            tokens_per_second = tokens / duration
+        return {
+            "score": min(1.0, tokens_per_second / target_tokens_per_second) if target_tokens_per_second > 0 else 1.0,
+            "value": tokens_per_second,
+            "unit": "tokens/s"
+        }
+    
     @staticmethod
     def calculate_indicator(
         indicator_name: str,
         data: Dict[str, Any],
-        calculation_function: str = None
+        calculation_function: str = None,
+        record_metrics: bool = True
     ) -> Dict[str, Any]:
         """根据指标名称计算对应的指标值
         
@@ -198,6 +257,7 @@ class IndicatorCalculator:
             indicator_name: 指标名称（如 "accuracy", "precision"）
             data: 计算所需的数据
             calculation_function: 计算函数名称（如果提供，优先使用）
+            record_metrics: 是否计入 Prometheus 的指标计算耗时（试运行计时时为 False）
         """
         # 如果提供了calculation_function，优先使用它
         func_name = calculation_function or indicator_name
@@ -248,15 +308,35 @@ class IndicatorCalculator:
                 d.get("original_score", 0.0),
                 d.get("transferred_score", 0.0)
             ),
+            "latency": lambda d: IndicatorCalculator.calculate_latency(
+                d.get("call_stats", {}),
+                float(d.get("config", {}).get("target_ms", 2000))
+            ),
+            "ttft": lambda d: IndicatorCalculator.calculate_latency(
+                d.get("call_stats", {}),
+                float(d.get("config", {}).get("target_ms", 1000)),
+                first_token=True
+            ),
+            "output_throughput": lambda d: IndicatorCalculator.calculate_output_throughput(
+                d.get("call_stats", {}),
+                d.get("response", ""),
+                float(d.get("config", {}).get("target_tokens_per_second", 30))
+            ),
+            "success_rate": lambda d: {"score": 0.0 if d.get("call_stats", {}).get("failed") else 1.0},
         }
         
         # 首先尝试使用calculation_function，如果不存在则使用indicator_name
-        if func_name in calculator_map:
+        if func_name not in calculator_map:
+            func_name = indicator_name
+        if func_name not in calculator_map:
+            raise ValueError(f"不支持的指标: {indicator_name} (calculation_function: {calculation_function or indicator_name})")
+        if not record_metrics:
             return calculator_map[func_name](data)
-        elif indicator_name in calculator_map:
-            return calculator_map[indicator_name](data)
-        else:
-            raise ValueError(f"不支持的指标: {indicator_name} (calculation_function: {func_name})")
+        start = time.perf_counter()
+        try:
+            return calculator_map[func_name](data)
+        finally:
+            INDICATOR_DURATION.observe(time.perf_counter() - start, func_name)
     
     @staticmethod
     def _extract_precision_recall_f1(result: Dict[str, float], indicator_name: str) -> Dict[str, float]:
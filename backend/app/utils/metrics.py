@@ -0,0 +1,248 @@
+"""Prometheus 格式的进程内指标
+
+计数器、仪表和直方图都只在内存中累加（一次字典查找 + 一次加锁的加法），
+由 /metrics 接口按 Prometheus 文本格式（0.0.4）输出。
+"""
+
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+# 默认的耗时直方图分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    """指标基类，子类需实现 render（缺少时实例化即报错，而不是等到 /metrics 被抓取）"""
+
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        MetricsRegistry.register(self)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        """按 Prometheus 文本格式输出的行"""
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        key = tuple(str(label) for label in labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(_Metric):
+    """可任意设置的仪表"""
+
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels):
+        key = tuple(str(label) for label in labels)
+        with self._lock:
+            self._values[key] = value
+
+    def remove(self, *labels):
+        key = tuple(str(label) for label in labels)
+        with self._lock:
+            self._values.pop(key, None)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各分桶计数..., +Inf 计数, 总和]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels):
+        key = tuple(str(label) for label in labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """以上下文管理器的方式记录耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(counts)) for key, counts in self._values.items()]
+        lines = self._header()
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(float(counts[-1]))}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """进程内所有指标"""
+
+    _metrics: Dict[str, _Metric] = {}
+
+    @staticmethod
+    def register(metric: _Metric):
+        if metric.name in MetricsRegistry._metrics:
+            raise ValueError(f"指标已存在: {metric.name}")
+        MetricsRegistry._metrics[metric.name] = metric
+
+    @staticmethod
+    def render() -> str:
+        lines = []
+        for metric in list(MetricsRegistry._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 评估执行热路径上的指标
+AGENT_CALL_DURATION = Histogram(
+    "agent_call_duration_seconds", "智能体API调用耗时", ["endpoint"]
+)
+AGENT_TTFT = Histogram(
+    "agent_time_to_first_token_seconds", "流式调用的首 token 时间", ["endpoint"]
+)
+AGENT_CALLS = Counter(
+    "agent_calls_total", "智能体API调用次数（status 为HTTP状态码、mock、error、timeout 或 stream_error）", ["endpoint", "status"]
+)
+INDICATOR_DURATION = Histogram(
+    "indicator_compute_duration_seconds", "单个样本单个指标的计算耗时", ["indicator"],
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+)
+DATASET_LOAD_DURATION = Histogram(
+    "dataset_load_duration_seconds", "数据集加载耗时", ["type"]
+)
+DB_COMMIT_DURATION = Histogram(
+    "db_commit_duration_seconds", "数据库事务提交耗时"
+)
+SAMPLES_PROCESSED = Counter(
+    "evaluation_samples_processed_total", "已处理的样本数"
+)
+TASK_THROUGHPUT = Gauge(
+    "evaluation_task_samples_per_second", "运行中任务的样本吞吐量", ["task_id"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP请求耗时（到响应开始）", ["method", "route", "status"]
+)
+
+
+class MetricsMiddleware:
+    """记录HTTP请求耗时的 ASGI 中间件
+
+    按路由模板（如 /api/tasks/{task_id}）而不是实际路径打标签，避免标签数量无限增长；
+    未匹配到路由的请求记为 "unmatched"。SSE 等流式响应只统计到响应开始的耗时。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        recorded = False
+
+        def record(status):
+            nonlocal recorded
+            if recorded:
+                return
+            recorded = True
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                scope["method"], getattr(route, "path", "unmatched"), status
+            )
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            record(500)
+            raise
@@ -0,0 +1,257 @@
+"""可合并的在线统计量"""
+
+import math
+from statistics import NormalDist
+from typing import Dict, Any, Optional
+
+
+class RunningStats:
+    """单遍计算均值、方差、最值的在线统计量（Welford算法）
+
+    支持合并（Chan等人的并行公式），因此可以在多个分片/节点上分别累计，
+    最后再合并成整体统计。
+    """
+
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float):
+        """加入一个观测值"""
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        """合并另一个统计量（原地修改并返回自身）"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return self
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self) -> float:
+        """总体方差（与 np.std 默认的 ddof=0 一致）"""
+        return self.m2 / self.count if self.count > 0 else 0.0
+
+    @property
+    def std(self) -> float:
+        """总体标准差"""
+        return math.sqrt(self.variance) if self.count > 1 else 0.0
+
+    @property
+    def sample_variance(self) -> float:
+        """样本方差（ddof=1）"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def ci_half_width(self, confidence: float = 0.95) -> float:
+        """均值的置信区间半宽（正态近似），样本不足2个时返回无穷大"""
+        if self.count < 2:
+            return math.inf
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        return z * math.sqrt(self.sample_variance / self.count)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """序列化为可存入JSON列的字典"""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RunningStats":
+        """从 to_dict 的结果恢复"""
+        stats = cls()
+        stats.count = int(data.get("count", 0))
+        stats.mean = float(data.get("mean", 0.0))
+        stats.m2 = float(data.get("m2", 0.0))
+        stats.min = data.get("min")
+        stats.max = data.get("max")
+        return stats
+
+
+class QuantileSketch:
+    """相对误差有界的可合并分位数草图（DDSketch）
+
+    按对数间隔分桶计数，任一分位数的估计值与真实值的相对误差不超过 relative_accuracy，
+    内存只与数值范围的对数成正比（1 毫秒到 100 秒约 600 个桶），与样本数无关。
+    和 RunningStats 一样可以在分片/节点上分别累计后合并。
+    """
+
+    __slots__ = ("relative_accuracy", "_gamma", "_log_gamma", "bins", "zero_count", "count", "min", "max")
+
+    # 不大于该值的观测值计入零桶
+    MIN_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy 必须在 0 和 1 之间")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float):
+        """加入一个观测值（负值按 0 计）"""
+        value = max(float(value), 0.0)
+        if value <= self.MIN_VALUE:
+            self.zero_count += 1
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + 1
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """合并另一个草图（原地修改并返回自身），两者的精度必须相同"""
+        if other.count == 0:
+            return self
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("只能合并精度相同的分位数草图")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """q 分位数的估计值（0 <= q <= 1），没有观测值时返回 None"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        cumulative = self.zero_count
+        if cumulative > rank:
+            return 0.0
+        value = self.max
+        for key in sorted(self.bins):
+            cumulative += self.bins[key]
+            if cumulative > rank:
+                # 桶 (gamma^(key-1), gamma^key] 的代表值，相对误差不超过 relative_accuracy
+                value = 2 * self._gamma ** key / (self._gamma + 1)
+                break
+        return min(max(value, self.min), self.max)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """序列化为可存入JSON列的字典"""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "bins": {str(key): count for key, count in self.bins.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        """从 to_dict 的结果恢复"""
+        sketch = cls(float(data.get("relative_accuracy", 0.01)))
+        sketch.bins = {int(key): int(count) for key, count in (data.get("bins") or {}).items()}
+        sketch.zero_count = int(data.get("zero_count", 0))
+        sketch.count = int(data.get("count", 0))
+        sketch.min = data.get("min")
+        sketch.max = data.get("max")
+        return sketch
+
+
+class ValueStats:
+    """指标实测值（如效率类指标的延迟毫秒数）的可合并汇总
+
+    逐样本结果中的 value 进入分位数草图；带 started_at 的结果（延迟）同时记录
+    第一个调用开始到最后一个调用结束的时间窗口，用于计算实际达到的每秒请求数。
+    """
+
+    __slots__ = ("sketch", "unit", "window_start", "window_end")
+
+    def __init__(self):
+        self.sketch = QuantileSketch()
+        self.unit: Optional[str] = None
+        self.window_start: Optional[float] = None
+        self.window_end: Optional[float] = None
+
+    def add(self, result_data: Dict[str, Any]):
+        """加入一个样本的指标结果（没有 value 时忽略）"""
+        value = result_data.get("value")
+        if value is None:
+            return
+        self.sketch.add(value)
+        self.unit = self.unit or result_data.get("unit")
+        started_at = result_data.get("started_at")
+        if started_at is not None:
+            finished_at = started_at + value / 1000
+            self.window_start = started_at if self.window_start is None else min(self.window_start, started_at)
+            self.window_end = finished_at if self.window_end is None else max(self.window_end, finished_at)
+
+    def merge(self, other: "ValueStats") -> "ValueStats":
+        """合并另一个汇总（原地修改并返回自身）"""
+        self.sketch.merge(other.sketch)
+        self.unit = self.unit or other.unit
+        if other.window_start is not None:
+            self.window_start = other.window_start if self.window_start is None else min(self.window_start, other.window_start)
+            self.window_end = other.window_end if self.window_end is None else max(self.window_end, other.window_end)
+        return self
+
+    def summary(self, sample_count: int) -> Dict[str, Any]:
+        """写入聚合结果的字段（没有实测值时为空）"""
+        if self.sketch.count == 0:
+            return {}
+        summary = {
+            "value_p50": self.sketch.quantile(0.5),
+            "value_p90": self.sketch.quantile(0.9),
+            "value_p99": self.sketch.quantile(0.99),
+            "value_min": self.sketch.min,
+            "value_max": self.sketch.max,
+            "value_count": self.sketch.count,
+            "unit": self.unit
+        }
+        if self.window_start is not None and self.window_end > self.window_start:
+            summary["requests_per_second"] = sample_count / (self.window_end - self.window_start)
+        return summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        """序列化为可存入JSON列的字典"""
+        return {
+            "sketch": self.sketch.to_dict(),
+            "unit": self.unit,
+            "window_start": self.window_start,
+            "window_end": self.window_end,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ValueStats":
+        """从 to_dict 的结果恢复"""
+        stats = cls()
+        stats.sketch = QuantileSketch.from_dict(data.get("sketch") or {})
+        stats.unit = data.get("unit")
+        stats.window_start = data.get("window_start")
+        stats.window_end = data.get("window_end")
+        return stats
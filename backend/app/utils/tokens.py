@@ -0,0 +1,52 @@
+"""文本 token 数估计
+
+安装了 tiktoken 时按 TOKENIZER_ENCODING 指定的编码计数（默认 cl100k_base，与 OpenAI/DeepSeek
+的计数接近），否则退化为按字和单词粗略估计。tiktoken 为可选依赖，首次加载编码失败（未安装或
+无法下载编码文件）后不再重试。
+
+首次加载编码可能需要下载编码文件，调用方应在事件循环外先调用 load_encoding()（如
+await asyncio.to_thread(load_encoding)），避免 estimate_tokens 在事件循环上阻塞。
+"""
+
+import os
+import re
+import threading
+
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+
+# 中文（含日文假名、韩文）按字计，英文和数字按单词计，标点单独计
+_TOKEN_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]|[A-Za-z0-9_]+|[^\w\s]")
+
+# None 表示尚未加载，False 表示不可用
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def load_encoding() -> bool:
+    """加载 tiktoken 编码（可能下载编码文件，应在线程中调用），返回是否可用"""
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception:
+                _encoding = False
+    return bool(_encoding)
+
+
+def _tiktoken_encoding():
+    """已加载的 tiktoken 编码，不可用时返回 None（尚未加载时在当前线程加载）"""
+    if _encoding is None:
+        load_encoding()
+    return _encoding or None
+
+
+def estimate_tokens(text: str) -> int:
+    """估计文本的 token 数（端点没有返回用量时使用）"""
+    if not text:
+        return 0
+    encoding = _tiktoken_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(_TOKEN_PATTERN.findall(text))
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""归档已完成任务的逐样本数据（可由 cron 定期执行）
+
+用法：
+    python archive_tasks.py [--older-than-days 30] [--limit 100]
+"""
+
+import argparse
+from app.models.database import SessionLocal, init_db
+from app.services.archive_service import ArchiveService, ARCHIVE_DIR
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="归档已完成任务的逐样本数据")
+    parser.add_argument("--older-than-days", type=int, default=30, help="归档完成时间早于该天数的任务")
+    parser.add_argument("--limit", type=int, default=None, help="本次最多归档的任务数")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        archived = ArchiveService.archive_completed_tasks(db, args.older_than_days, args.limit)
+        print(f"已归档 {len(archived)} 个任务到 {ARCHIVE_DIR}: {archived}")
+    finally:
+        db.close()
@@ -0,0 +1,121 @@
+"""API 进程冷启动导入耗时
+
+在新的解释器进程中导入 app.main，测量导入耗时和常驻内存，并检查重量级依赖没有被提前加载。
+超出预算时以非零状态码退出，可放在 CI 中防止启动时间回退。在 backend 目录下运行：
+    python -m benchmarks.bench_import_time [--repeat 5] [--budget-ms 1500] [--budget-rss-mb 150]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+# 启动时不应加载的依赖（只在评估、归档、认证等功能首次使用时导入）
+HEAVY_MODULES = ["numpy", "scipy", "sklearn", "pandas", "aiohttp", "jose", "passlib", "pyarrow"]
+
+# 默认预算（当前约 0.6 秒、70 MB，留出机器差异的余量）
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+IMPORT_RSS_BUDGET_MB = float(os.getenv("IMPORT_RSS_BUDGET_MB", "150"))
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+import psutil
+print(json.dumps({
+    "import_ms": elapsed * 1000,
+    "rss_mb": psutil.Process().memory_info().rss / 1024 / 1024,
+    "heavy_modules": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def _backend_dir() -> str:
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_once() -> Dict[str, Any]:
+    """在新进程中导入一次 app.main"""
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=_backend_dir(), capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def top_imports(limit: int) -> List[Dict[str, Any]]:
+    """-X importtime 统计中累计耗时最长的模块"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=_backend_dir(), capture_output=True, text=True, check=True
+    ).stderr
+    cumulative_us: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        module = module.strip()
+        cumulative_us[module] = max(cumulative_us.get(module, 0), int(cumulative))
+    rows = sorted(cumulative_us.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{"module": module, "cumulative_ms": value / 1000} for module, value in rows]
+
+
+def run(repeat: int) -> Dict[str, Any]:
+    runs = [measure_once() for _ in range(repeat)]
+    return {
+        "repeat": repeat,
+        "import_ms_median": statistics.median(item["import_ms"] for item in runs),
+        "import_ms_min": min(item["import_ms"] for item in runs),
+        "rss_mb_median": statistics.median(item["rss_mb"] for item in runs),
+        "heavy_modules": sorted({name for item in runs for name in item["heavy_modules"]}),
+    }
+
+
+def check(result: Dict[str, Any], budget_ms: float, budget_rss_mb: float) -> List[str]:
+    """返回超出预算的项"""
+    failures = []
+    if result["import_ms_median"] > budget_ms:
+        failures.append(f"导入耗时 {result['import_ms_median']:.0f} ms 超出预算 {budget_ms:.0f} ms")
+    if result["rss_mb_median"] > budget_rss_mb:
+        failures.append(f"常驻内存 {result['rss_mb_median']:.0f} MB 超出预算 {budget_rss_mb:.0f} MB")
+    if result["heavy_modules"]:
+        failures.append(f"启动时加载了重量级依赖: {', '.join(result['heavy_modules'])}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API 进程冷启动导入耗时")
+    parser.add_argument("--repeat", type=int, default=5, help="测量次数（取中位数）")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_TIME_BUDGET_MS, help="导入耗时预算（毫秒）")
+    parser.add_argument("--budget-rss-mb", type=float, default=IMPORT_RSS_BUDGET_MB, help="常驻内存预算（MB）")
+    parser.add_argument("--top", type=int, default=0, help="列出累计耗时最长的 N 个模块")
+    parser.add_argument("--json", action="store_true", help="以 JSON 格式输出")
+    args = parser.parse_args()
+
+    result = run(args.repeat)
+    failures = check(result, args.budget_ms, args.budget_rss_mb)
+    result["budget_ms"] = args.budget_ms
+    result["budget_rss_mb"] = args.budget_rss_mb
+    result["passed"] = not failures
+    if args.top:
+        result["top_imports"] = top_imports(args.top)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print(f"导入耗时: 中位数 {result['import_ms_median']:.0f} ms，最小 {result['import_ms_min']:.0f} ms "
+              f"（预算 {args.budget_ms:.0f} ms）")
+        print(f"常驻内存: {result['rss_mb_median']:.0f} MB（预算 {args.budget_rss_mb:.0f} MB）")
+        for row in result.get("top_imports", []):
+            print(f"  {row['cumulative_ms']:>9.1f} ms  {row['module']}")
+        for failure in failures:
+            print(f"失败: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""结果数据存储格式对比：JSON 文本 vs CompressedJSON（msgpack + zstd）
+
+对比存储体积以及编码、解码耗时。在 backend 目录下运行：
+    python -m benchmarks.bench_payload_codec [--samples 1000 10000] [--repeat 20]
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List
+from app.models.types import decode_payload, encode_payload, msgpack
+
+INDICATOR_IDS = list(range(1, 10))
+
+
+def build_aggregated(num_samples: int) -> Dict[int, Dict[str, Any]]:
+    """当前格式的聚合结果（逐样本明细已移到 sample_results 表）"""
+    rng = random.Random(0)
+    return {
+        ind_id: {
+            "score": rng.random(),
+            "min": 0.0,
+            "max": 1.0,
+            "std": rng.random() / 4,
+            "count": num_samples
+        }
+        for ind_id in INDICATOR_IDS
+    }
+
+
+def build_legacy_detailed(num_samples: int) -> Dict[int, Dict[str, Any]]:
+    """旧格式的聚合结果：每个指标附带全部样本的计算结果（迁移前的大体积数据）"""
+    rng = random.Random(0)
+    payload = build_aggregated(num_samples)
+    for ind_id in INDICATOR_IDS:
+        payload[ind_id]["detailed"] = [
+            {
+                "score": round(rng.random(), 6),
+                "precision": round(rng.random(), 6),
+                "recall": round(rng.random(), 6),
+                "f1": round(rng.random(), 6)
+            }
+            for _ in range(num_samples)
+        ]
+    return payload
+
+
+def _time_per_call(func: Callable[[], Any], repeat: int) -> float:
+    """平均单次耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def measure(name: str, payload: Any, repeat: int) -> List[Dict[str, Any]]:
+    """测量两种格式的体积与编解码耗时"""
+    json_text = json.dumps(payload)
+    encoded = encode_payload(payload)
+    assert decode_payload(encoded) == json.loads(json_text)
+    return [
+        {
+            "payload": name,
+            "codec": "json",
+            "bytes": len(json_text.encode("utf-8")),
+            "encode_ms": _time_per_call(lambda: json.dumps(payload), repeat),
+            "decode_ms": _time_per_call(lambda: json.loads(json_text), repeat)
+        },
+        {
+            "payload": name,
+            "codec": "msgpack+zstd" if msgpack is not None else "json+zlib",
+            "bytes": len(encoded),
+            "encode_ms": _time_per_call(lambda: encode_payload(payload), repeat),
+            "decode_ms": _time_per_call(lambda: decode_payload(encoded), repeat)
+        }
+    ]
+
+
+def run(sample_counts: List[int], repeat: int) -> List[Dict[str, Any]]:
+    rows = []
+    for num_samples in sample_counts:
+        rows += measure(f"aggregated[{num_samples}]", build_aggregated(num_samples), repeat)
+        rows += measure(f"legacy_detailed[{num_samples}]", build_legacy_detailed(num_samples), repeat)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="结果数据存储格式对比")
+    parser.add_argument("--samples", type=int, nargs="+", default=[1000, 10000], help="样本数")
+    parser.add_argument("--repeat", type=int, default=20, help="每项重复次数")
+    parser.add_argument("--json", action="store_true", help="以 JSON 行格式输出")
+    args = parser.parse_args()
+
+    rows = run(args.samples, args.repeat)
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+        return
+
+    print(f"{'payload':<24}{'codec':<14}{'bytes':>12}{'encode ms':>12}{'decode ms':>12}")
+    for row in rows:
+        print(
+            f"{row['payload']:<24}{row['codec']:<14}{row['bytes']:>12}"
+            f"{row['encode_ms']:>12.3f}{row['decode_ms']:>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+"""性能基准套件
+
+覆盖指标计算、指标数据准备、结果聚合、数据集加载以及基于本地 mock_api 的端到端评估，
+全部离线运行。结果可输出为 JSON，并与保存的基线对比，耗时超出容差时以非零状态码退出。
+在 backend 目录下运行：
+    python -m benchmarks.bench_suite                        # 运行全部用例并与基线对比
+    python -m benchmarks.bench_suite --filter bleu rouge    # 只运行名称包含关键字的用例
+    python -m benchmarks.bench_suite --quick --json         # 缩小规模（放宽容差对比），输出 JSON
+    python -m benchmarks.bench_suite --save-baseline        # 用本次结果更新基线
+
+与基线对比的是各轮中最快一轮的每条目耗时：最快一轮受调度、频率调整等干扰最小，按条目折算后
+--quick 缩小数据规模的结果也能与完整规模的基线对比（固定开销占比更高，因此容差更宽）。
+共享机器上整机速度的短时波动可达数十个百分点，超出容差的用例会重新测量确认，取最快的一次。
+基线与机器相关，更换运行环境后应先在基准提交上重新生成。
+"""
+
+import argparse
+import asyncio
+import csv
+import gc
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# 最快一轮的每条目耗时超过基线的比例（0.25 即慢 25%）视为回退
+DEFAULT_TOLERANCE = 0.25
+# --quick 的容差：轮数少、数据规模小，固定开销和噪声的占比更高
+QUICK_TOLERANCE = 1.0
+# 每轮计时的最短时长（秒），单次调用较快的用例在一轮内重复多次
+MIN_ROUND_SECONDS = 1.0
+QUICK_MIN_ROUND_SECONDS = 0.25
+# 超出容差的用例最多重新测量的次数
+CONFIRM_RUNS = 2
+
+WORDS = (
+    "agent model evaluation task result score metric sample dataset response prompt token "
+    "latency throughput system memory cache index query vector search answer context"
+).split()
+
+# 用例名称 -> (准备函数, 说明)；准备函数返回 (被测函数, 每次调用处理的条目数)
+CASES: Dict[str, Tuple[Callable[[Dict[str, Any]], Tuple[Callable[[], Any], int]], str]] = {}
+
+
+def case(name: str, description: str):
+    def register(setup):
+        CASES[name] = (setup, description)
+        return setup
+    return register
+
+
+def _text(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def _indicators():
+    """内置指标（不入库的瞬时对象）"""
+    from app.models.indicator import Indicator
+    names = ["accuracy", "precision", "recall", "f1_score", "bleu", "rouge_l",
+             "adaptability", "collaboration_efficiency", "portability"]
+    return [Indicator(id=position + 1, name=name, calculation_function=None) for position, name in enumerate(names)]
+
+
+def _samples(count: int, length: int = 30) -> List[Dict[str, Any]]:
+    rng = random.Random(0)
+    return [
+        {
+            "input": _text(rng, 8),
+            "expected_output": _text(rng, length),
+            "reference": [_text(rng, length)]
+        }
+        for _ in range(count)
+    ]
+
+
+# ---------------------------------------------------------------- 指标计算
+
+def _text_metric_case(metric: str, length: int):
+    def setup(context):
+        from app.utils.indicators import IndicatorCalculator
+        rng = random.Random(length)
+        reference = [_text(rng, length)]
+        candidate = _text(rng, length)
+        func = getattr(IndicatorCalculator, f"calculate_{metric}")
+        return (lambda: func(reference, candidate)), 1
+    return setup
+
+
+for _length in (10, 100, 500):
+    case(f"indicator.bleu[{_length}w]", f"calculate_bleu，参考文本和候选文本各 {_length} 词")(
+        _text_metric_case("bleu", _length))
+    case(f"indicator.rouge_l[{_length}w]", f"calculate_rouge_l，参考文本和候选文本各 {_length} 词")(
+        _text_metric_case("rouge_l", _length))
+
+
+@case("evaluation.prepare_indicator_data", "_prepare_indicator_data，1000 个样本 × 9 个内置指标")
+def _prepare_case(context):
+    from app.services.evaluation_service import EvaluationService
+    indicators = _indicators()
+    samples = _samples(1000)
+    responses = [sample["expected_output"] for sample in samples]
+
+    def run():
+        for sample, response in zip(samples, responses):
+            for indicator in indicators:
+                EvaluationService._prepare_indicator_data(sample, response, indicator)
+    return run, len(samples)
+
+
+def _aggregate_case(count: int):
+    def setup(context):
+        from app.services.evaluation_service import EvaluationService
+        indicators = _indicators()
+        rng = random.Random(count)
+        results = [
+            {indicator.id: {"score": rng.random()} for indicator in indicators}
+            for _ in range(count)
+        ]
+        return (lambda: EvaluationService._aggregate_results(results, indicators)), count
+    return setup
+
+
+for _count, _label in ((1000, "1k"), (100000, "100k")):
+    case(f"evaluation.aggregate_results[{_label}]", f"_aggregate_results，{_count} 个样本 × 9 个指标")(
+        _aggregate_case(_count))
+
+
+# ---------------------------------------------------------------- 数据加载
+
+def _loader_case(file_type: str):
+    def setup(context):
+        from app.utils.data_loader import DataLoader
+        count = context["loader_rows"]
+        samples = _samples(count, length=20)
+        path = os.path.join(context["tmp_dir"], f"dataset.{file_type}")
+        if file_type == "json":
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(samples, f, ensure_ascii=False)
+        else:
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=["input", "expected_output"])
+                writer.writeheader()
+                for sample in samples:
+                    writer.writerow({"input": sample["input"], "expected_output": sample["expected_output"]})
+        config = {"file_path": path}
+        return (lambda: asyncio.run(DataLoader.load_data(file_type, config))), count
+    return setup
+
+
+case("loader.json", "DataLoader 加载 JSON 数据集")(_loader_case("json"))
+case("loader.csv", "DataLoader 加载 CSV 数据集")(_loader_case("csv"))
+
+
+# ---------------------------------------------------------------- 端到端
+
+class _MockAgentServer:
+    """在后台线程中运行 app.mock_api"""
+
+    def __init__(self):
+        import uvicorn
+        from app.mock_api import app as mock_app
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(mock_app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return f"http://127.0.0.1:{self.port}/api/chat"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+@case("e2e.execute_task", "execute_task 对本地 mock_api 端到端评估（9 个内置指标，并发 8）")
+def _e2e_case(context):
+    from app.models.database import SessionLocal, init_db
+    from app.services.evaluation_service import EvaluationService
+    from app.services.indicator_service import IndicatorService
+    from app.services.task_service import TaskService
+
+    count = context["e2e_samples"]
+    dataset_path = os.path.join(context["tmp_dir"], "e2e.json")
+    with open(dataset_path, "w", encoding="utf-8") as f:
+        json.dump(_samples(count), f, ensure_ascii=False)
+
+    server = _MockAgentServer()
+    endpoint = server.__enter__()
+    context["cleanup"].append(lambda: server.__exit__(None, None, None))
+
+    init_db()
+    db = SessionLocal()
+    context["cleanup"].append(db.close)
+    IndicatorService.init_builtin_indicators(db)
+    indicator_ids = [indicator.id for indicator in IndicatorService.get_indicators(db)]
+    task = TaskService.create_task(
+        db,
+        name="benchmark",
+        agent_config={"api_endpoint": endpoint, "api_key": ""},
+        dataset_config={"type": "json", "file_path": dataset_path},
+        selected_indicators=indicator_ids
+    )
+
+    task_id = task.id
+    def run():
+        session = SessionLocal()
+        try:
+            asyncio.run(EvaluationService.execute_task(session, task_id, {"concurrency": 8}))
+        finally:
+            session.close()
+    return run, count
+
+
+# ---------------------------------------------------------------- 运行与对比
+
+def _calibrate(func: Callable[[], Any], min_round_seconds: float) -> int:
+    """确定每轮的调用次数，使一轮至少持续 min_round_seconds"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_round_seconds:
+            return number
+        number *= 2 if elapsed > min_round_seconds / 10 else 10
+
+
+def measure(name: str, context: Dict[str, Any], repeat: int, min_round_seconds: float = MIN_ROUND_SECONDS) -> Dict[str, Any]:
+    setup, description = CASES[name]
+    func, items = setup(context)
+    # 与 timeit 相同，计时期间关闭垃圾回收，避免之前用例遗留的对象让回收耗时在轮次间波动
+    gc.collect()
+    gc.disable()
+    try:
+        number = _calibrate(func, min_round_seconds)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            timings.append((time.perf_counter() - start) / number * 1000)
+    finally:
+        gc.enable()
+    median_ms = statistics.median(timings)
+    min_ms = min(timings)
+    return {
+        "name": name,
+        "description": description,
+        "number": number,
+        "repeat": repeat,
+        "median_ms": median_ms,
+        "min_ms": min_ms,
+        "items": items,
+        "ms_per_item": min_ms / items,
+        "items_per_second": items / min_ms * 1000 if min_ms > 0 else None
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """与基线对比，返回每个用例的变化（ratio 为本次 / 基线的最快一轮每条目耗时）
+
+    旧格式的基线只有中位数耗时，此时按中位数比较。
+    """
+    baseline_cases = baseline.get("cases", {})
+    rows = []
+    for result in results:
+        recorded = baseline_cases.get(result["name"])
+        if recorded is None:
+            rows.append({"name": result["name"], "baseline_ms": None, "ratio": None, "regression": False})
+            continue
+        recorded_ms = recorded.get("min_ms", recorded.get("median_ms"))
+        # 基线规模下的等效耗时（--quick 的条目数与基线不同）
+        scaled_ms = result["ms_per_item"] * recorded["items"]
+        ratio = scaled_ms / recorded_ms if recorded_ms > 0 else None
+        rows.append({
+            "name": result["name"],
+            "baseline_ms": recorded_ms,
+            "scaled_ms": scaled_ms,
+            "ratio": ratio,
+            "regression": ratio is not None and ratio > 1 + tolerance
+        })
+    return rows
+
+
+def load_baseline(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: List[Dict[str, Any]], previous: Optional[Dict[str, Any]]):
+    """保存基线；只运行部分用例时保留其余用例的旧基线"""
+    cases = dict((previous or {}).get("cases", {}))
+    for result in results:
+        cases[result["name"]] = {
+            "min_ms": round(result["min_ms"], 6),
+            "median_ms": round(result["median_ms"], 6),
+            "items": result["items"]
+        }
+    baseline = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cases": dict(sorted(cases.items()))
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="性能基准套件")
+    parser.add_argument("--filter", nargs="+", help="只运行名称包含任一关键字的用例")
+    parser.add_argument("--list", action="store_true", help="列出所有用例")
+    parser.add_argument("--repeat", type=int, default=5, help="每个用例的计时轮数（取最快一轮）")
+    parser.add_argument("--quick", action="store_true", help="缩小数据集规模、缩短每轮时长，以较宽的容差与基线对比")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基线文件路径")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help=f"允许的变慢比例（默认 {DEFAULT_TOLERANCE}，--quick 时为 {QUICK_TOLERANCE}）")
+    parser.add_argument("--save-baseline", action="store_true", help="用本次结果更新基线")
+    parser.add_argument("--json", action="store_true", help="以 JSON 格式输出")
+    args = parser.parse_args()
+    if args.tolerance is None:
+        args.tolerance = QUICK_TOLERANCE if args.quick else DEFAULT_TOLERANCE
+    if "PYTHONHASHSEED" not in os.environ:
+        # 字符串哈希随机化会改变集合/字典的冲突情况，文本指标的耗时随进程波动；固定种子后重新启动
+        os.environ["PYTHONHASHSEED"] = "0"
+        os.execv(sys.executable, [sys.executable, "-m", "benchmarks.bench_suite", *sys.argv[1:]])
+
+    if args.list:
+        for name, (_, description) in CASES.items():
+            print(f"{name:<40}{description}")
+        return
+
+    names = [
+        name for name in CASES
+        if not args.filter or any(keyword in name for keyword in args.filter)
+    ]
+    tmp = tempfile.TemporaryDirectory(prefix="bench-")
+    # 端到端用例使用独立的临时数据库（需在导入 app.models 之前设置）
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+    context: Dict[str, Any] = {
+        "tmp_dir": tmp.name,
+        "loader_rows": 10000 if args.quick else 100000,
+        "e2e_samples": 50 if args.quick else 500,
+        "cleanup": []
+    }
+
+    def run(name: str) -> Dict[str, Any]:
+        if args.quick:
+            result = measure(name, context, min(args.repeat, 3), QUICK_MIN_ROUND_SECONDS)
+        else:
+            result = measure(name, context, args.repeat)
+        if not args.json:
+            print(f"{name:<40}{result['min_ms']:>12.3f} ms{result['items_per_second']:>14.1f} /s",
+                  file=sys.stderr)
+        return result
+
+    baseline = load_baseline(args.baseline)
+    comparison = []
+    try:
+        results = [run(name) for name in names]
+        comparison = compare(results, baseline, args.tolerance) if baseline else []
+        # 超出容差的用例重新测量确认，取最快的一次：短时波动不会在几次测量中持续，真正的回退会
+        for _ in range(CONFIRM_RUNS):
+            flagged = [position for position, row in enumerate(comparison) if row["regression"]]
+            if not flagged:
+                break
+            if not args.json:
+                print(f"重新测量超出容差的 {len(flagged)} 个用例", file=sys.stderr)
+            for position in flagged:
+                result = run(results[position]["name"])
+                if result["min_ms"] < results[position]["min_ms"]:
+                    results[position] = result
+            comparison = compare(results, baseline, args.tolerance)
+    finally:
+        for cleanup in reversed(context["cleanup"]):
+            cleanup()
+        tmp.cleanup()
+    regressions = [row["name"] for row in comparison if row["regression"]]
+
+    if args.save_baseline:
+        if args.quick:
+            parser.error("--quick 的结果不能作为基线")
+        save_baseline(args.baseline, results, baseline)
+
+    if args.json:
+        print(json.dumps({
+            "python": platform.python_version(),
+            "results": results,
+            "comparison": comparison,
+            "tolerance": args.tolerance,
+            "regressions": regressions
+        }, ensure_ascii=False))
+    elif comparison:
+        print(f"\n{'case':<40}{'min ms':>12}{'baseline ms':>14}{'ratio':>8}   (tolerance {args.tolerance:.0%})")
+        for result, row in zip(results, comparison):
+            baseline_ms = f"{row['baseline_ms']:.3f}" if row["baseline_ms"] is not None else "-"
+            ratio = f"{row['ratio']:.2f}" if row["ratio"] is not None else "-"
+            flag = "  回退" if row["regression"] else ""
+            print(f"{row['name']:<40}{row.get('scaled_ms', result['min_ms']):>12.3f}{baseline_ms:>14}{ratio:>8}{flag}")
+        if args.quick:
+            print("（--quick 的耗时已按条目数折算到基线的数据规模）")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
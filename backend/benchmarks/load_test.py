@@ -0,0 +1,361 @@
+"""多任务并发压测
+
+逐级增加同时执行的评估任务数，测出一个部署在 SQLite、线程池或事件循环成为瓶颈之前能承受的并发量。
+每一级创建并启动一批任务（智能体为本地 mock_api），同时按前端的方式轮询：
+每个任务每隔 --poll-interval 秒获取一次详情，完成后获取结果；--viewers 个前端页面
+增量刷新任务列表（/summary + /changes）。每一级结束后报告 API 延迟 p50/p95/p99、样本吞吐量
+和数据库锁错误数。
+
+默认在临时目录中启动 API（独立数据库）和 mock_api 两个子进程，在 backend 目录下运行：
+    python -m benchmarks.load_test --stages 10 50 100 200 --samples 20
+    python -m benchmarks.load_test --mock-profile "latency=lognormal&latency_ms=300" --json
+
+也可以压测已启动的服务（--api、--agent-endpoint），此时数据集文件需要在 API 进程中可读，
+数据库锁错误只能从响应和失败任务中统计。事件流（SSE）连接不在统计范围内。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+LOCK_ERROR = "database is locked"
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    """最近秩百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class _Server:
+    """以子进程运行 uvicorn 应用，输出写入日志文件"""
+
+    def __init__(self, app: str, log_path: str, env: Dict[str, str]):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.log_path = log_path
+        self._log = open(log_path, "w", encoding="utf-8")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(self.port),
+             "--log-level", "warning"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env={**os.environ, **env, "PYTHONUNBUFFERED": "1"},
+            stdout=self._log, stderr=subprocess.STDOUT
+        )
+
+    def wait_ready(self, path: str, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"服务启动失败，见日志 {self.log_path}")
+            try:
+                if httpx.get(self.url + path, timeout=1.0).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"服务启动超时，见日志 {self.log_path}")
+
+    def log_count(self, text: str) -> int:
+        """日志中出现 text 的次数"""
+        self._log.flush()
+        with open(self.log_path, encoding="utf-8", errors="replace") as f:
+            return f.read().count(text)
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self._log.close()
+
+
+class LoadClient:
+    """记录每个请求的耗时和错误"""
+
+    def __init__(self, base_url: str, max_connections: int):
+        self.client = httpx.AsyncClient(
+            base_url=base_url, timeout=60.0,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.lock_errors = 0
+
+    def reset(self):
+        self.latencies = {}
+        self.errors = {}
+        self.lock_errors = 0
+
+    async def request(self, method: str, route: str, path: str, **kwargs) -> Optional[Any]:
+        """发送请求，route 为统计用的路由模板；失败时返回 None"""
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self._error(route, type(e).__name__)
+            return None
+        finally:
+            self.latencies.setdefault(route, []).append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self._error(route, str(response.status_code))
+            if LOCK_ERROR in response.text:
+                self.lock_errors += 1
+            return None
+        return response.json()
+
+    def _error(self, route: str, kind: str):
+        key = f"{route} {kind}"
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    async def close(self):
+        await self.client.aclose()
+
+
+async def _watch_task(client: LoadClient, task_id: int, poll_interval: float, deadline: float) -> Dict[str, Any]:
+    """像前端任务详情页一样轮询任务，结束后获取结果"""
+    # 错开各任务的轮询时刻
+    await asyncio.sleep(random.uniform(0, poll_interval))
+    task = None
+    while time.monotonic() < deadline:
+        task = await client.request("GET", "GET /api/tasks/{task_id}", f"/api/tasks/{task_id}") or task
+        if task and task["status"] in FINISHED_STATUSES:
+            task["finished_at"] = time.monotonic()
+            if task["status"] == "completed":
+                await client.request("GET", "GET /api/results/task/{task_id}", f"/api/results/task/{task_id}")
+            return task
+        await asyncio.sleep(poll_interval)
+    return task or {"id": task_id, "status": "timeout"}
+
+
+async def _viewer(client: LoadClient, poll_interval: float, stop: asyncio.Event):
+    """像前端任务列表页一样增量刷新"""
+    summary = await client.request("GET", "GET /api/tasks/summary", "/api/tasks/summary")
+    await client.request("GET", "GET /api/tasks/page", "/api/tasks/page", params={"limit": 100})
+    since = summary["server_time"] if summary else None
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=poll_interval)
+            return
+        except asyncio.TimeoutError:
+            pass
+        await client.request("GET", "GET /api/tasks/summary", "/api/tasks/summary")
+        while since:
+            changes = await client.request(
+                "GET", "GET /api/tasks/changes", "/api/tasks/changes", params={"changed_since": since}
+            )
+            if not changes:
+                break
+            since = changes["next_since"]
+            if not changes["has_more"]:
+                break
+
+
+async def run_stage(
+    client: LoadClient,
+    concurrent_tasks: int,
+    args: argparse.Namespace,
+    agent_endpoint: str,
+    dataset_path: str,
+    indicator_ids: List[int],
+    api_server: Optional[_Server]
+) -> Dict[str, Any]:
+    """同时执行 concurrent_tasks 个任务，返回本级的统计"""
+    client.reset()
+    log_locks_before = api_server.log_count(LOCK_ERROR) if api_server else 0
+
+    created = await asyncio.gather(*[
+        client.request("POST", "POST /api/tasks", "/api/tasks", json={
+            "name": f"load-{concurrent_tasks}-{index}",
+            "agent_config": {"api_endpoint": agent_endpoint, "api_key": ""},
+            "dataset_config": {"type": "json", "file_path": dataset_path},
+            "selected_indicators": indicator_ids
+        })
+        for index in range(concurrent_tasks)
+    ])
+    task_ids = [task["id"] for task in created if task]
+
+    started_at = time.monotonic()
+    deadline = started_at + args.stage_timeout
+    await asyncio.gather(*[
+        client.request("POST", "POST /api/tasks/{task_id}/start", f"/api/tasks/{task_id}/start",
+                       json={"concurrency": args.task_concurrency})
+        for task_id in task_ids
+    ])
+
+    stop = asyncio.Event()
+    viewers = [asyncio.create_task(_viewer(client, args.viewer_interval, stop)) for _ in range(args.viewers)]
+    tasks = await asyncio.gather(*[
+        _watch_task(client, task_id, args.poll_interval, deadline) for task_id in task_ids
+    ])
+    stop.set()
+    await asyncio.gather(*viewers)
+
+    finished = [task["finished_at"] for task in tasks if "finished_at" in task]
+    elapsed = (max(finished) if finished else time.monotonic()) - started_at
+    processed = sum(task.get("processed_samples") or 0 for task in tasks)
+    statuses: Dict[str, int] = {}
+    for task in tasks:
+        statuses[task["status"]] = statuses.get(task["status"], 0) + 1
+    failed_locked = sum(
+        1 for task in tasks
+        if task["status"] == "failed" and LOCK_ERROR in (task.get("description") or "")
+    )
+
+    all_latencies = [value for values in client.latencies.values() for value in values]
+    return {
+        "concurrent_tasks": concurrent_tasks,
+        "created": len(task_ids),
+        "statuses": statuses,
+        "elapsed_seconds": round(elapsed, 2),
+        "samples_processed": processed,
+        "samples_per_second": round(processed / elapsed, 1) if elapsed > 0 else None,
+        "requests": len(all_latencies),
+        "latency_ms": _latency_summary(all_latencies),
+        "routes": {route: _latency_summary(values) for route, values in sorted(client.latencies.items())},
+        "http_errors": dict(sorted(client.errors.items())),
+        "lock_errors": {
+            "responses": client.lock_errors,
+            "failed_tasks": failed_locked,
+            "server_log": api_server.log_count(LOCK_ERROR) - log_locks_before if api_server else None
+        }
+    }
+
+
+def _latency_summary(values: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(values),
+        **{
+            f"p{q}": round(_percentile(values, q) * 1000, 1) if values else None
+            for q in (50, 95, 99)
+        }
+    }
+
+
+def _write_dataset(path: str, count: int):
+    samples = [
+        {
+            "input": f"问题 {index}：请简要介绍人工智能和机器学习的关系。",
+            "expected_output": "机器学习是人工智能的一个子领域，使计算机能够从数据中学习。"
+        }
+        for index in range(count)
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(samples, f, ensure_ascii=False)
+
+
+def _print_stage(result: Dict[str, Any]):
+    latency = result["latency_ms"]
+    locks = result["lock_errors"]
+    lock_total = locks["responses"] + locks["failed_tasks"] + (locks["server_log"] or 0)
+    statuses = ", ".join(f"{status} {count}" for status, count in sorted(result["statuses"].items()))
+    print(f"{result['concurrent_tasks']:>6}{result['elapsed_seconds']:>10.1f}"
+          f"{result['samples_per_second'] or 0:>12.1f}{result['requests']:>10}"
+          f"{latency['p50'] or 0:>9.1f}{latency['p95'] or 0:>9.1f}{latency['p99'] or 0:>9.1f}"
+          f"{sum(result['http_errors'].values()):>8}{lock_total:>7}  {statuses}")
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    tmp = tempfile.mkdtemp(prefix="load-test-")
+    servers: List[_Server] = []
+    try:
+        api_server = None
+        api_url = args.api
+        agent_endpoint = args.agent_endpoint
+        if not agent_endpoint:
+            mock = _Server("app.mock_api:app", os.path.join(tmp, "mock_api.log"), {})
+            servers.append(mock)
+            mock.wait_ready("/")
+            agent_endpoint = f"{mock.url}/api/chat"
+        if args.mock_profile:
+            agent_endpoint += ("&" if "?" in agent_endpoint else "?") + args.mock_profile
+        if not api_url:
+            api_server = _Server("app.main:app", os.path.join(tmp, "api.log"), {
+                "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'load.db')}"
+            })
+            servers.append(api_server)
+            api_server.wait_ready("/api/system/health")
+            api_url = api_server.url
+
+        dataset_path = args.dataset or os.path.join(tmp, "dataset.json")
+        if not args.dataset:
+            _write_dataset(dataset_path, args.samples)
+
+        client = LoadClient(api_url, args.max_connections)
+        try:
+            await client.request("POST", "POST /api/system/init", "/api/system/init")
+            indicators = await client.request("GET", "GET /api/indicators", "/api/indicators") or []
+            indicator_ids = [
+                indicator["id"] for indicator in indicators
+                if not args.indicators or indicator["name"] in args.indicators
+            ]
+            if not indicator_ids:
+                raise RuntimeError("没有可用的评估指标")
+
+            if not args.json:
+                print(f"API: {api_url}  智能体: {agent_endpoint}  日志目录: {tmp}", file=sys.stderr)
+                print(f"{'tasks':>6}{'seconds':>10}{'samples/s':>12}{'requests':>10}"
+                      f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'locks':>7}  statuses",
+                      file=sys.stderr)
+            results = []
+            for concurrent_tasks in args.stages:
+                result = await run_stage(
+                    client, concurrent_tasks, args, agent_endpoint, dataset_path, indicator_ids, api_server
+                )
+                results.append(result)
+                if not args.json:
+                    _print_stage(result)
+            return results
+        finally:
+            await client.close()
+    finally:
+        for server in reversed(servers):
+            server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多任务并发压测")
+    parser.add_argument("--stages", type=int, nargs="+", default=[10, 50, 100, 200], help="各级同时执行的任务数")
+    parser.add_argument("--samples", type=int, default=20, help="每个任务的样本数")
+    parser.add_argument("--task-concurrency", type=int, default=4, help="每个任务的样本并发数")
+    parser.add_argument("--indicators", nargs="+", help="只使用这些指标（名称），默认全部")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="任务详情的轮询间隔（秒）")
+    parser.add_argument("--viewers", type=int, default=5, help="刷新任务列表的前端页面数")
+    parser.add_argument("--viewer-interval", type=float, default=5.0, help="任务列表的刷新间隔（秒）")
+    parser.add_argument("--stage-timeout", type=float, default=600.0, help="每一级的超时时间（秒）")
+    parser.add_argument("--max-connections", type=int, default=200, help="压测客户端的最大连接数")
+    parser.add_argument("--api", help="已启动的 API 地址（默认启动临时实例）")
+    parser.add_argument("--agent-endpoint", help="智能体API端点（默认启动 mock_api）")
+    parser.add_argument("--mock-profile", help="追加到智能体端点的模拟参数，如 latency=fixed&latency_ms=200")
+    parser.add_argument("--dataset", help="数据集 JSON 文件路径（默认按 --samples 生成）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 格式输出")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps({"stages": results}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
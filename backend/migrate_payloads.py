@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""把旧的 JSON 文本结果数据迁移为压缩存储格式
+
+用法：
+    python migrate_payloads.py [--batch-size 500] [--vacuum]
+"""
+
+import argparse
+from sqlalchemy import text
+from app.models.database import engine, init_db, IS_SQLITE
+from app.models.migrations import migrate_payload_columns
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="迁移结果数据为压缩存储格式")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批转换的行数")
+    parser.add_argument("--vacuum", action="store_true", help="迁移后执行 VACUUM 回收 SQLite 文件空间")
+    args = parser.parse_args()
+
+    init_db()
+    print("迁移结果数据...")
+    for table, (converted, before, after) in migrate_payload_columns(engine, args.batch_size).items():
+        ratio = f"{after / before:.1%}" if before else "-"
+        print(f"  {table}: 转换 {converted} 个字段，{before} -> {after} 字节（{ratio}）")
+
+    if args.vacuum and IS_SQLITE:
+        print("执行 VACUUM...")
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+    print("迁移完成！")
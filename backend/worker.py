@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""分布式评估工作节点
+
+用法：
+    python worker.py                     # 持续领取共享数据库中的分片
+    python worker.py --worker-id node-1  # 指定节点ID
+    python worker.py --exit-when-idle    # 没有可领取的分片时退出
+
+多个工作节点（可以在不同机器上）通过 DATABASE_URL 指向同一个数据库即可协同工作。
+"""
+
+import argparse
+import asyncio
+from app.models.database import init_db, SessionLocal
+from app.services.distributed_service import DistributedService, DEFAULT_LEASE_SECONDS, DEFAULT_WORKER_CONCURRENCY
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="分布式评估工作节点")
+    parser.add_argument("--worker-id", default=None, help="节点ID，默认为 主机名-进程号")
+    parser.add_argument("--lease-seconds", type=int, default=DEFAULT_LEASE_SECONDS, help="分片租约时长（秒）")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="没有可领取分片时的轮询间隔（秒）")
+    parser.add_argument("--exit-when-idle", action="store_true", help="没有可领取的分片时退出")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_WORKER_CONCURRENCY,
+                        help="分片内的样本并发数（智能体调用同时受端点在途上限约束）")
+    args = parser.parse_args()
+
+    init_db()
+    try:
+        asyncio.run(DistributedService.run_worker(
+            SessionLocal,
+            worker_id=args.worker_id,
+            lease_seconds=args.lease_seconds,
+            poll_interval=args.poll_interval,
+            exit_when_idle=args.exit_when_idle,
+            concurrency=args.concurrency
+        ))
+    except KeyboardInterrupt:
+        print("工作节点已停止")
@@ -28,12 +28,16 @@ createApp({
                 selected_indicators: [],
                 indicator_weights: {}
             },
+            eventSources: {},
+            tasksChangedSince: null,
+            taskTotal: null,
             editingTask: null,
             showEditTask: false,
             indicatorCategories: [
                 { key: 'basic_performance', name: '基础性能指标' },
                 { key: 'generation_task', name: '生成任务指标' },
                 { key: 'generalization', name: '通用化特征指标' },
+                { key: 'efficiency', name: '效率指标' },
                 { key: 'custom', name: '自定义指标' }
             ]
         };
@@ -43,10 +47,10 @@ createApp({
         this.loadIndicators();
         this.loadSystemStats();
         
-        // 定期刷新任务列表
+        // 运行中任务的进度通过事件流实时推送，这里只增量拉取有变化的任务
         setInterval(() => {
             if (this.currentPage === 'tasks') {
-                this.loadTasks();
+                this.refreshTasks();
             }
         }, 5000);
     },
@@ -85,12 +89,98 @@ createApp({
         // 加载任务列表
         async loadTasks() {
             try {
-                this.tasks = await this.apiCall('/api/tasks');
+                // 先取服务器时间，之后的增量刷新从这里开始，不会漏掉加载期间的变化
+                const summary = await this.apiCall('/api/tasks/summary');
+                const page = await this.apiCall('/api/tasks/page?limit=100');
+                this.tasks = page.items;
+                this.tasksChangedSince = summary.server_time;
+                this.taskTotal = summary.total;
+                this.watchRunningTasks();
             } catch (error) {
                 console.error('加载任务失败:', error);
             }
         },
         
+        // 增量刷新任务列表：只拉取上次刷新后有变化的任务，任务总数变化（如删除）时全量刷新
+        async refreshTasks() {
+            if (!this.tasksChangedSince) {
+                return this.loadTasks();
+            }
+            try {
+                const summary = await this.apiCall('/api/tasks/summary');
+                if (this.taskTotal !== null && summary.total !== this.taskTotal) {
+                    this.taskTotal = summary.total;
+                    return this.loadTasks();
+                }
+                this.taskTotal = summary.total;
+                
+                let changes;
+                do {
+                    changes = await this.apiCall(
+                        `/api/tasks/changes?changed_since=${encodeURIComponent(this.tasksChangedSince)}`
+                    );
+                    changes.items.forEach(changed => {
+                        const index = this.tasks.findIndex(t => t.id === changed.id);
+                        if (index >= 0) {
+                            // 保留事件流推送的吞吐量等字段
+                            Object.assign(this.tasks[index], changed);
+                        } else if (!this.tasks.length || changed.created_at >= this.tasks[this.tasks.length - 1].created_at) {
+                            // 新建的任务（不在当前页范围内的旧任务忽略）
+                            this.tasks.unshift(changed);
+                        }
+                    });
+                    this.tasksChangedSince = changes.next_since;
+                } while (changes.has_more);
+                this.watchRunningTasks();
+            } catch (error) {
+                console.error('刷新任务失败:', error);
+            }
+        },
+        
+        // 订阅运行中任务的进度事件流
+        watchRunningTasks() {
+            this.tasks
+                .filter(task => task.status === 'running')
+                .forEach(task => this.watchTask(task.id));
+        },
+        
+        // 订阅单个任务的进度事件流
+        watchTask(taskId) {
+            if (this.eventSources[taskId]) {
+                return;
+            }
+            const source = new EventSource(`${API_BASE_URL}/api/tasks/${taskId}/events`);
+            const onEvent = (event) => {
+                const data = JSON.parse(event.data);
+                const target = this.tasks.find(t => t.id === data.task_id);
+                if (target) {
+                    target.status = data.status;
+                    target.progress = data.progress;
+                    target.processed_samples = data.processed_samples;
+                    target.total_samples = data.total_samples;
+                    target.throughput = data.throughput;
+                    target.eta_seconds = data.eta_seconds;
+                }
+                if (['completed', 'failed', 'cancelled'].includes(data.status)) {
+                    this.closeEventSource(data.task_id);
+                    this.loadTasks();
+                }
+            };
+            source.addEventListener('progress', onEvent);
+            source.addEventListener('status', onEvent);
+            source.onerror = () => this.closeEventSource(taskId);
+            this.eventSources[taskId] = source;
+        },
+        
+        // 关闭任务的事件流
+        closeEventSource(taskId) {
+            const source = this.eventSources[taskId];
+            if (source) {
+                source.close();
+                delete this.eventSources[taskId];
+            }
+        },
+        
         // 加载指标列表
         async loadIndicators() {
             try {
@@ -254,12 +344,33 @@ createApp({
                     method: 'POST'
                 });
                 alert('任务已启动！');
+                this.watchTask(taskId);
                 this.loadTasks();
             } catch (error) {
                 console.error('启动任务失败:', error);
             }
         },
         
+        // 取消任务
+        async cancelTask(taskId) {
+            if (!confirm('确定要取消这个任务吗？')) {
+                return;
+            }
+            const savePartial = confirm('是否保存已完成样本的部分结果？');
+            
+            try {
+                await this.apiCall(`/api/tasks/${taskId}/cancel`, {
+                    method: 'POST',
+                    body: JSON.stringify({ save_partial: savePartial })
+                });
+                alert('已发送取消请求！');
+                this.loadTasks();
+            } catch (error) {
+                console.error('取消任务失败:', error);
+                alert('取消任务失败: ' + error.message);
+            }
+        },
+        
         // 删除任务
         async deleteTask(taskId) {
             if (!confirm('确定要删除这个任务吗？此操作不可恢复。')) {
@@ -0,0 +1,28 @@
+#!/bin/bash
+
+echo "========================================"
+echo "启动分布式评估工作节点"
+echo "========================================"
+echo ""
+
+cd ../backend
+
+if [ ! -d "venv" ]; then
+    echo "错误: 虚拟环境不存在，请先运行 ./scripts/setup.sh"
+    exit 1
+fi
+
+echo "激活虚拟环境..."
+source venv/bin/activate
+
+# 启动多个节点: ./scripts/run_worker.sh 4
+WORKERS=${1:-1}
+echo "启动 $WORKERS 个工作节点（Ctrl+C 停止）..."
+echo ""
+
+for i in $(seq 1 $WORKERS); do
+    python worker.py --worker-id "$(hostname)-worker-$i" &
+done
+
+trap "kill 0" INT TERM
+wait